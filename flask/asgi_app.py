@@ -0,0 +1,315 @@
+# Async serving mode of the interview API: the routes of chat_working_prototype.py
+# plus session-aware versions of the voice routes of flask_audio.py, on Quart.
+# An interview waiting on Groq holds a coroutine instead of a worker thread;
+# PDF parsing, TTS, transcription and the SQLite session and leaderboard
+# calls run in the default executor.
+# Production entrypoint: python asgi_app.py
+import asyncio
+import os
+
+import quart
+from dotenv import load_dotenv
+from quart import Blueprint, Quart, Response, request, jsonify
+from quart_cors import cors
+
+from audio_store import audio_store, audio_url, clip_response
+from coalesce import request_key, stream_digest
+from groq_scheduler import QueueTimeout
+from ingest import IngestError, ingest_pdf
+from leaderboard import leaderboard_blueprint
+from metrics import instrument, timed
+from pregen import cancel_pregeneration, pregenerate, take_pregenerated
+from prompts import RATED_ANALYSIS_PROMPT, GREETING, START_INTERVIEW_PROMPT, build_interview_prompt
+from resume_profile import build_profile
+from scoring import analysis_prompt, last_question, score_turn
+from services import InterviewServices, ServiceUnavailable, groq_api_key
+from streaming import astream_turn, event_stream_response
+from transcription import transcribe
+from usage import record_turn
+
+# Load environment variables
+load_dotenv()
+
+
+class AsgiServices(InterviewServices):
+    WARM = InterviewServices.WARM + ('groq_client',)
+
+    def build_groq_client(self):
+        # Whisper client of transcription.transcribe, called in the executor
+        from groq import Groq
+
+        return Groq(api_key=groq_api_key())
+
+
+# Router, models, caches, question bank, sessions and the Whisper client, each built on first use
+services = AsgiServices()
+
+api = Blueprint('interview', __name__)
+
+async def get_session(data=None):
+    data = data or {}
+    session_id = data.get('session_id') or request.headers.get('X-Session-Id') or request.args.get('session_id')
+    # A session missing from memory is read from SESSION_DB, and the store is built on first use
+    return await asyncio.to_thread(lambda: services.sessions.get(session_id))
+
+async def deduplicated(endpoint, session_id, run, *content, by_content=True):
+    # Identical requests in flight share one run; a retry with the same
+    # Idempotency-Key within IDEMPOTENCY_TTL gets the first run's result
+    key, replayable = request_key(endpoint, session_id, request.headers.get('Idempotency-Key'), *content,
+                                  by_content=by_content)
+    return await services.inflight.ado(key, run, replayable, endpoint)
+
+def score_answer(session, user_input):
+    # Called with the session lock held once the reply is in memory: the answer
+    # is scored in the background against the question before that reply
+    score_turn(services.scoring_llm, session.scorecard, last_question(session.memory.chat_memory.messages[:-2]), user_input)
+
+async def predict(session, build_prompt, user_input=None):
+    async with session.async_lock:
+        prompt = build_prompt()
+        response = None
+        if session.pregeneration is not None:
+            # Joining blocks until the pre-generation is done, so it waits in the executor
+            response = await asyncio.to_thread(take_pregenerated, session, prompt)
+        if response is None:
+            with timed("llm"):
+                response = await session.conversation.apredict(input=prompt)
+        record_turn(session, prompt, response)
+        if user_input is not None:
+            score_answer(session, user_input)
+    services.sessions.update(session)
+    return response
+
+async def analyze(session):
+    # The scores line of an analysis goes to the leaderboard, not to the candidate
+    if not session.scorecard.has_turns():
+        response = await predict(session, lambda: RATED_ANALYSIS_PROMPT)
+        return await asyncio.to_thread(services.record_analysis, session, response)
+    # Summarize the per-answer scores instead of re-reading the interview;
+    # waiting for the last scores blocks, so it runs in the executor
+    prompt = await asyncio.to_thread(analysis_prompt, session.scorecard, session.memory.summary, score_line=True)
+    async with session.async_lock:
+        with timed("llm"):
+            response = (await services.analysis_llm.ainvoke(prompt)).content
+        record_turn(session, prompt, response, history_tokens=0)
+        response = await asyncio.to_thread(services.record_analysis, session, response)
+    services.sessions.update(session)
+    return response
+
+@timed("stt")
+def speech_to_text(data, filename):
+    # Long WAV recordings are split at silences and the chunks transcribed
+    # concurrently, queued behind the outbound rate limits like flask_audio.py
+    try:
+        return transcribe(services.groq_client, data, filename)
+    except QueueTimeout:
+        # Answered with a 503, not sent on as the candidate's words
+        raise
+    except Exception as e:
+        return str(e), None
+
+@timed("tts")
+def text_to_speech(text):
+    # A clip of its own at /audio/<key>.mp3, repeated sentences taken from the audio store
+    return audio_url(audio_store.speak(text))
+
+async def parse_interview_request():
+    # Returns (session, user_input, error_response)
+    if not request.is_json:
+        return None, None, (jsonify({"error": "Invalid Content-Type. Expected application/json."}), 415)
+    data = await request.get_json()
+    if 'message' not in data:
+        return None, None, (jsonify({"error": "Missing 'message' field."}), 400)
+    session = await get_session(data)
+    if session is None or not session.resume_content:
+        return None, None, (jsonify({"error": "Resume not found. Please upload a resume first."}), 400)
+    return session, data['message'], None
+
+@api.route('/upload', methods=['POST'])
+@api.route('/upload_resume', methods=['POST'])
+async def upload_resume():
+    files = await request.files
+    if 'resume' not in files:
+        return jsonify({"error": "No file part"}), 400
+    file = files['resume']
+    if file.filename == '':
+        return jsonify({"error": "No selected file"}), 400
+    if not file.filename.endswith('.pdf'):
+        return jsonify({"error": "Invalid file format. Please upload a PDF."}), 400
+    form = await request.form
+    previous_id = form.get('session_id')
+    vacancy = form.get('vacancy')
+    # Only a retry carrying the same Idempotency-Key and file gets the first upload's session back
+    digest = await asyncio.to_thread(stream_digest, file.stream)
+    body, status = await deduplicated('upload', previous_id, lambda: new_interview(file, previous_id, vacancy),
+                                      digest, vacancy, by_content=False)
+    return jsonify(body), status
+
+async def new_interview(file, previous_id, vacancy=None):
+    # Returns (body, status) of the upload
+    try:
+        result = await asyncio.to_thread(ingest_pdf, file)
+    except IngestError as e:
+        return {"error": e.message}, e.status
+    previous = await get_session({'session_id': previous_id}) if previous_id else None
+    if previous is not None:
+        # Uploading again replaces the candidate's interview, including its pre-generated opening
+        cancel_pregeneration(previous)
+        services.sessions.delete(previous.session_id)
+    # Cleaned, deduplicated and split into sections once, here
+    profile = build_profile(result.text)
+    # A new session builds its conversation, and the question bank is loaded, on first use
+    session = await asyncio.to_thread(services.sessions.create)
+    session.set_resume(profile)
+    if vacancy:
+        session.vacancy = vacancy
+    question_bank = await asyncio.to_thread(lambda: services.question_bank)
+    if question_bank is not None:
+        session.memory.questions = await asyncio.to_thread(question_bank.query, profile.text)
+    # Generate the introduction and first question while the candidate reads the greeting
+    pregenerate(session, services.pregen_llm)
+    services.sessions.update(session)
+    return {"message": "Resume uploaded successfully", "session_id": session.session_id,
+            "truncated": result.truncated, "resume_tokens": profile.tokens}, 200
+
+@api.route('/start', methods=['GET'])
+async def start():
+    return jsonify({"response": GREETING})
+
+@api.route('/interview', methods=['POST'])
+async def interview():
+    session, user_input, error = await parse_interview_request()
+    if error:
+        return error
+    response = await deduplicated('interview', session.session_id,
+                                  lambda: predict(session, lambda: build_interview_prompt(session, user_input), user_input),
+                                  user_input)
+    return jsonify({"response": response})
+
+@api.route('/interview/stream', methods=['POST'])
+async def interview_stream():
+    session, user_input, error = await parse_interview_request()
+    if error:
+        return error
+    return event_stream_response(astream_turn(services.sessions, session, lambda: build_interview_prompt(session, user_input),
+                                              after_turn=lambda: score_answer(session, user_input)),
+                                 response_class=Response)
+
+@api.route('/analysis', methods=['GET'])
+async def analysis():
+    session = await get_session()
+    if session is None:
+        return jsonify({"error": "Interview session not found. Please upload a resume first."}), 404
+    return jsonify({"analysis": await deduplicated('analysis', session.session_id, lambda: analyze(session))})
+
+@api.route('/analysis/stream', methods=['GET'])
+async def analysis_stream():
+    session = await get_session()
+    if session is None:
+        return jsonify({"error": "Interview session not found. Please upload a resume first."}), 404
+    if session.scorecard.has_turns():
+        prompt = await asyncio.to_thread(analysis_prompt, session.scorecard, session.memory.summary, score_line=True)
+        return event_stream_response(astream_turn(services.sessions, session, lambda: prompt, key="analysis", llm=services.analysis_llm,
+                                                  **services.scored_stream(session)),
+                                     response_class=Response)
+    return event_stream_response(astream_turn(services.sessions, session, lambda: RATED_ANALYSIS_PROMPT, key="analysis",
+                                              **services.scored_stream(session)),
+                                 response_class=Response)
+
+@api.route('/start_interview', methods=['POST'])
+async def start_interview():
+    session = await get_session(await request.get_json(silent=True))
+    if session is None or not session.resume_content:
+        return jsonify({"error": "Resume content is required"}), 400
+    response = await predict(session, lambda: START_INTERVIEW_PROMPT)
+    audio_file = await asyncio.to_thread(text_to_speech, response)
+    return jsonify({"response": response, "audio": audio_file})
+
+@api.route('/continue_interview', methods=['POST'])
+async def continue_interview():
+    data = await request.get_json(silent=True) or {}
+    user_input = data.get('user_input')
+    if not user_input:
+        return jsonify({"error": "User input is required"}), 400
+    session = await get_session(data)
+    if session is None:
+        return jsonify({"error": "Interview session not found. Please upload a resume first."}), 404
+    response = await predict(session, lambda: build_interview_prompt(session, user_input), user_input)
+    audio_file = await asyncio.to_thread(text_to_speech, response)
+    return jsonify({"response": response, "audio": audio_file})
+
+@api.route('/end_interview', methods=['POST'])
+async def end_interview():
+    session = await get_session(await request.get_json(silent=True))
+    if session is None:
+        return jsonify({"error": "Interview session not found. Please upload a resume first."}), 404
+    analysis = await analyze(session)
+    audio_file = await asyncio.to_thread(text_to_speech, analysis)
+    return jsonify({"analysis": analysis, "audio": audio_file})
+
+@api.route('/transcribe_audio', methods=['POST'])
+async def transcribe_audio():
+    files = await request.files
+    if 'audio' not in files:
+        return jsonify({"error": "No audio file provided"}), 400
+    audio_file = files['audio']
+    transcription, stats = await asyncio.to_thread(speech_to_text, audio_file.read(),
+                                                   audio_file.filename or "audio.wav")
+    return jsonify({"transcription": transcription, "stats": stats})
+
+@api.route('/usage', methods=['GET'])
+async def usage():
+    session = await get_session()
+    if session is None:
+        return jsonify({"error": "Interview session not found. Please upload a resume first."}), 404
+    return jsonify({"turns": session.token_usage})
+
+@api.route('/scores', methods=['GET'])
+async def scores():
+    session = await get_session()
+    if session is None:
+        return jsonify({"error": "Interview session not found. Please upload a resume first."}), 404
+    return jsonify(session.scorecard.as_dict())
+
+@api.route('/audio/<key>.mp3', methods=['GET'])
+async def audio(key):
+    return await asyncio.to_thread(clip_response, audio_store, key, request.headers)
+
+@api.route('/cache_stats', methods=['GET'])
+async def cache_stats():
+    return jsonify(dict(services.cache_stats(), tts=audio_store.stats()))
+
+async def service_unavailable(e):
+    # Raised on first use of the models without a GROQ_API_KEY
+    return jsonify({"error": e.message}), e.status
+
+def create_app():
+    app = Quart(__name__)
+    app = cors(app, allow_origin="http://localhost:5173")
+
+    # Per-stage latency and token counts at GET /metrics
+    instrument(app, request)
+
+    app.register_blueprint(api)
+    app.register_error_handler(ServiceUnavailable, service_unavailable)
+    # Final-analysis rankings per vacancy, the same views as the Flask apps
+    app.register_blueprint(leaderboard_blueprint(lambda: services.leaderboard, quart))
+
+    # Import LangChain and build the models while the first requests come in
+    services.warm_in_background(AsgiServices.WARM)
+    return app
+
+app = create_app()
+
+if __name__ == '__main__':
+    import uvicorn
+
+    # Sessions live in process memory, so keep one worker unless requests are
+    # pinned to a worker by the load balancer
+    uvicorn.run(
+        'asgi_app:app',
+        host=os.getenv('HOST', '0.0.0.0'),
+        port=int(os.getenv('PORT', 8000)),
+        workers=int(os.getenv('WEB_CONCURRENCY', 1)),
+        log_level='info',
+    )
@@ -0,0 +1,235 @@
+# Spoken replies keyed by the SHA-256 of their language and text. Every
+# sentence gTTS synthesizes is kept, so phrases that come back (the greeting,
+# the analysis headings, sax.py's "Do you need some extra time to think?") are
+# never synthesized twice, and a whole reply is saved under its own key and
+# served from GET /audio/<key>.mp3: concurrent interviews no longer overwrite
+# one shared response.mp3, and the browser can cache a clip forever.
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from tts_pipeline import synthesize, synthesize_stream
+
+KEY = re.compile(r"^[0-9a-f]{64}$")
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+AUDIO_HEADERS = {"Content-Type": "audio/mpeg", "Accept-Ranges": "bytes",
+                 "Cache-Control": "public, max-age=31536000, immutable"}
+
+
+def clip_key(text, lang='en'):
+    # Whitespace is not spoken, so "Hello. " and "Hello." share a clip
+    return hashlib.sha256(f"{lang}\n{' '.join(text.split())}".encode('utf-8')).hexdigest()
+
+
+class AudioStore:
+    """MP3 clips by `clip_key`, hot ones in a byte-bounded in-memory LRU.
+
+    With an `audio_dir` every clip is also written there (oldest files removed
+    past `max_disk_bytes`), so clips pushed out of memory and clips made by
+    other workers can still be served. Concurrent requests for the same missing clip
+    share one synthesis. With `reuse=False` every sentence is synthesized
+    again, but whole replies are still stored for serving.
+    """
+
+    def __init__(self, max_bytes=64 * 2**20, audio_dir=None, max_disk_bytes=512 * 2**20, reuse=True):
+        self.max_bytes = max_bytes
+        self.audio_dir = audio_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.reuse = reuse
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._bytes = 0
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._disk = None  # key -> size of the files in audio_dir, oldest first; scanned on first use
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        # Clips stay in memory unless TTS_AUDIO_DIR is set; several workers or a
+        # restart need it, pointed at a directory outside the source tree
+        return cls(max_bytes=int(os.getenv('TTS_MEMORY_BYTES', 64 * 2**20)),
+                   audio_dir=os.getenv('TTS_AUDIO_DIR') or None,
+                   max_disk_bytes=int(os.getenv('TTS_DISK_BYTES', 512 * 2**20)),
+                   reuse=os.getenv('TTS_CACHE', '1') != '0')
+
+    def synthesize(self, text, lang='en'):
+        """MP3 of one sentence, synthesized only if no earlier call made it; a drop-in for `tts_pipeline.synthesize`."""
+        if not text.strip():
+            return b""
+        if not self.reuse:
+            return synthesize(text, lang)
+        return self._get_or_make(clip_key(text, lang), lambda: synthesize(text, lang))
+
+    def speak(self, text, lang='en'):
+        """Key of the clip of the whole of `text`, made from the sentences' clips."""
+        key = clip_key(text, lang)
+        make = lambda: b"".join(mp3 for _, mp3 in synthesize_stream([text], lang, synth=self.synthesize))
+        if self.reuse:
+            self._get_or_make(key, make)
+        else:
+            self.put(key, make())
+        return key
+
+    def get(self, key):
+        """The clip stored under `key`, or None."""
+        with self._lock:
+            audio = self._entries.get(key)
+            if audio is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return audio
+        audio = self._load(key)
+        if audio is None:
+            return None
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, audio)
+        return audio
+
+    def put(self, key, audio):
+        self._save(key, audio)
+        with self._lock:
+            self._remember(key, audio)
+
+    def _get_or_make(self, key, make):
+        audio = self.get(key)
+        if audio is not None:
+            return audio
+        with self._lock:
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = self._pending[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+        try:
+            audio = make()
+            self.put(key, audio)
+            future.set_result(audio)
+            return audio
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+
+    def _remember(self, key, audio):
+        # Called with the lock held; a clip larger than the whole budget is served from disk only
+        if len(audio) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= len(previous)
+        self._entries[key] = audio
+        self._bytes += len(audio)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    def _path(self, key):
+        return os.path.join(self.audio_dir, f"{key}.mp3")
+
+    def _scan(self):
+        # Called with the lock held
+        if self._disk is None:
+            os.makedirs(self.audio_dir, exist_ok=True)
+            files = []
+            for entry in os.scandir(self.audio_dir):
+                key, ext = os.path.splitext(entry.name)
+                if ext == '.mp3' and KEY.match(key):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, key, stat.st_size))
+            self._disk = OrderedDict((key, size) for _, key, size in sorted(files))
+            self._disk_bytes = sum(self._disk.values())
+
+    def _load(self, key):
+        if not self.audio_dir:
+            return None
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _save(self, key, audio):
+        if not self.audio_dir:
+            return
+        with self._lock:
+            self._scan()
+        # Write to a temp file first so readers never see a partial clip
+        fd, tmp_path = tempfile.mkstemp(dir=self.audio_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(audio)
+        os.replace(tmp_path, self._path(key))
+        with self._lock:
+            self._disk_bytes += len(audio) - self._disk.pop(key, 0)
+            self._disk[key] = len(audio)
+            while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+                evicted, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                try:
+                    os.remove(self._path(evicted))
+                except FileNotFoundError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "disk_bytes": self._disk_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+
+audio_store = AudioStore.from_env()
+
+
+def audio_url(key):
+    return f"/audio/{key}.mp3"
+
+
+def clip_response(store, key, headers):
+    """`(body, status, headers)` of GET /audio/<key>.mp3 given the request headers.
+
+    Clips never change under their key, so the key is the ETag; a single
+    `Range: bytes=` range is answered with 206 for seeking and resumed downloads.
+    """
+    audio = store.get(key) if KEY.match(key) else None
+    if audio is None:
+        return b"", 404, {}
+    etag = f'"{key}"'
+    response_headers = dict(AUDIO_HEADERS, ETag=etag)
+    if etag in (headers.get('If-None-Match') or "") or headers.get('If-None-Match') == "*":
+        return b"", 304, response_headers
+    size = len(audio)
+    match = RANGE.match((headers.get('Range') or "").replace(" ", ""))
+    if_range = headers.get('If-Range')
+    if match is None or (if_range and if_range != etag) or match.group(1) == match.group(2) == "":
+        return audio, 200, response_headers
+    first, last = match.groups()
+    if first:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    else:
+        # "bytes=-500": the last 500 bytes
+        start, end = max(size - int(last), 0), size - 1
+    if start >= size or start > end:
+        return b"", 416, dict(response_headers, **{"Content-Range": f"bytes */{size}"})
+    return audio[start:end + 1], 206, dict(response_headers, **{"Content-Range": f"bytes {start}-{end}/{size}"})
@@ -0,0 +1,190 @@
+# Long-lived audio I/O for the Streamlit voice app (sax.py). One thread plays
+# the interviewer's sentences from a queue while another keeps the microphone
+# open, so the candidate can start answering while a reply is still playing;
+# speaking over it stops the playback (barge-in).
+import io
+import os
+import queue
+import threading
+from collections import deque
+
+import numpy as np
+
+# Seconds of quiet after a reply has played before the candidate is asked if they need time
+SILENCE_PROMPT_AFTER = float(os.getenv('SILENCE_PROMPT_AFTER', 15))
+SILENCE_PROMPT = "Do you need some extra time to think?"
+PHRASE_TIME_LIMIT = 15  # longest answer recorded in one piece, in seconds
+PAUSE_SECONDS = 0.8  # quiet that ends an answer
+# Sound shorter than this is a noise, not speech
+MIN_SPEECH_SECONDS = 0.3
+# The speakers leak into the microphone: while a reply plays, speech must be this
+# many times louder than the calibrated threshold to count (headphones avoid it)
+BARGE_IN_FACTOR = float(os.getenv('BARGE_IN_FACTOR', 3))
+PLAYBACK_TICK = 0.05  # seconds between checks of the mixer while a clip plays
+
+
+def rms(chunk):
+    # Energy of 16-bit PCM, on the same scale as speech_recognition's energy_threshold
+    samples = np.frombuffer(chunk, dtype=np.int16).astype(np.float32)
+    return float(np.sqrt(np.mean(samples ** 2))) if len(samples) else 0.0
+
+
+class AudioWorker:
+    """Queued playback and always-on capture of the voice interview.
+
+    `play(audio, reply)` queues an MP3 clip of reply number `reply` (from
+    `new_reply()`) and returns at once. Each answer the microphone hears is put
+    on `utterances` as `speech_recognition.AudioData`; `next_utterance()` waits
+    for one. When the candidate starts speaking the clips of the replies so far
+    are dropped and the one playing is stopped. Once a reply has played while an
+    answer is awaited, a timer (not a polling loop) asks the candidate after
+    SILENCE_PROMPT_AFTER seconds of quiet whether they need time.
+    """
+
+    def __init__(self, synthesize=None):
+        self.utterances = queue.Queue()
+        self.error = None
+        self._synthesize = synthesize
+        self._clips = queue.Queue()
+        self._reply = 0
+        self._interrupted = 0  # clips of replies up to this number are not played
+        self._barge_in = threading.Event()
+        self._playing = threading.Event()
+        self._awaiting = threading.Event()
+        self._closed = threading.Event()
+        self._timer = None
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._playback, name='audio-playback', daemon=True),
+            threading.Thread(target=self._capture, name='audio-capture', daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def new_reply(self):
+        with self._lock:
+            self._reply += 1
+            return self._reply
+
+    def play(self, audio, reply):
+        if audio:
+            self._clips.put((reply, audio))
+
+    def next_utterance(self, timeout=None):
+        """The next answer, or None on timeout or when the microphone failed."""
+        if self.error is not None:
+            return None
+        self._awaiting.set()
+        if not self._playing.is_set() and self._clips.empty():
+            self._start_timer()
+        try:
+            return self.utterances.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        finally:
+            self._awaiting.clear()
+            self._cancel_timer()
+
+    def reset(self):
+        # A new interview: nothing left over from the previous one is played or answered
+        self.interrupt()
+        while not self.utterances.empty():
+            self.utterances.get_nowait()
+
+    def interrupt(self):
+        with self._lock:
+            self._interrupted = self._reply
+        self._barge_in.set()
+        self._cancel_timer()
+
+    def close(self):
+        self._closed.set()
+        self.interrupt()
+        self._clips.put((0, None))
+
+    def _playback(self):
+        import pygame
+
+        pygame.mixer.init()
+        while not self._closed.is_set():
+            reply, audio = self._clips.get()
+            if audio is None or reply <= self._interrupted:
+                continue
+            self._cancel_timer()
+            self._barge_in.clear()
+            pygame.mixer.music.load(io.BytesIO(audio), "mp3")
+            pygame.mixer.music.play()
+            self._playing.set()
+            # Waits on the barge-in event, so the candidate's voice stops the clip within a tick
+            while pygame.mixer.music.get_busy():
+                if self._barge_in.wait(PLAYBACK_TICK) and reply <= self._interrupted:
+                    pygame.mixer.music.stop()
+                    break
+            self._playing.clear()
+            if self._clips.empty():
+                self._start_timer()
+
+    def _start_timer(self):
+        if not self._awaiting.is_set() or self._synthesize is None:
+            return
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(SILENCE_PROMPT_AFTER, self._prompt_silence)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _cancel_timer(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def _prompt_silence(self):
+        # Played as a reply of its own; the timer is armed again once it has played
+        if self._awaiting.is_set():
+            self.play(self._synthesize(SILENCE_PROMPT), self.new_reply())
+
+    def _capture(self):
+        import speech_recognition as sr
+
+        try:
+            recognizer = sr.Recognizer()
+            with sr.Microphone() as source:
+                recognizer.adjust_for_ambient_noise(source, duration=0.5)
+                chunk_seconds = source.CHUNK / source.SAMPLE_RATE
+                for frames in self._utterance_frames(source, recognizer.energy_threshold, chunk_seconds):
+                    self.utterances.put(sr.AudioData(b"".join(frames), source.SAMPLE_RATE, source.SAMPLE_WIDTH))
+        except Exception as e:
+            # next_utterance() returns None from now on
+            self.error = e
+            self.utterances.put(None)
+
+    def _utterance_frames(self, source, threshold, chunk_seconds):
+        # Yields the chunks of each stretch of speech, with a little audio from before it
+        preroll = deque(maxlen=max(1, int(MIN_SPEECH_SECONDS / chunk_seconds)))
+        frames, loud_seconds, quiet_seconds, started = [], 0.0, 0.0, False
+        while not self._closed.is_set():
+            chunk = source.stream.read(source.CHUNK)
+            loud = rms(chunk) > threshold * (BARGE_IN_FACTOR if self._playing.is_set() else 1)
+            if not frames:
+                if not loud:
+                    preroll.append(chunk)
+                    continue
+                frames, loud_seconds, quiet_seconds, started = list(preroll) + [chunk], 0.0, 0.0, False
+                preroll.clear()
+            else:
+                frames.append(chunk)
+            if loud:
+                loud_seconds += chunk_seconds
+                quiet_seconds = 0.0
+            else:
+                quiet_seconds += chunk_seconds
+            if not started and loud_seconds >= MIN_SPEECH_SECONDS:
+                started = True
+                # Barge-in: the candidate is answering, stop the interviewer
+                self.interrupt()
+            if quiet_seconds >= PAUSE_SECONDS or len(frames) * chunk_seconds >= PHRASE_TIME_LIMIT:
+                if started:
+                    yield frames
+                frames = []
@@ -0,0 +1,172 @@
+import argparse
+import io
+import json
+import os
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from flask import Blueprint, Response, request, jsonify
+
+from ingest import CHUNK_SIZE, MAX_PDF_BYTES, ingest_bytes
+
+MAX_BATCH_FILES = int(os.getenv('MAX_BATCH_FILES', 500))
+# Total size of the PDFs in one batch, as uploaded and as inflated from an archive
+MAX_BATCH_BYTES = int(os.getenv('MAX_BATCH_BYTES', 200 * 1024 * 1024))
+# Largest request body the app accepts (MAX_CONTENT_LENGTH): a batch plus its form fields
+MAX_REQUEST_BYTES = MAX_BATCH_BYTES + 1024 * 1024
+DEFAULT_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 8))
+MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', 32))
+
+SCREENING_PROMPT = """You are an expert recruiter screening resumes for the following vacancy:
+
+{vacancy}
+
+Resume content: {resume}
+
+Give a first-pass assessment of this candidate for the vacancy: a fit rating out of 10, the main strengths, the main gaps and whether to invite them to an interview. Keep it under 150 words."""
+
+
+class BatchError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def read_upload(file, max_bytes):
+    """Bytes of an uploaded file, read in chunks and refused once past `max_bytes`."""
+    if file.content_length and file.content_length > max_bytes:
+        raise BatchError(f"{file.filename} is larger than {max_bytes // (1024 * 1024)} MB.", status=413)
+    chunks = []
+    size = 0
+    while True:
+        chunk = file.stream.read(CHUNK_SIZE)
+        if not chunk:
+            return b"".join(chunks)
+        size += len(chunk)
+        if size > max_bytes:
+            raise BatchError(f"{file.filename} is larger than {max_bytes // (1024 * 1024)} MB.", status=413)
+        chunks.append(chunk)
+
+
+def read_zip(data, max_files=MAX_BATCH_FILES, max_bytes=MAX_BATCH_BYTES):
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        members = [info for info in archive.infolist()
+                   if not info.is_dir() and info.filename.lower().endswith('.pdf')]
+        # Every limit is checked on the declared sizes before anything is inflated,
+        # to guard against zip bombs; reading stops at the declared size
+        if len(members) > max_files:
+            raise BatchError(f"At most {MAX_BATCH_FILES} resumes per batch.")
+        for info in members:
+            if info.file_size > MAX_PDF_BYTES:
+                raise BatchError(f"{info.filename} is larger than the PDF size limit.")
+        if sum(info.file_size for info in members) > max_bytes:
+            raise BatchError(f"The archive inflates to more than {max_bytes // (1024 * 1024)} MB of PDFs.")
+        return [(info.filename, archive.read(info)) for info in members]
+
+
+def read_directory(path):
+    resumes = []
+    for name in sorted(os.listdir(path)):
+        if name.lower().endswith('.pdf'):
+            with open(os.path.join(path, name), 'rb') as f:
+                resumes.append((name, f.read()))
+    return resumes
+
+
+def screen_resume(llm, name, data, vacancy):
+    started = time.monotonic()
+    try:
+        # The upload's page and time budgets, in the shared process pool
+        result = ingest_bytes(data)
+        if not result.text.strip():
+            raise BatchError("No text could be extracted from the PDF.")
+        assessment = llm.invoke(SCREENING_PROMPT.format(vacancy=vacancy, resume=result.text)).content
+        return {"filename": name, "assessment": assessment, "truncated": result.truncated,
+                "seconds": round(time.monotonic() - started, 3)}
+    except Exception as e:
+        return {"filename": name, "error": str(e), "seconds": round(time.monotonic() - started, 3)}
+
+
+def screen_batch(llm, resumes, vacancy, concurrency=DEFAULT_CONCURRENCY):
+    """Yield one result per resume, in completion order, with at most `concurrency` in flight."""
+    started = time.monotonic()
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        futures = [executor.submit(screen_resume, llm, name, data, vacancy) for name, data in resumes]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # Runs on client disconnect too: drop everything that has not started
+        executor.shutdown(wait=False, cancel_futures=True)
+    yield {"done": True, "count": len(resumes), "seconds": round(time.monotonic() - started, 3)}
+
+
+def batch_blueprint(get_llm):
+    # `get_llm()` returns the screening model; called per batch so it can be built on first use
+    bp = Blueprint('batch', __name__)
+
+    @bp.route('/batch/screen', methods=['POST'])
+    def batch_screen():
+        vacancy = request.form.get('vacancy', '').strip()
+        if not vacancy:
+            return jsonify({"error": "Missing 'vacancy' field."}), 400
+        try:
+            concurrency = min(int(request.form.get('concurrency', DEFAULT_CONCURRENCY)), MAX_CONCURRENCY)
+        except ValueError:
+            return jsonify({"error": "'concurrency' must be an integer."}), 400
+        if concurrency < 1:
+            return jsonify({"error": "'concurrency' must be at least 1."}), 400
+
+        # Read every upload before streaming starts; the request body is gone afterwards.
+        # Each file is read up to its limit, so an oversized one is never buffered whole
+        resumes = []
+        try:
+            files = [file for file in request.files.getlist('resumes') if file.filename.lower().endswith('.pdf')]
+            if len(files) > MAX_BATCH_FILES:
+                raise BatchError(f"At most {MAX_BATCH_FILES} resumes per batch.")
+            remaining = MAX_BATCH_BYTES
+            for file in files:
+                data = read_upload(file, MAX_PDF_BYTES)
+                remaining -= len(data)
+                if remaining < 0:
+                    raise BatchError(f"The batch is larger than {MAX_BATCH_BYTES // (1024 * 1024)} MB of PDFs.",
+                                     status=413)
+                resumes.append((file.filename, data))
+            archive = request.files.get('archive')
+            if archive:
+                resumes.extend(read_zip(read_upload(archive, MAX_BATCH_BYTES),
+                                        max_files=MAX_BATCH_FILES - len(resumes), max_bytes=remaining))
+        except BatchError as e:
+            return jsonify({"error": e.message}), e.status
+        except zipfile.BadZipFile as e:
+            return jsonify({"error": str(e)}), 400
+        if not resumes:
+            return jsonify({"error": "No PDF resumes provided."}), 400
+
+        body = (json.dumps(result) + "\n" for result in screen_batch(get_llm(), resumes, vacancy, concurrency))
+        return Response(body, mimetype='application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
+
+    return bp
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    from llm_router import ModelRouter
+
+    parser = argparse.ArgumentParser(description="Screen a directory or zip of PDF resumes against a vacancy.")
+    parser.add_argument('path', help="directory of PDFs or a .zip archive")
+    parser.add_argument('--vacancy', required=True, help="vacancy description")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    args = parser.parse_args()
+
+    load_dotenv()
+    llm = ModelRouter.from_env(os.environ['GROQ_API_KEY']).model("screening")
+    if os.path.isdir(args.path):
+        resumes = read_directory(args.path)
+    else:
+        with open(args.path, 'rb') as f:
+            resumes = read_zip(f.read())
+    for result in screen_batch(llm, resumes, args.vacancy, args.concurrency):
+        print(json.dumps(result), flush=True)
@@ -0,0 +1,404 @@
+"""Offline load benchmark for the interview apps.
+
+ChatGroq, the Groq Whisper client and gTTS are replaced by deterministic local
+stand-ins with configurable latency and output size, so the full request path
+(upload, session handling, history, caching, TTS pipeline) can be measured on a
+machine without network access or API quota.
+
+    python benchmark.py --app chat --concurrency 8 --interviews 32
+    python benchmark.py --app all --json --max-prompt-tokens 3000   # CI gate
+    python benchmark.py --app all --startup --startup-budget 1.0     # boot-time gate
+"""
+import argparse
+import contextlib
+import contextvars
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import wave
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterator, Optional
+
+import numpy as np
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from usage import estimate_tokens
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_RESUME = os.path.join(HERE, 'MachineLearningResume.pdf')
+
+# Stand-in behaviour, set from the command line before the apps are imported
+config = {
+    "llm_latency": 0.2,  # seconds before the first token
+    "fallback_llm_latency": 0.1,  # the same for the router's smaller fallback model
+    "token_latency": 0.002,  # seconds per generated token
+    "completion_tokens": 120,
+    "stt_latency": 0.3,
+    "tts_latency": 0.1,
+}
+
+# Which app and interview turn the caller is driving, so LLM calls can be attributed to it
+current_app = contextvars.ContextVar('current_app', default=None)
+current_turn = contextvars.ContextVar('current_turn', default=None)
+prompt_tokens = defaultdict(list)  # (app, turn) -> input tokens of every LLM call in that turn
+prompt_tokens_lock = threading.Lock()
+
+
+# Reply to the per-answer scoring prompt of scoring.py
+FAKE_SCORES = '{"communication": 7, "technical_competence": 6, "problem_solving": 7, "cultural_fit": 8, "note": "Clear but light on numbers."}'
+
+
+def fake_completion(messages):
+    if "Reply with JSON only" in str(messages[-1].content):
+        return FAKE_SCORES
+    words = []
+    sentence = 0
+    while len(words) < config["completion_tokens"]:
+        sentence += 1
+        words.extend(f"This is benchmark sentence number {sentence} of the interviewer reply.".split())
+    return " ".join(words[:config["completion_tokens"]]) + "."
+
+
+def record_prompt(messages):
+    tokens = sum(estimate_tokens(str(message.content)) for message in messages)
+    key = (current_app.get(), current_turn.get())
+    with prompt_tokens_lock:
+        prompt_tokens[key].append(tokens)
+
+
+class FakeChatGroq(BaseChatModel):
+    """Drop-in for ChatGroq: waits like a remote model, then returns a fixed reply."""
+
+    model_name: str = "fake-llama"
+    groq_api_key: Optional[str] = None
+    request_timeout: Optional[float] = None
+    max_retries: int = 2
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-groq"
+
+    @property
+    def first_token_latency(self):
+        fallback = self.model_name == os.getenv('LLM_FALLBACK_MODEL', 'llama-3.1-8b-instant')
+        return config["fallback_llm_latency"] if fallback else config["llm_latency"]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        record_prompt(messages)
+        text = fake_completion(messages)
+        time.sleep(self.first_token_latency + config["token_latency"] * config["completion_tokens"])
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        record_prompt(messages)
+        time.sleep(self.first_token_latency)
+        for word in fake_completion(messages).split(" "):
+            time.sleep(config["token_latency"])
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+
+
+class FakeTranscriptions:
+    def create(self, file, model, response_format="text", **kwargs):
+        time.sleep(config["stt_latency"])
+        return "I have five years of experience building machine learning systems."
+
+
+class FakeGroq:
+    def __init__(self, *args, **kwargs):
+        self.audio = type("Audio", (), {"transcriptions": FakeTranscriptions()})()
+
+
+class FakeTTS:
+    def __init__(self, text, lang='en', **kwargs):
+        self.text = text
+
+    def write_to_fp(self, fp):
+        time.sleep(config["tts_latency"])
+        fp.write(b"ID3" + self.text.encode()[:64])
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            self.write_to_fp(f)
+
+
+def install_fakes():
+    import groq
+    import gtts
+    import langchain_groq
+
+    langchain_groq.ChatGroq = FakeChatGroq
+    groq.Groq = FakeGroq
+    gtts.gTTS = FakeTTS
+
+
+def limit_rates(spec):
+    # The stand-ins answer without Groq's rate limits unless --rate-limits asks for them
+    from groq_scheduler import parse_limits, scheduler
+
+    if spec is None:
+        scheduler.limits, scheduler.default_limit = {}, (0, 0)
+    else:
+        scheduler.limits = parse_limits(f"free,{spec}")
+
+
+def sample_wav(seconds=5, rate=16000):
+    samples = (np.sin(np.arange(seconds * rate) / 5) * 8000).astype(np.int16)
+    out = io.BytesIO()
+    with wave.open(out, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(samples.tobytes())
+    return out.getvalue()
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def call(self, name, send, expect=200):
+        started = time.perf_counter()
+        response = send()
+        if response.is_streamed:
+            response.get_data()  # drain the stream so the timing covers the whole body
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.latencies[name].append(elapsed)
+            if response.status_code != expect:
+                self.errors[name] += 1
+        return response
+
+
+def upload(client, path):
+    # Every client uploads the same resume; its own Idempotency-Key keeps the interviews apart
+    with open(SAMPLE_RESUME, 'rb') as f:
+        return client.post(path, data={'resume': (f, 'resume.pdf')}, content_type='multipart/form-data',
+                           headers={'Idempotency-Key': uuid.uuid4().hex})
+
+
+def chat_interview(app, recorder, app_name, turns, stream):
+    client = app.test_client()
+    current_app.set(app_name)
+    current_turn.set(0)
+    session_id = recorder.call('/upload', lambda: upload(client, '/upload')).get_json()['session_id']
+    interview_path = '/interview/stream' if stream else '/interview'
+    for turn in range(1, turns + 1):
+        current_turn.set(turn)
+        message = "Let's start the interview." if turn == 1 else f"Answer number {turn}: I built a recommendation system in Python."
+        recorder.call(interview_path, lambda: client.post(
+            interview_path, json={'message': message, 'session_id': session_id}))
+    if app_name == 'chat':
+        current_turn.set(turns + 1)
+        recorder.call('/analysis', lambda: client.get('/analysis', query_string={'session_id': session_id}))
+    return session_id
+
+
+def audio_interview(app, recorder, turns, wav):
+    client = app.test_client()
+    current_app.set('audio')
+    current_turn.set(0)
+    session_id = recorder.call('/upload_resume', lambda: upload(client, '/upload_resume')).get_json()['session_id']
+    current_turn.set(1)
+    recorder.call('/start_interview', lambda: client.post('/start_interview', json={'session_id': session_id}))
+    for turn in range(2, turns + 1):
+        current_turn.set(turn)
+        recorder.call('/transcribe_audio', lambda: client.post(
+            '/transcribe_audio', data={'audio': (io.BytesIO(wav), 'answer.wav')}, content_type='multipart/form-data'))
+        recorder.call('/continue_interview', lambda: client.post(
+            '/continue_interview', json={'user_input': f"Answer number {turn}.", 'session_id': session_id}))
+    current_turn.set(turns + 1)
+    recorder.call('/end_interview', lambda: client.post('/end_interview', json={'session_id': session_id}))
+    return session_id
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000 if values else None
+
+
+APP_MODULES = {'chat': 'chat_working_prototype', 'chat_only': 'flask_chat_only', 'audio': 'flask_audio',
+               'asgi': 'asgi_app'}
+
+# Run in a fresh interpreter: time to import the app module, then to answer GET /metrics
+STARTUP_PROBE = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+app = __import__(sys.argv[1]).app
+imported = time.perf_counter()
+if hasattr(app, 'asgi_app'):
+    async def first_request():
+        return (await app.test_client().get('/metrics')).status_code
+    status = asyncio.run(first_request())
+else:
+    status = app.test_client().get('/metrics').status_code
+print(json.dumps({"import_seconds": imported - started, "first_request_seconds": time.perf_counter() - imported,
+                  "status": status}))
+"""
+
+
+def measure_startup(app_name):
+    # Real modules, no fakes and no GROQ_API_KEY: booting must not need the key or the network
+    env = {key: value for key, value in os.environ.items() if key != 'GROQ_API_KEY'}
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', STARTUP_PROBE, APP_MODULES[app_name]], cwd=HERE, env=env,
+                            capture_output=True, text=True)
+    total = time.perf_counter() - started
+    if result.returncode != 0:
+        return {"app": app_name, "error": result.stderr.strip().splitlines()[-1]}
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    return {
+        "app": app_name,
+        "import_seconds": round(probe["import_seconds"], 3),
+        "first_request_seconds": round(probe["first_request_seconds"], 3),
+        "startup_seconds": round(probe["import_seconds"] + probe["first_request_seconds"], 3),
+        "process_seconds": round(total, 3),
+        "status": probe["status"],
+    }
+
+
+def print_startup(report):
+    if "error" in report:
+        print(f"{report['app']:<10} failed to start: {report['error']}")
+        return
+    print(f"{report['app']:<10} import {report['import_seconds'] * 1000:7.1f} ms, first request "
+          f"{report['first_request_seconds'] * 1000:6.1f} ms (status {report['status']}), "
+          f"process {report['process_seconds'] * 1000:7.1f} ms")
+
+
+def run(app_name, args):
+    app = __import__(APP_MODULES[app_name]).app
+    recorder = Recorder()
+    wav = sample_wav()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        if app_name == 'audio':
+            futures = [executor.submit(audio_interview, app, recorder, args.turns, wav) for _ in range(args.interviews)]
+        else:
+            futures = [executor.submit(chat_interview, app, recorder, app_name, args.turns, args.stream)
+                       for _ in range(args.interviews)]
+        session_ids = [future.result() for future in futures]
+    wall = time.perf_counter() - started
+    # Interviews sharing a session would measure one conversation growing N times as fast
+    assert len(set(session_ids)) == len(session_ids), "interviews were given the same session"
+    requests = sum(len(values) for values in recorder.latencies.values())
+    per_turn = {}
+    for (name, turn), values in sorted(prompt_tokens.items(), key=lambda item: str(item[0])):
+        if name == app_name and turn:
+            # Each interview spends sum(values) / interviews input tokens on this turn
+            per_turn[turn] = round(sum(values) / args.interviews)
+    return {
+        "app": app_name,
+        "interviews": args.interviews,
+        "concurrency": args.concurrency,
+        "wall_seconds": round(wall, 3),
+        "requests_per_second": round(requests / wall, 2),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "endpoints": {
+            name: {
+                "count": len(values),
+                "errors": recorder.errors[name],
+                "p50_ms": round(percentile(values, 50), 1),
+                "p95_ms": round(percentile(values, 95), 1),
+                "p99_ms": round(percentile(values, 99), 1),
+            }
+            for name, values in recorder.latencies.items()
+        },
+        "prompt_tokens_per_turn": dict(sorted(per_turn.items())),
+    }
+
+
+def print_report(report):
+    print(f"\n== {report['app']}: {report['interviews']} interviews, concurrency {report['concurrency']} ==")
+    print(f"wall {report['wall_seconds']}s, {report['requests_per_second']} req/s, peak RSS {report['peak_rss_mb']} MB")
+    print(f"{'endpoint':<22}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in report["endpoints"].items():
+        print(f"{name:<22}{stats['count']:>7}{stats['errors']:>8}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+    print("prompt tokens per turn:", " ".join(f"{turn}:{tokens}" for turn, tokens in report["prompt_tokens_per_turn"].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the interview endpoints with fake Groq/gTTS.")
+    parser.add_argument('--app', choices=['chat', 'chat_only', 'audio', 'all'], default='chat')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--interviews', type=int, default=8)
+    parser.add_argument('--turns', type=int, default=10)
+    parser.add_argument('--stream', action='store_true', help="use /interview/stream for the chat apps")
+    parser.add_argument('--llm-latency', type=float, default=config["llm_latency"])
+    parser.add_argument('--fallback-llm-latency', type=float, default=config["fallback_llm_latency"])
+    parser.add_argument('--token-latency', type=float, default=config["token_latency"])
+    parser.add_argument('--completion-tokens', type=int, default=config["completion_tokens"])
+    parser.add_argument('--stt-latency', type=float, default=config["stt_latency"])
+    parser.add_argument('--tts-latency', type=float, default=config["tts_latency"])
+    parser.add_argument('--rate-limits', nargs='?', const='', metavar='MODEL=RPM/TPM,...',
+                        help="queue the LLM and Whisper calls behind Groq's free-tier limits, with these overrides")
+    parser.add_argument('--llm-cache', action='store_true', help="enable the LLM response cache (LLM_CACHE=1)")
+    parser.add_argument('--tts-cache', action='store_true',
+                        help="reuse synthesized sentences (the fake replies repeat, so every one after the first is free)")
+    parser.add_argument('--json', action='store_true', help="print the reports as JSON")
+    parser.add_argument('--max-prompt-tokens', type=int,
+                        help="exit with status 1 if any turn uses more input tokens than this")
+    parser.add_argument('--startup', action='store_true',
+                        help="measure import time and time to first request of each app instead (asgi included)")
+    parser.add_argument('--startup-budget', type=float,
+                        help="with --startup, exit with status 1 if an app takes longer than this many seconds")
+    args = parser.parse_args()
+
+    if args.startup:
+        apps = list(APP_MODULES) if args.app == 'all' else [args.app]
+        reports = [measure_startup(app_name) for app_name in apps]
+        if args.json:
+            print(json.dumps(reports, indent=2))
+        else:
+            for report in reports:
+                print_startup(report)
+        failed = [report["app"] for report in reports if "error" in report or
+                  (args.startup_budget and report["startup_seconds"] > args.startup_budget)]
+        if failed:
+            print(f"FAIL: {', '.join(failed)} over the startup budget of {args.startup_budget}s or failed to start",
+                  file=sys.stderr)
+            sys.exit(1)
+        return
+
+    for key in config:
+        config[key] = getattr(args, key)
+    os.environ.setdefault('GROQ_API_KEY', 'offline-benchmark')
+    if args.llm_cache:
+        os.environ['LLM_CACHE'] = '1'
+    if not args.tts_cache:
+        os.environ['TTS_CACHE'] = '0'
+    install_fakes()
+    limit_rates(args.rate_limits)
+    # Anything the apps write to the working directory stays out of the tree
+    os.chdir(tempfile.mkdtemp(prefix='interview-bench-'))
+
+    apps = ['chat', 'chat_only', 'audio'] if args.app == 'all' else [args.app]
+    # Keep any chain logging (CHAIN_VERBOSE=1) out of the report
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        reports = [run(app_name, args) for app_name in apps]
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        for report in reports:
+            print_report(report)
+
+    if args.max_prompt_tokens:
+        worst = max((tokens for report in reports for tokens in report["prompt_tokens_per_turn"].values()), default=0)
+        if worst > args.max_prompt_tokens:
+            print(f"FAIL: a turn used {worst} prompt tokens (limit {args.max_prompt_tokens})", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, HERE)
+    main()
@@ -1,112 +1,83 @@
-from flask import Flask, request, jsonify
-import os
-import PyPDF2
-from langchain_groq import ChatGroq
-from langchain.memory import ConversationBufferMemory
-from langchain.chains import ConversationChain
-from dotenv import load_dotenv
-from flask_cors import CORS
-
-app = Flask(__name__)
-
-# Initialize CORS with allowed origins
-CORS(app, resources={r"/*": {"origins": "http://localhost:5173"}})
-
-# Load environment variables
-load_dotenv()
-groq_api_key = os.environ['GROQ_API_KEY']
-
-# Initialize the language model
-llm = ChatGroq(groq_api_key=groq_api_key, model_name="llama-3.1-70b-versatile")
-
-# Create a conversation memory
-memory = ConversationBufferMemory(return_messages=True)
-
-# Create a conversation chain
-conversation = ConversationChain(llm=llm, memory=memory, verbose=True)
-
-# Global variable to store resume content
-resume_content = ""
-
-@app.route('/upload', methods=['POST'])
-def upload_resume():
-    global resume_content
-    if 'resume' not in request.files:
-        return jsonify({"error": "No file part"}), 400
-    file = request.files['resume']
-    if file.filename == '':
-        return jsonify({"error": "No selected file"}), 400
-    if file and file.filename.endswith('.pdf'):
-        pdf_reader = PyPDF2.PdfReader(file)
-        resume_content = ""
-        for page in pdf_reader.pages:
-            text = page.extract_text()
-            if text:
-                resume_content += text
-        return jsonify({"message": "Resume uploaded successfully"}), 200
-    else:
-        return jsonify({"error": "Invalid file format. Please upload a PDF."}), 400
-
-
-@app.route('/start', methods=['GET'])
-def start():
-    response = "Hello, I hope you're having a great day. I'm ready to begin our interview whenever you are. Please let me know when you're ready to start."
-    return jsonify({"response": response})
-
-@app.route('/interview', methods=['POST'])
+from flask import Blueprint, jsonify
+from interview_api import create_app, deduplicated, get_session, parse_interview_request, score_answer, services
+from metrics import timed
+from pregen import take_pregenerated
+from usage import record_turn
+from scoring import analysis_prompt
+from prompts import RATED_ANALYSIS_PROMPT, build_interview_prompt
+from streaming import event_stream_response, stream_turn
+
+# Upload, /start, /usage, /scores and /cache_stats come from interview_api.py
+api = Blueprint('interview', __name__)
+
+@api.route('/interview', methods=['POST'])
 def interview():
-    global resume_content
-    if not request.is_json:
-        return jsonify({"error": "Invalid Content-Type. Expected application/json."}), 415
-    data = request.get_json()
-    if 'message' not in data:
-        return jsonify({"error": "Missing 'message' field."}), 400
-    user_input = data['message']
-    
-    if not resume_content:
-        return jsonify({"error": "Resume not found. Please upload a resume first."}), 400
-    
-    if not memory.chat_memory:
-        # First message in the interview
-        prompt = f"""You are an expert interviewer conducting a job interview. The candidate has uploaded their resume, and you have the following information:
-
-Resume content: {resume_content}
-
-Based on this resume, conduct a professional interview. Start by briefly introducing yourself and asking the candidate for a brief introduction. Then, proceed with relevant questions based on their resume and responses.
-
-The candidate's first message is: '{user_input}'
-
-Provide your response and the first interview question."""
-    else:
-        # Continue the interview
-        prompt = f"""Continue the professional job interview. Ask relevant follow-up questions based on the candidate's previous responses and their resume. Ensure the conversation flows naturally and mimics a real-life interview environment.
-
-Resume content: {resume_content}
+    session, user_input, error = parse_interview_request()
+    if error:
+        return error
 
-The candidate's latest response is: '{user_input}'
-
-Provide your next question or response."""
-    
-    response = conversation.predict(input=prompt)
+    response = deduplicated('interview', session.session_id, lambda: interview_turn(session, user_input), user_input)
     return jsonify({"response": response})
 
-
-@app.route('/analysis', methods=['GET'])
+def interview_turn(session, user_input):
+    with session.lock:
+        prompt = build_interview_prompt(session, user_input)
+        response = take_pregenerated(session, prompt)
+        if response is None:
+            with timed("llm"):
+                response = session.conversation.predict(input=prompt)
+        record_turn(session, prompt, response)
+        score_answer(session, user_input)
+    services.sessions.update(session)
+    return response
+
+@api.route('/interview/stream', methods=['POST'])
+def interview_stream():
+    session, user_input, error = parse_interview_request()
+    if error:
+        return error
+    return event_stream_response(stream_turn(services.sessions, session, lambda: build_interview_prompt(session, user_input),
+                                             after_turn=lambda: score_answer(session, user_input)))
+
+@api.route('/analysis', methods=['GET'])
 def analysis():
-    prompt = """Based on the entire interview conversation, provide a comprehensive analysis of the candidate. Include the following:
-
-1. Overall impression
-2. Strengths demonstrated
-3. Areas for improvement
-4. Communication skills
-5. Technical competence (if applicable)
-6. Cultural fit
-7. Recommendations for the candidate
+    session = get_session()
+    if session is None:
+        return jsonify({"error": "Interview session not found. Please upload a resume first."}), 404
 
-Provide a detailed yet concise analysis, offering constructive feedback and actionable insights."""
-
-    analysis_response = conversation.predict(input=prompt)
+    analysis_response = deduplicated('analysis', session.session_id, lambda: analyze(session))
     return jsonify({"analysis": analysis_response})
 
+def analyze(session):
+    with session.lock:
+        if session.scorecard.has_turns():
+            # Summarize the per-answer scores instead of re-reading the interview
+            prompt = analysis_prompt(session.scorecard, session.memory.summary, score_line=True)
+            with timed("llm"):
+                analysis_response = services.analysis_llm.invoke(prompt).content
+            record_turn(session, prompt, analysis_response, history_tokens=0)
+        else:
+            with timed("llm"):
+                analysis_response = session.conversation.predict(input=RATED_ANALYSIS_PROMPT)
+            record_turn(session, RATED_ANALYSIS_PROMPT, analysis_response)
+        # The scores line goes to the leaderboard, not to the candidate
+        analysis_response = services.record_analysis(session, analysis_response)
+    services.sessions.update(session)
+    return analysis_response
+
+@api.route('/analysis/stream', methods=['GET'])
+def analysis_stream():
+    session = get_session()
+    if session is None:
+        return jsonify({"error": "Interview session not found. Please upload a resume first."}), 404
+    if session.scorecard.has_turns():
+        return event_stream_response(stream_turn(
+            services.sessions, session, lambda: analysis_prompt(session.scorecard, session.memory.summary, score_line=True),
+            key="analysis", llm=services.analysis_llm, **services.scored_stream(session)))
+    return event_stream_response(stream_turn(services.sessions, session, lambda: RATED_ANALYSIS_PROMPT, key="analysis",
+                                             **services.scored_stream(session)))
+
+app = create_app(api)
+
 if __name__ == '__main__':
     app.run(debug=True)
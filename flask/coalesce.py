@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from metrics import DEDUPLICATED_REQUESTS
+
+# How long a finished call is replayed to retries carrying the same Idempotency-Key
+IDEMPOTENCY_TTL = float(os.getenv('IDEMPOTENCY_TTL', 300))  # seconds
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv('IDEMPOTENCY_MAX_ENTRIES', 2048))
+
+
+def request_key(endpoint, session_id, idempotency_key, *content, by_content=True):
+    """Coalescing key of one request, and whether its result may be replayed.
+
+    With the client's Idempotency-Key the result is kept for retries; the key
+    also covers the content, so a key reused for a different request runs it
+    instead of replaying another's result. Without a key the key is the request
+    content, which only joins duplicates sent while the first is still running:
+    the same answer sent again later is a new turn. Requests that create a
+    session pass `by_content=False`: two clients sending the same resume must
+    get two interviews, so without a key the key is None and the request always
+    runs.
+    """
+    if not idempotency_key and not by_content:
+        return None, False
+    digest = hashlib.sha256("\0".join(str(part) for part in content).encode()).hexdigest()
+    if idempotency_key:
+        return (endpoint, session_id, 'key', idempotency_key, digest), True
+    return (endpoint, session_id, 'content', digest), False
+
+
+def stream_digest(stream, chunk_size=1 << 20):
+    """SHA-256 of a seekable upload stream, read in chunks and rewound for the handler."""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+class Singleflight:
+    """Runs identical calls once: concurrent duplicates wait for and share the result.
+
+    Results of replayable calls are kept for `ttl` seconds (at most `max_entries`)
+    and returned to late retries. Failures are shared with the waiting duplicates
+    but not kept, so a retry after an error runs again.
+    """
+
+    def __init__(self, ttl=IDEMPOTENCY_TTL, max_entries=IDEMPOTENCY_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.executed = 0
+        self.coalesced = 0
+        self.replayed = 0
+        self._inflight = {}
+        self._results = OrderedDict()  # key -> (expires, result)
+        self._lock = threading.Lock()
+
+    def _begin(self, key, endpoint):
+        # (outcome, future): the caller runs the call if the outcome is "executed"
+        now = time.monotonic()
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self.replayed += 1
+                    DEDUPLICATED_REQUESTS.labels(endpoint, 'replayed').inc()
+                    future = Future()
+                    future.set_result(entry[1])
+                    return 'replayed', future
+                del self._results[key]
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                DEDUPLICATED_REQUESTS.labels(endpoint, 'coalesced').inc()
+                return 'coalesced', future
+            self.executed += 1
+            DEDUPLICATED_REQUESTS.labels(endpoint, 'executed').inc()
+            future = self._inflight[key] = Future()
+            return 'executed', future
+
+    def _finish(self, key, future, result, replayable):
+        with self._lock:
+            del self._inflight[key]
+            if replayable:
+                self._results[key] = (time.monotonic() + self.ttl, result)
+                self._results.move_to_end(key)
+                while len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+        future.set_result(result)
+
+    def _fail(self, key, future, error):
+        with self._lock:
+            del self._inflight[key]
+        future.set_exception(error)
+
+    def do(self, key, fn, replayable=False, endpoint=""):
+        """`fn()`, or the result of the identical call in flight or recently finished."""
+        if key is None:
+            return fn()
+        outcome, future = self._begin(key, endpoint)
+        if outcome != 'executed':
+            return future.result()
+        try:
+            result = fn()
+        except Exception as e:
+            self._fail(key, future, e)
+            raise
+        self._finish(key, future, result, replayable)
+        return result
+
+    async def ado(self, key, fn, replayable=False, endpoint=""):
+        """Async `do`: `fn()` returns an awaitable, waiting duplicates do not block the loop."""
+        if key is None:
+            return await fn()
+        outcome, future = self._begin(key, endpoint)
+        if outcome != 'executed':
+            return await asyncio.wrap_future(future)
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._fail(key, future, e if isinstance(e, Exception) else RuntimeError("request cancelled"))
+            raise
+        self._finish(key, future, result, replayable)
+        return result
+
+    def stats(self):
+        with self._lock:
+            total = self.executed + self.coalesced + self.replayed
+            return {
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "replayed": self.replayed,
+                "coalesce_rate": (self.coalesced + self.replayed) / total if total else 0.0,
+                "in_flight": len(self._inflight),
+                "stored_results": len(self._results),
+            }
@@ -1,69 +1,115 @@
-from flask import Flask, render_template, request, jsonify, send_file
-from werkzeug.utils import secure_filename
-import os
-import PyPDF2
-from langchain_groq import ChatGroq
-from langchain.memory import ConversationBufferMemory
-from langchain.chains import ConversationChain
+from flask import Blueprint, Flask, render_template, request, jsonify, send_file
 from dotenv import load_dotenv
-import speech_recognition as sr
-from gtts import gTTS
-from groq import Groq
 import time
-
-app = Flask(__name__)
+import base64
+from audio_store import audio_store, audio_url, clip_response
+from groq_scheduler import QueueTimeout, scheduler
+from ingest import IngestError, ingest_pdf
+from metrics import instrument, timed
+from pregen import cancel_pregeneration, pregenerate, take_pregenerated
+from pdf_cache import extraction_cache
+from prompts import ANALYSIS_PROMPT, FOLLOW_UP_PROMPT, START_INTERVIEW_PROMPT
+from resume_profile import build_profile
+from scoring import analysis_prompt, last_question, score_turn
+from services import ModelServices, ServiceUnavailable, groq_api_key
+from streaming import event_stream_response, sse_event, stream_predict, stream_text
+from transcription import transcribe
+from tts_pipeline import synthesize_stream
 
 # Load environment variables
 load_dotenv()
 
-# Initialize the language model
-def init_llm():
-    groq_api_key = os.getenv('GROQ_API_KEY')
-    if not groq_api_key:
-        raise ValueError("GROQ_API_KEY not found. Please set it in your .env file.")
-    return ChatGroq(groq_api_key=groq_api_key, model_name="llama-3.1-70b-versatile")
 
-llm = init_llm()
-groq_client = Groq()
+class AudioServices(ModelServices):
+    """The models, the Whisper client and the sessions of the voice interviews."""
+
+    WARM = ('llm_cache', 'router', 'conversation_class', 'groq_client')
+
+    def build_groq_client(self):
+        from groq import Groq
+
+        return Groq(api_key=groq_api_key())
+
+    def build_conversation_class(self):
+        from langchain.chains import ConversationChain
+
+        return ConversationChain
+
+
+# Models, clients and sessions, each built on first use
+services = AudioServices()
+
+api = Blueprint('audio', __name__)
 
-# Create a conversation memory
-memory = ConversationBufferMemory(return_messages=True)
+def requested_session_id():
+    data = request.get_json(silent=True) or {}
+    return data.get('session_id') or request.headers.get('X-Session-Id') or request.args.get('session_id')
 
-# Create a conversation chain
-conversation = ConversationChain(llm=llm, memory=memory, verbose=True)
+def get_session():
+    return services.sessions.get(requested_session_id())
 
-def extract_text_from_pdf(pdf_file):
-    pdf_reader = PyPDF2.PdfReader(pdf_file)
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text()
-    return text
+def session_not_found():
+    return jsonify({"error": "Interview session not found. Please upload a resume first."}), 404
 
+def extract_profile(pdf_file):
+    # Spooled and parsed in the process pool under the page/time budget,
+    # re-uploads of the same PDF are served from the extraction cache
+    return build_profile(ingest_pdf(pdf_file).text)
+
+@timed("tts")
 def text_to_speech(text):
-    tts = gTTS(text=text, lang='en')
-    tts.save("static/response.mp3")
-    return "static/response.mp3"
+    # Sentences are synthesized concurrently, or taken from the audio store, and
+    # the MP3 segments concatenated into a clip of its own at /audio/<key>.mp3
+    return audio_url(audio_store.speak(text))
+
+def speak_stream(session, tokens, key):
+    # SSE body: one event per sentence with its MP3 (base64) as soon as it is
+    # synthesized, while the rest of the reply is still being generated. The
+    # session lock is held for the whole stream; a client that disconnects
+    # closes this generator, which stops the generation and the synthesis.
+    parts = []
+    with session.lock:
+        sentences = synthesize_stream(tokens, synth=audio_store.synthesize)
+        try:
+            for index, (sentence, audio) in enumerate(sentences):
+                parts.append(sentence)
+                yield sse_event({"index": index, "text": sentence, "audio": base64.b64encode(audio).decode()})
+        finally:
+            sentences.close()
+    services.sessions.update(session)
+    yield sse_event({key: "".join(parts)}, event="done")
+
+def score_answer(session, user_input):
+    # Once the reply is in memory, the answer is scored in the background
+    # against the question before that reply
+    score_turn(services.scoring_llm, session.scorecard, last_question(session.memory.chat_memory.messages[:-2]), user_input)
+
+def analysis_tokens(session):
+    # The prompt waits for the last scores, so it is only built once the stream holds the lock
+    yield from stream_text(services.analysis_llm, analysis_prompt(session.scorecard))
 
+def follow_up_tokens(session, user_input):
+    yield from stream_predict(session.conversation, FOLLOW_UP_PROMPT.format(user_input=user_input))
+    score_answer(session, user_input)
+
+@timed("stt")
 def speech_to_text(audio_file):
-    r = sr.Recognizer()
-    with sr.AudioFile(audio_file) as source:
-        audio = r.record(source)
-    
+    # The upload is read exactly once; long WAV recordings are split at silences
+    # and the chunks transcribed concurrently
+    groq_client = services.groq_client
     try:
-        transcription = groq_client.audio.transcriptions.create(
-            file=("audio.wav", audio_file.read()),
-            model="whisper-large-v3",
-            response_format="text"
-        )
-        return transcription
+        return transcribe(groq_client, audio_file.read(), audio_file.filename or "audio.wav")
+    except QueueTimeout:
+        # Answered with a 503, not sent on as the candidate's words
+        raise
     except Exception as e:
-        return str(e)
+        return str(e), None
 
-@app.route('/')
+@api.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/upload_resume', methods=['POST'])
+@api.route('/upload_resume', methods=['POST'])
 def upload_resume():
     if 'resume' not in request.files:
         return jsonify({"error": "No file part"}), 400
@@ -71,71 +117,146 @@ def upload_resume():
     if file.filename == '':
         return jsonify({"error": "No selected file"}), 400
     if file and file.filename.endswith('.pdf'):
-        filename = secure_filename(file.filename)
-        file_path = os.path.join('uploads', filename)
-        file.save(file_path)
-        resume_content = extract_text_from_pdf(file_path)
-        return jsonify({"message": "Resume uploaded successfully", "content": resume_content})
+        try:
+            profile = extract_profile(file)
+        except IngestError as e:
+            return jsonify({"error": e.message}), e.status
+        # A new upload starts a fresh interview, replacing the candidate's previous one
+        previous = services.sessions.get(request.form.get('session_id'))
+        if previous is not None:
+            cancel_pregeneration(previous)
+            services.sessions.delete(previous.session_id)
+        session = services.sessions.create()
+        # The memory keeps the resume as the fixed prefix of every prompt
+        session.set_resume(profile)
+        # Start on the introduction and first question now
+        pregenerate(session, services.pregen_llm)
+        services.sessions.update(session)
+        return jsonify({"message": "Resume uploaded successfully", "content": profile.text,
+                        "session_id": session.session_id})
     return jsonify({"error": "Invalid file type"}), 400
 
-@app.route('/start_interview', methods=['POST'])
+@api.route('/start_interview', methods=['POST'])
 def start_interview():
-    resume_content = request.json.get('resume_content')
-    if not resume_content:
-        return jsonify({"error": "Resume content is required"}), 400
-    
-    initial_prompt = f"""You are an expert interviewer conducting a job interview. The candidate has uploaded their resume, and you have the following information:
-
-Resume content: {resume_content}
+    session = get_session()
+    if session is None:
+        if requested_session_id():
+            return session_not_found()
+        data = request.get_json(silent=True) or {}
+        if not data.get('resume_content'):
+            return jsonify({"error": "session_id is required. Upload a resume to get one."}), 400
+        # Clients from before sessions send the resume text back instead
+        session = services.sessions.create()
+        session.set_resume(build_profile(data['resume_content']))
+    elif not session.resume_content:
+        return session_not_found()
 
-Based on this resume, conduct a professional interview. Start by briefly introducing yourself and asking the candidate for a brief introduction. Then, proceed with relevant questions based on their resume."""
-
-    initial_response = conversation.predict(input=initial_prompt)
+    with session.lock:
+        # The opening generated since the upload, if it is ready in time
+        initial_response = take_pregenerated(session, START_INTERVIEW_PROMPT)
+        if initial_response is None:
+            with timed("llm"):
+                initial_response = session.conversation.predict(input=START_INTERVIEW_PROMPT)
+    services.sessions.update(session)
     audio_file = text_to_speech(initial_response)
-    return jsonify({"response": initial_response, "audio": audio_file})
+    return jsonify({"response": initial_response, "audio": audio_file, "session_id": session.session_id})
 
-@app.route('/continue_interview', methods=['POST'])
+@api.route('/continue_interview', methods=['POST'])
 def continue_interview():
     user_input = request.json.get('user_input')
     if not user_input:
         return jsonify({"error": "User input is required"}), 400
-    
-    prompt = f"""Continue the professional job interview. Ask relevant follow-up questions based on the candidate's previous responses and their resume. Ensure the conversation flows naturally and mimics a real-life interview environment.
-
-The candidate's latest response is: '{user_input}'
+    session = get_session()
+    if session is None:
+        return session_not_found()
 
-Provide your next question or response."""
-
-    ai_response = conversation.predict(input=prompt)
+    prompt = FOLLOW_UP_PROMPT.format(user_input=user_input)
+    with session.lock:
+        with timed("llm"):
+            ai_response = session.conversation.predict(input=prompt)
+        score_answer(session, user_input)
+    services.sessions.update(session)
     audio_file = text_to_speech(ai_response)
     return jsonify({"response": ai_response, "audio": audio_file})
 
-@app.route('/end_interview', methods=['POST'])
+@api.route('/end_interview', methods=['POST'])
 def end_interview():
-    analysis_prompt = """Based on the entire interview conversation, provide a comprehensive analysis of the candidate. Include the following:
-
-1. Overall impression
-2. Strengths demonstrated
-3. Areas for improvement
-4. Communication skills
-5. Technical competence (if applicable)
-6. Cultural fit
-7. Recommendations for the candidate
-
-Provide a detailed yet concise analysis, offering constructive feedback and actionable insights."""
-
-    analysis = conversation.predict(input=analysis_prompt)
+    session = get_session()
+    if session is None:
+        return session_not_found()
+    with session.lock:
+        if session.scorecard.has_turns():
+            # Summarize the per-answer scores instead of re-reading the interview
+            with timed("llm"):
+                analysis = services.analysis_llm.invoke(analysis_prompt(session.scorecard)).content
+        else:
+            with timed("llm"):
+                analysis = session.conversation.predict(input=ANALYSIS_PROMPT)
+    services.sessions.update(session)
     audio_file = text_to_speech(analysis)
     return jsonify({"analysis": analysis, "audio": audio_file})
 
-@app.route('/transcribe_audio', methods=['POST'])
+@api.route('/continue_interview/stream', methods=['POST'])
+def continue_interview_stream():
+    user_input = request.json.get('user_input')
+    if not user_input:
+        return jsonify({"error": "User input is required"}), 400
+    session = get_session()
+    if session is None:
+        return session_not_found()
+    return event_stream_response(speak_stream(session, follow_up_tokens(session, user_input), "response"))
+
+@api.route('/end_interview/stream', methods=['POST'])
+def end_interview_stream():
+    session = get_session()
+    if session is None:
+        return session_not_found()
+    if session.scorecard.has_turns():
+        return event_stream_response(speak_stream(session, analysis_tokens(session), "analysis"))
+    return event_stream_response(speak_stream(session, stream_predict(session.conversation, ANALYSIS_PROMPT), "analysis"))
+
+@api.route('/transcribe_audio', methods=['POST'])
 def transcribe_audio():
     if 'audio' not in request.files:
         return jsonify({"error": "No audio file provided"}), 400
     audio_file = request.files['audio']
-    transcription = speech_to_text(audio_file)
-    return jsonify({"transcription": transcription})
+    transcription, stats = speech_to_text(audio_file)
+    return jsonify({"transcription": transcription, "stats": stats})
+
+@api.route('/audio/<key>.mp3', methods=['GET'])
+def audio(key):
+    return clip_response(audio_store, key, request.headers)
+
+@api.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    llm_cache = services.built('llm_cache')
+    sessions = services.built('sessions')
+    return jsonify({
+        "pdf_extraction": extraction_cache.stats(),
+        "llm": llm_cache.stats() if llm_cache else None,
+        "sessions": sessions.stats() if sessions else None,
+        "outbound": scheduler.stats(),
+        "tts": audio_store.stats(),
+    })
+
+def service_unavailable(e):
+    # Raised on first use of the models without a GROQ_API_KEY
+    return jsonify({"error": e.message}), e.status
+
+def create_app():
+    app = Flask(__name__)
+
+    # Per-stage latency and token counts at GET /metrics
+    instrument(app, request)
+
+    app.register_blueprint(api)
+    app.register_error_handler(ServiceUnavailable, service_unavailable)
+
+    # Import LangChain and build the models while the first requests come in
+    services.warm_in_background(AudioServices.WARM)
+    return app
+
+app = create_app()
 
 if __name__ == "__main__":
-    os.makedirs('uploads', exist_ok=True)
     app.run(debug=True)
\ No newline at end of file
@@ -1,116 +1,90 @@
-from flask import Flask, request, jsonify
-import os
-import PyPDF2
-from langchain_groq import ChatGroq
-from langchain.memory import ConversationBufferMemory
-from langchain.chains import ConversationChain
-from dotenv import load_dotenv
-from flask_cors import CORS
-
-app = Flask(__name__)
-
-# Initialize CORS with allowed origins
-CORS(app, resources={r"/*": {"origins": "http://localhost:5173"}})
-
-# Load environment variables
-load_dotenv()
-groq_api_key = os.environ['GROQ_API_KEY']
-
-# Initialize the language model
-llm = ChatGroq(groq_api_key=groq_api_key, model_name="llama-3.1-70b-versatile")
-
-# Create a conversation memory
-memory = ConversationBufferMemory(return_messages=True)
-
-# Create a conversation chain
-conversation = ConversationChain(llm=llm, memory=memory, verbose=True)
-
-# Global variable to store resume content
-resume_content = ""
-user_message_count = 0  # Counter for user messages
-
-@app.route('/upload', methods=['POST'])
-def upload_resume():
-    global resume_content, user_message_count
-    user_message_count = 0  # Reset counter on new upload
-    if 'resume' not in request.files:
-        return jsonify({"error": "No file part"}), 400
-    file = request.files['resume']
-    if file.filename == '':
-        return jsonify({"error": "No selected file"}), 400
-    if file and file.filename.endswith('.pdf'):
-        pdf_reader = PyPDF2.PdfReader(file)
-        resume_content = ""
-        for page in pdf_reader.pages:
-            text = page.extract_text()
-            if text:
-                resume_content += text
-        return jsonify({"message": "Resume uploaded successfully"}), 200
-    else:
-        return jsonify({"error": "Invalid file format. Please upload a PDF."}), 400
-
-
-@app.route('/start', methods=['GET'])
-def start():
-    response = "Hello, I hope you're having a great day. I'm ready to begin our interview whenever you are. Please let me know when you're ready to start."
-    return jsonify({"response": response})
-
-@app.route('/interview', methods=['POST'])
+from flask import Blueprint, jsonify
+from interview_api import create_app, deduplicated, parse_interview_request, score_answer, services
+from metrics import timed
+from pregen import take_pregenerated
+from usage import record_turn
+import prompts
+from scoring import analysis_prompt, last_question, score_turn
+from prompts import FINAL_ANALYSIS_PROMPT
+from streaming import event_stream_response, stream_turn
+
+# Upload, /start, /usage, /scores and /cache_stats come from interview_api.py
+api = Blueprint('interview', __name__)
+
+@api.route('/interview', methods=['POST'])
 def interview():
-    global resume_content, user_message_count
-    if not request.is_json:
-        return jsonify({"error": "Invalid Content-Type. Expected application/json."}), 415
-    data = request.get_json()
-    if 'message' not in data:
-        return jsonify({"error": "Missing 'message' field."}), 400
-    user_input = data['message']
-    
-    if not resume_content:
-        return jsonify({"error": "Resume not found. Please upload a resume first."}), 400
-    
-    user_message_count += 1  # Increment the message count
+    session, user_input, error = parse_interview_request()
+    if error:
+        return error
 
-    if not memory.chat_memory:
-        # First message in the interview
-        prompt = f"""You are an expert interviewer conducting a job interview. The candidate has uploaded their resume, and you have the following information:
-
-Resume content: {resume_content}
-
-Based on this resume, conduct a professional interview. Start by briefly introducing yourself and asking the candidate for a brief introduction. Then, proceed with relevant questions based on their resume and responses.
-
-The candidate's first message is: '{user_input}'
-
-Provide your response and the first interview question."""
-    else:
-        if user_message_count < 10:
-            # Continue the interview
-            prompt = f"""Continue the professional job interview. Ask relevant follow-up questions based on the candidate's previous responses and their resume. Ensure the conversation flows naturally and mimics a real-life interview environment.
-
-Resume content: {resume_content}
-
-The candidate's latest response is: '{user_input}'
+    response = deduplicated('interview', session.session_id, lambda: interview_turn(session, user_input), user_input)
+    return jsonify({"response": response})
 
-Provide your next question or response."""
+def interview_turn(session, user_input):
+    with session.lock:
+        final = is_final_turn(session)
+        if final and session.scorecard.has_turns():
+            # Summarize the per-answer scores instead of re-reading the interview
+            prompt = final_analysis_prompt(session, user_input)
+            with timed("llm"):
+                response = services.analysis_llm.invoke(prompt).content
+            record_turn(session, prompt, response, history_tokens=0)
         else:
-            # Generate analysis after 10 messages
-            prompt = f"""The interview is now complete after 10 responses from the candidate. Please provide a comprehensive analysis based on the entire interview conversation, including the following:
-
-1. Overall impression
-2. Strengths demonstrated
-3. Areas for improvement
-4. Communication skills
-5. Technical competence (if applicable)
-6. Cultural fit
-7. Recommendations for the candidate
-
-Additionally, provide a rating out of 10 for each of the above categories and calculate an overall score out of 100.
-
-Candidate's resume content: {resume_content}
-Candidate's conversation history: {memory.buffer}
-"""
-    
-    response = conversation.predict(input=prompt)
-    return jsonify({"response": response})
+            prompt = build_interview_prompt(session, user_input, final)
+            response = take_pregenerated(session, prompt)
+            if response is None:
+                with timed("llm"):
+                    response = session.conversation.predict(input=prompt)
+            record_turn(session, prompt, response)
+            if not final:
+                score_answer(session, user_input)
+        session.user_message_count += 1
+        if final:
+            # The scores line goes to the leaderboard, not to the candidate
+            response = services.record_analysis(session, response)
+    services.sessions.update(session)
+    return response
+
+@api.route('/interview/stream', methods=['POST'])
+def interview_stream():
+    session, user_input, error = parse_interview_request()
+    if error:
+        return error
+    # Only decides which stream to open: the message is counted, and the answer
+    # scored, under the lock of the stream once its reply is complete
+    final = is_final_turn(session)
+
+    def after_turn():
+        session.user_message_count += 1
+        if not final:
+            score_answer(session, user_input)
+
+    if final and session.scorecard.has_turns():
+        return event_stream_response(stream_turn(
+            services.sessions, session, lambda: final_analysis_prompt(session, user_input),
+            llm=services.analysis_llm, after_turn=after_turn, **services.scored_stream(session)))
+    return event_stream_response(stream_turn(
+        services.sessions, session, lambda: build_interview_prompt(session, user_input, final),
+        after_turn=after_turn, **(services.scored_stream(session) if final else {})))
+
+
+def is_final_turn(session):
+    # Whether the candidate's next message ends the interview (after 10 messages)
+    return bool(session.memory.chat_memory.messages) and session.user_message_count + 1 >= 10
+
+def final_analysis_prompt(session, user_input):
+    # Called with the session lock held: the last answer goes straight to the
+    # scorer and the analysis waits for it
+    score_turn(services.scoring_llm, session.scorecard, last_question(session.memory.chat_memory.messages), user_input)
+    return analysis_prompt(session.scorecard, session.memory.summary, score_line=True)
+
+def build_interview_prompt(session, user_input, final):
+    if final:
+        # Generate analysis after 10 messages
+        return FINAL_ANALYSIS_PROMPT
+    return prompts.build_interview_prompt(session, user_input)
+
+app = create_app(api)
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,251 @@
+# Every outbound Groq call (LLM and Whisper) waits here for room under the
+# account's requests-per-minute and tokens-per-minute limits instead of being
+# sent into a 429. Calls queue per model in priority order: a live candidate's
+# turn goes ahead of transcription, which goes ahead of analyses and scoring,
+# which go ahead of batch screening. A call still queued at its class deadline
+# fails with a 503 rather than waiting forever.
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+
+from metrics import OUTBOUND_QUEUE_SECONDS, OUTBOUND_QUEUE_TIMEOUTS
+from services import ServiceUnavailable
+
+# Highest priority first
+PRIORITIES = ("live", "transcription", "analysis", "batch")
+
+# Priority class of each router call type
+CALL_PRIORITIES = {
+    "interview": "live",
+    "pregen": "live",
+    "summary": "live",
+    "scoring": "analysis",
+    "analysis": "analysis",
+    "screening": "batch",
+}
+
+# Longest each class waits in the queue, in seconds (GROQ_QUEUE_DEADLINES="live=10,batch=600")
+DEFAULT_DEADLINES = {"live": 20.0, "transcription": 30.0, "analysis": 60.0, "batch": 300.0}
+
+# No call waits locally unless limits are configured, as (requests per minute,
+# tokens per minute) per model: GROQ_RATE_LIMITS="llama-3.1-70b-versatile=100/100000",
+# where "free" stands for Groq's free-tier limits below. The buckets are per
+# process: with N workers, configure each with 1/N of the account's limits.
+FREE_TIER_LIMITS = {
+    "llama-3.1-70b-versatile": (30, 6000),
+    "llama-3.1-8b-instant": (30, 20000),
+    "whisper-large-v3": (20, 0),
+}
+# Models without limits of their own; GROQ_RPM / GROQ_TPM, 0 means no limit
+DEFAULT_RPM = int(os.getenv('GROQ_RPM', 0))
+DEFAULT_TPM = int(os.getenv('GROQ_TPM', 0))
+
+
+class QueueTimeout(ServiceUnavailable):
+    pass
+
+
+def parse_limits(spec):
+    # "free,model=rpm/tpm,..." -> {"model": (rpm, tpm)}
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        if item == "free":
+            limits.update(FREE_TIER_LIMITS)
+            continue
+        model, _, rates = item.partition('=')
+        rpm, _, tpm = rates.partition('/')
+        limits[model.strip()] = (int(rpm), int(tpm or 0))
+    return limits
+
+
+def parse_deadlines(spec):
+    deadlines = dict(DEFAULT_DEADLINES)
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, seconds = item.partition('=')
+        deadlines[name.strip()] = float(seconds)
+    return deadlines
+
+
+class TokenBucket:
+    """Requests and tokens of one model, refilled continuously up to a minute's worth.
+
+    A limit of 0 is not enforced.
+    """
+
+    def __init__(self, rpm, tpm):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = float(rpm)
+        self.tokens = float(tpm)
+        self.updated = time.monotonic()
+        self.waiters = []  # heap of _Waiter, the head is the only one served
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        self.updated = now
+        self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+        self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+
+    def cost(self, tokens):
+        # A prompt larger than a minute's worth waits for a full bucket instead of forever
+        return min(tokens, self.tpm)
+
+    def wait_time(self, tokens, now):
+        """Seconds until a call of `tokens` fits, 0 if it fits now."""
+        self._refill(now)
+        wait = 0.0
+        if self.rpm and self.requests < 1:
+            wait = (1 - self.requests) * 60 / self.rpm
+        if self.tpm and self.tokens < tokens:
+            wait = max(wait, (tokens - self.tokens) * 60 / self.tpm)
+        return wait
+
+    def take(self, tokens):
+        if self.rpm:
+            self.requests -= 1
+        if self.tpm:
+            self.tokens -= tokens
+
+
+class _Waiter:
+    __slots__ = ('priority', 'seq', 'tokens', 'wake')
+
+    def __init__(self, priority, seq, tokens, wake):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.wake = wake
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class OutboundScheduler:
+    """Priority queues in front of per-model token buckets.
+
+    `acquire(model, tokens, priority)` (or `aacquire` from a coroutine) returns
+    once the call may be sent. Within a model, calls are served strictly in
+    priority order, first come first served within a class; a call waits for
+    its turn and for the bucket to hold a request and its estimated tokens.
+    """
+
+    def __init__(self, limits=None, deadlines=None, default_limit=(DEFAULT_RPM, DEFAULT_TPM)):
+        self.limits = dict(limits or {})
+        self.deadlines = dict(DEFAULT_DEADLINES, **(deadlines or {}))
+        self.default_limit = default_limit
+        self.granted = dict.fromkeys(PRIORITIES, 0)
+        self.timeouts = dict.fromkeys(PRIORITIES, 0)
+        self._buckets = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(parse_limits(os.getenv('GROQ_RATE_LIMITS', '')),
+                   parse_deadlines(os.getenv('GROQ_QUEUE_DEADLINES', '')))
+
+    def _bucket(self, model):
+        # Called with the lock held
+        bucket = self._buckets.get(model)
+        if bucket is None:
+            bucket = self._buckets[model] = TokenBucket(*self.limits.get(model, self.default_limit))
+        return bucket
+
+    def _enqueue(self, model, tokens, priority, wake):
+        with self._lock:
+            bucket = self._bucket(model)
+            waiter = _Waiter(PRIORITIES.index(priority), next(self._seq), bucket.cost(tokens), wake)
+            heapq.heappush(bucket.waiters, waiter)
+            return bucket, waiter
+
+    def _try(self, bucket, waiter):
+        # 0 once granted, else the seconds to wait (None: not at the head of the queue)
+        with self._lock:
+            if bucket.waiters[0] is not waiter:
+                return None
+            wait = bucket.wait_time(waiter.tokens, time.monotonic())
+            if wait:
+                return wait
+            bucket.take(waiter.tokens)
+            heapq.heappop(bucket.waiters)
+            if bucket.waiters:
+                bucket.waiters[0].wake()
+            return 0
+
+    def _leave(self, bucket, waiter):
+        # Out of the queue without being served: the next call may be at the head now
+        with self._lock:
+            if waiter in bucket.waiters:
+                bucket.waiters.remove(waiter)
+                heapq.heapify(bucket.waiters)
+                if bucket.waiters:
+                    bucket.waiters[0].wake()
+
+    def _timeout(self, bucket, waiter, priority):
+        self._leave(bucket, waiter)
+        with self._lock:
+            self.timeouts[priority] += 1
+        OUTBOUND_QUEUE_TIMEOUTS.labels(priority).inc()
+        return QueueTimeout("The interviewer is busy right now. Please try again in a moment.")
+
+    def _granted(self, priority, started):
+        with self._lock:
+            self.granted[priority] += 1
+        OUTBOUND_QUEUE_SECONDS.labels(priority).observe(time.monotonic() - started)
+
+    def acquire(self, model, tokens, priority):
+        started = time.monotonic()
+        deadline = started + self.deadlines[priority]
+        woken = threading.Event()
+        bucket, waiter = self._enqueue(model, tokens, priority, woken.set)
+        while True:
+            woken.clear()
+            wait = self._try(bucket, waiter)
+            if wait == 0:
+                self._granted(priority, started)
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise self._timeout(bucket, waiter, priority)
+            woken.wait(remaining if wait is None else min(wait, remaining))
+
+    async def aacquire(self, model, tokens, priority):
+        started = time.monotonic()
+        deadline = started + self.deadlines[priority]
+        loop = asyncio.get_running_loop()
+        woken = asyncio.Event()
+        bucket, waiter = self._enqueue(model, tokens, priority, lambda: loop.call_soon_threadsafe(woken.set))
+        try:
+            while True:
+                woken.clear()
+                wait = self._try(bucket, waiter)
+                if wait == 0:
+                    self._granted(priority, started)
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self._timeout(bucket, waiter, priority)
+                try:
+                    await asyncio.wait_for(woken.wait(), remaining if wait is None else min(wait, remaining))
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            # The request went away while queued
+            self._leave(bucket, waiter)
+            raise
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            models = {}
+            for model, bucket in self._buckets.items():
+                bucket._refill(now)
+                models[model] = {"queued": len(bucket.waiters), "rpm": bucket.rpm, "tpm": bucket.tpm,
+                                 "requests_left": int(bucket.requests), "tokens_left": int(bucket.tokens)}
+            return {"models": models, "granted": dict(self.granted), "timeouts": dict(self.timeouts)}
+
+
+scheduler = OutboundScheduler.from_env()
@@ -0,0 +1,138 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from langchain.memory.chat_memory import BaseChatMemory
+
+from resume_profile import RESUME_FOCUS
+from usage import estimate_tokens
+
+# Default number of tokens the verbatim part of the history may use
+DEFAULT_HISTORY_TOKENS = 1500
+
+summary_executor = ThreadPoolExecutor(max_workers=int(os.getenv('SUMMARY_WORKERS', 2)),
+                                      thread_name_prefix='summary')
+
+SUMMARY_PROMPT = """Progressively summarize the job interview below, adding onto the previous summary. Keep the questions asked, the candidate's key answers and any notable strengths or weaknesses. Reply with the new summary only, in at most 150 words.
+
+Previous summary:
+{summary}
+
+New lines of the interview:
+{lines}
+
+New summary:"""
+
+
+def format_messages(messages):
+    lines = []
+    for message in messages:
+        speaker = "Candidate" if message.type == "human" else "Interviewer"
+        lines.append(f"{speaker}: {message.content}")
+    return "\n".join(lines)
+
+
+class InterviewMemory(BaseChatMemory):
+    """Conversation memory whose rendered size stays flat as the interview grows.
+
+    The history is rendered as the resume and any question-bank questions
+    retrieved for it (once, as a fixed prefix), a rolling summary of older
+    turns and the most recent turns verbatim. With a `profile`
+    (resume_profile.py) turns after the opening carry only the resume sections
+    the last question and the new input are about. When the verbatim turns
+    exceed `max_history_tokens` the oldest ones are folded into the summary,
+    down to half the budget so the summarizer only runs every few turns. The
+    summary is written in the background, off the turn and its session lock;
+    the turns stay verbatim until a later turn finds it ready and swaps them
+    for it. Without a `summarizer` LLM the oldest turns are simply dropped.
+    """
+
+    resume: str = ""
+    profile: Optional[Any] = None
+    questions: List[str] = []
+    summary: str = ""
+    max_history_tokens: int = DEFAULT_HISTORY_TOKENS
+    min_recent_turns: int = 2
+    summarizer: Optional[Any] = None
+    memory_key: str = "history"
+    last_history_tokens: int = 0
+    # (future of the new summary, number of oldest messages it folds in)
+    summarizing: Optional[Any] = None
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        self.apply_summary()
+        parts = []
+        if self.resume:
+            resume = self.resume
+            messages = self.chat_memory.messages
+            if self.profile is not None and RESUME_FOCUS and messages:
+                resume = self.profile.relevant(f"{messages[-1].content}\n{inputs.get(self.input_key or 'input', '')}")
+            parts.append(f"Candidate's resume:\n{resume}")
+        if self.questions:
+            questions = "\n".join(f"- {question}" for question in self.questions)
+            parts.append(f"Vetted questions relevant to this resume (prefer these, one at a time):\n{questions}")
+        if self.summary:
+            parts.append(f"Summary of the earlier interview:\n{self.summary}")
+        if self.chat_memory.messages:
+            parts.append(format_messages(self.chat_memory.messages))
+        history = "\n\n".join(parts)
+        self.last_history_tokens = estimate_tokens(history)
+        return {self.memory_key: history}
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        super().save_context(inputs, outputs)
+        self.apply_summary()
+        self.prune()
+
+    def clear(self) -> None:
+        super().clear()
+        self.summary = ""
+        if self.summarizing is not None:
+            self.summarizing[0].cancel()
+            self.summarizing = None
+
+    def prune(self):
+        if self.summarizing is not None:
+            # The turns folded last time are still being summarized
+            return
+        messages = self.chat_memory.messages
+        if estimate_tokens(format_messages(messages)) <= self.max_history_tokens:
+            return
+        keep = messages
+        evicted = []
+        while len(keep) > 2 * self.min_recent_turns and \
+                estimate_tokens(format_messages(keep)) > self.max_history_tokens // 2:
+            evicted.extend(keep[:2])
+            keep = keep[2:]
+        if not evicted:
+            return
+        if self.summarizer is not None:
+            prompt = SUMMARY_PROMPT.format(summary=self.summary or "(none)", lines=format_messages(evicted))
+            self.summarizing = summary_executor.submit(self._summarize, prompt), len(evicted)
+            return
+        self.chat_memory.clear()
+        self.chat_memory.add_messages(keep)
+
+    def _summarize(self, prompt):
+        # Runs on a summary worker
+        return self.summarizer.invoke(prompt).content.strip()
+
+    def apply_summary(self):
+        """Swap the oldest turns for the summary written in the background, if it is ready."""
+        if self.summarizing is None or not self.summarizing[0].done():
+            return
+        future, folded = self.summarizing
+        self.summarizing = None
+        try:
+            self.summary = future.result()
+        except Exception:
+            # Dropped without a summary, as without a summarizer
+            pass
+        messages = list(self.chat_memory.messages)
+        self.chat_memory.clear()
+        self.chat_memory.add_messages(messages[folded:])
+
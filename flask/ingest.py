@@ -0,0 +1,227 @@
+import contextlib
+import hashlib
+import os
+import signal
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from metrics import timed
+from pdf_cache import PAGE_BREAK, extraction_cache
+
+# Per-document budgets; anything beyond them is rejected or truncated
+MAX_PDF_BYTES = int(os.getenv('MAX_PDF_BYTES', 10 * 1024 * 1024))
+MAX_PDF_PAGES = int(os.getenv('MAX_PDF_PAGES', 20))
+PDF_TIME_BUDGET = float(os.getenv('PDF_TIME_BUDGET', 5.0))  # seconds
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', min(4, os.cpu_count() or 1)))
+PAGES_PER_TASK = 4
+CHUNK_SIZE = 64 * 1024
+
+IngestResult = namedtuple('IngestResult', ['text', 'sha256', 'pages_total', 'pages_extracted', 'truncated'])
+
+
+class IngestError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+        return _pool
+
+
+def recycle_pool(pool):
+    """Kill the workers of `pool`; the next `get_pool()` starts a new one.
+
+    Tasks still running in it fail with BrokenProcessPool.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    for process in list((pool._processes or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _submit(fn, *args):
+    # (future, pool it runs in)
+    pool = get_pool()
+    try:
+        return pool.submit(fn, *args), pool
+    except (BrokenProcessPool, RuntimeError):
+        # Broken by a dead worker, or recycled since get_pool()
+        recycle_pool(pool)
+        pool = get_pool()
+        return pool.submit(fn, *args), pool
+
+
+def spool_upload(file, max_bytes=MAX_PDF_BYTES):
+    """Copy an upload to a temp file in chunks, enforcing the size cap.
+
+    Returns `(path, sha256)`; the caller removes the file.
+    """
+    stream = getattr(file, 'stream', file)
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(suffix='.pdf')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise IngestError(f"PDF is larger than {max_bytes // (1024 * 1024)} MB.", status=413)
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest()
+
+
+@contextlib.contextmanager
+def _time_limit(deadline):
+    # Raises TimeoutError in the worker at `deadline` (time.time()), so a slow PDF
+    # frees its own worker instead of the pool being killed under every upload.
+    # Pool workers run their tasks on the main thread, where signals are delivered;
+    # without setitimer (Windows) the task runs to the end.
+    if not hasattr(signal, 'setitimer'):
+        yield
+        return
+
+    def expire(signum, frame):
+        raise TimeoutError("PDF extraction ran out of time")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, max(deadline - time.time(), 0.001))
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _extract_pages(path, start, stop, deadline):
+    # Runs in a worker process: the page count, and the text of pages start..stop that exist
+    import PyPDF2
+
+    with _time_limit(deadline):
+        pdf_reader = PyPDF2.PdfReader(path)
+        pages_total = len(pdf_reader.pages)
+        return pages_total, [pdf_reader.pages[i].extract_text() or "" for i in range(start, min(stop, pages_total))]
+
+
+def extract_pages(path, max_pages=MAX_PDF_PAGES, time_budget=PDF_TIME_BUDGET):
+    """Extract up to `max_pages` pages in the process pool within `time_budget` seconds.
+
+    The first task also counts the pages, so the PDF is only ever parsed in the
+    workers; the other pages are extracted in parallel once the count is known.
+    Tasks still parsing when the budget runs out stop themselves in their
+    worker, which goes on to the next task; the pool is only replaced when a
+    worker dies.
+
+    Returns `(page_texts, pages_total)`; pages that did not finish in time are None.
+    """
+    deadline = time.monotonic() + time_budget
+    # The workers' copy of the deadline, on the clock shared between processes
+    worker_deadline = time.time() + time_budget
+    pages, pages_total = [], None
+    tasks = {}  # future -> (first page, pool)
+    retried = set()
+
+    def submit(start, stop):
+        future, pool = _submit(_extract_pages, path, start, stop, worker_deadline)
+        tasks[future] = start, pool
+
+    submit(0, min(PAGES_PER_TASK, max_pages))
+    while tasks:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        done, _ = wait(tasks, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            start, pool = tasks.pop(future)
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool) and start not in retried:
+                # A worker died
+                recycle_pool(pool)
+                retried.add(start)
+                submit(start, min(start + PAGES_PER_TASK, max_pages))
+                continue
+            if isinstance(error, TimeoutError):
+                # Stopped in its worker at the deadline
+                continue
+            if error is not None:
+                if start == 0:
+                    raise IngestError(f"Could not read PDF: {error}")
+                continue
+            total, texts = future.result()
+            if start == 0:
+                pages_total = total
+                pages = [None] * min(total, max_pages)
+                for rest in range(PAGES_PER_TASK, len(pages), PAGES_PER_TASK):
+                    submit(rest, min(rest + PAGES_PER_TASK, len(pages)))
+            pages[start:start + len(texts)] = texts
+    # Out of time: drop the tasks not started yet; the running ones stop at the same deadline
+    for future in tasks:
+        future.cancel()
+    if pages_total is None:
+        raise IngestError(f"Could not read PDF within {time_budget:g} seconds.")
+    return pages, pages_total
+
+
+def extract_text(path, sha256, max_pages=MAX_PDF_PAGES, time_budget=PDF_TIME_BUDGET):
+    """Extract the PDF at `path` under the page and time budgets, through the extraction cache.
+
+    Extractions are stored in the shared extraction cache unless the time budget
+    ran out, in which case whatever pages finished are returned in page order.
+    """
+    text = extraction_cache.lookup(sha256)
+    if text is not None:
+        return IngestResult(text, sha256, None, None, False)
+    pages, pages_total = extract_pages(path, max_pages, time_budget)
+    extracted = [page for page in pages if page is not None]
+    text = PAGE_BREAK.join(extracted)
+    truncated = len(extracted) < pages_total
+    # The page cap is deterministic, so only a time-budget cut-off skips the cache
+    if len(extracted) == len(pages):
+        extraction_cache.store(sha256, text)
+    return IngestResult(text, sha256, pages_total, len(extracted), truncated)
+
+
+@timed("pdf")
+def ingest_pdf(file, max_pages=MAX_PDF_PAGES, time_budget=PDF_TIME_BUDGET):
+    """Spool, hash and extract an uploaded PDF under the size, page and time budgets."""
+    path, sha256 = spool_upload(file)
+    try:
+        return extract_text(path, sha256, max_pages, time_budget)
+    finally:
+        os.remove(path)
+
+
+def ingest_bytes(data, max_pages=MAX_PDF_PAGES, time_budget=PDF_TIME_BUDGET):
+    """`ingest_pdf` of a PDF already read into memory, such as a member of a batch archive."""
+    if len(data) > MAX_PDF_BYTES:
+        raise IngestError(f"PDF is larger than {MAX_PDF_BYTES // (1024 * 1024)} MB.", status=413)
+    fd, path = tempfile.mkstemp(suffix='.pdf')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            out.write(data)
+        return extract_text(path, hashlib.sha256(data).hexdigest(), max_pages, time_budget)
+    finally:
+        os.remove(path)
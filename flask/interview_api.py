@@ -0,0 +1,148 @@
+# The parts of the two Flask interview apps (chat_working_prototype.py and
+# flask_chat_only.py) that do not differ between them: the services, resume
+# upload, session lookup, usage and scores, and the app factory. Each app keeps
+# its own /interview (and /analysis) routes on a blueprint of its own.
+from flask import Blueprint, Flask, request, jsonify
+from dotenv import load_dotenv
+from flask_cors import CORS
+from batch_screening import MAX_REQUEST_BYTES, batch_blueprint
+from coalesce import request_key, stream_digest
+from ingest import IngestError, ingest_pdf
+from leaderboard import leaderboard_blueprint
+from metrics import instrument
+from resume_profile import build_profile
+from pregen import cancel_pregeneration, pregenerate
+from scoring import last_question, score_turn
+from prompts import GREETING
+from services import InterviewServices, ServiceUnavailable
+
+# Load environment variables
+load_dotenv()
+
+# Router, models, caches, question bank and sessions, each built on first use
+services = InterviewServices()
+
+common = Blueprint('common', __name__)
+
+def get_session():
+    data = request.get_json(silent=True) or {}
+    session_id = data.get('session_id') or request.headers.get('X-Session-Id') or request.args.get('session_id')
+    return services.sessions.get(session_id)
+
+def deduplicated(endpoint, session_id, run, *content, by_content=True):
+    # Identical requests in flight share one run; a retry with the same
+    # Idempotency-Key within IDEMPOTENCY_TTL gets the first run's result
+    key, replayable = request_key(endpoint, session_id, request.headers.get('Idempotency-Key'), *content,
+                                  by_content=by_content)
+    return services.inflight.do(key, run, replayable, endpoint)
+
+@common.route('/upload', methods=['POST'])
+def upload_resume():
+    if 'resume' not in request.files:
+        return jsonify({"error": "No file part"}), 400
+    file = request.files['resume']
+    if file.filename == '':
+        return jsonify({"error": "No selected file"}), 400
+    if file and file.filename.endswith('.pdf'):
+        previous_id = request.form.get('session_id')
+        vacancy = request.form.get('vacancy')
+        # Only a retry carrying the same Idempotency-Key and file gets the first upload's session back
+        body, status = deduplicated('upload', previous_id, lambda: new_interview(file, previous_id, vacancy),
+                                    stream_digest(file.stream), vacancy, by_content=False)
+        return jsonify(body), status
+    else:
+        return jsonify({"error": "Invalid file format. Please upload a PDF."}), 400
+
+def new_interview(file, previous_id, vacancy=None):
+    # Returns (body, status) of the upload
+    try:
+        result = ingest_pdf(file)
+    except IngestError as e:
+        return {"error": e.message}, e.status
+    # Cleaned, deduplicated and split into sections once, here
+    profile = build_profile(result.text)
+    previous = services.sessions.get(previous_id)
+    if previous is not None:
+        # Uploading again replaces the candidate's interview, including its pre-generated opening
+        cancel_pregeneration(previous)
+        services.sessions.delete(previous.session_id)
+    session = services.sessions.create()  # A new upload starts a fresh interview
+    session.set_resume(profile)
+    if vacancy:
+        session.vacancy = vacancy
+    question_bank = services.question_bank
+    if question_bank is not None:
+        session.memory.questions = question_bank.query(profile.text)
+    # Generate the introduction and first question while the candidate reads the greeting
+    pregenerate(session, services.pregen_llm)
+    services.sessions.update(session)
+    return {"message": "Resume uploaded successfully", "session_id": session.session_id, "truncated": result.truncated,
+            "resume_tokens": profile.tokens}, 200
+
+
+@common.route('/start', methods=['GET'])
+def start():
+    return jsonify({"response": GREETING})
+
+def parse_interview_request():
+    # Returns (session, user_input, error_response)
+    if not request.is_json:
+        return None, None, (jsonify({"error": "Invalid Content-Type. Expected application/json."}), 415)
+    data = request.get_json()
+    if 'message' not in data:
+        return None, None, (jsonify({"error": "Missing 'message' field."}), 400)
+    session = get_session()
+    if session is None or not session.resume_content:
+        return None, None, (jsonify({"error": "Resume not found. Please upload a resume first."}), 400)
+    return session, data['message'], None
+
+def score_answer(session, user_input):
+    # Called with the session lock held once the reply is in memory: the answer
+    # is scored in the background against the question before that reply
+    score_turn(services.scoring_llm, session.scorecard, last_question(session.memory.chat_memory.messages[:-2]), user_input)
+
+@common.route('/usage', methods=['GET'])
+def usage():
+    session = get_session()
+    if session is None:
+        return jsonify({"error": "Interview session not found. Please upload a resume first."}), 404
+    return jsonify({"turns": session.token_usage})
+
+@common.route('/scores', methods=['GET'])
+def scores():
+    session = get_session()
+    if session is None:
+        return jsonify({"error": "Interview session not found. Please upload a resume first."}), 404
+    return jsonify(session.scorecard.as_dict())
+
+@common.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify(services.cache_stats())
+
+def service_unavailable(e):
+    # Raised on first use of the models without a GROQ_API_KEY
+    return jsonify({"error": e.message}), e.status
+
+def create_app(api):
+    # `api` holds the app's own interview routes
+    app = Flask(__name__)
+    # The largest body is a batch of resumes; anything bigger is refused before it is read
+    app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES
+
+    # Initialize CORS with allowed origins
+    CORS(app, resources={r"/*": {"origins": "http://localhost:5173"}})
+
+    # Per-stage latency and token counts at GET /metrics
+    instrument(app, request)
+
+    app.register_blueprint(common)
+    app.register_blueprint(api)
+    app.register_error_handler(ServiceUnavailable, service_unavailable)
+    # Recruiter-facing bulk screening: POST /batch/screen
+    app.register_blueprint(batch_blueprint(lambda: services.screening_llm))
+    # Final-analysis rankings per vacancy: GET /leaderboard, GET /leaderboard/percentile
+    app.register_blueprint(leaderboard_blueprint(lambda: services.leaderboard))
+
+    # Import LangChain and build the models while the first requests come in
+    services.warm_in_background(InterviewServices.WARM)
+    return app
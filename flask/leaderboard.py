@@ -0,0 +1,407 @@
+# Final-analysis scores as typed records, and a leaderboard of them per vacancy.
+# The analysis prompts ask for a JSON line of the ratings (prompts.SCORE_LINE);
+# replies without a valid one fall back to reading the "8/10" ratings out of
+# the text. Records are stored in SQLite and mirrored in sorted in-memory
+# indexes per (vacancy, category), so top-K and percentile queries never
+# rescan the candidates.
+import hmac
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import namedtuple
+
+from sessions import DEFAULT_VACANCY
+
+# Rated out of 10, in the order of the analysis prompts; `overall` is out of 100
+ANALYSIS_CATEGORIES = ("overall_impression", "strengths", "areas_for_improvement", "communication",
+                       "technical_competence", "cultural_fit", "recommendations")
+CATEGORIES = ("overall",) + ANALYSIS_CATEGORIES
+MAX_SCORES = dict(dict.fromkeys(ANALYSIS_CATEGORIES, 10), overall=100)
+
+ALL_VACANCIES = "*"
+DEFAULT_TOP_K = 10
+MAX_TOP_K = 1000
+BULK_SYNC = 256  # new records from which the indexes are re-sorted rather than inserted into
+
+# Headings of the analysis sections, for the ratings of a reply without the JSON line
+CATEGORY_LABELS = {
+    "overall_impression": r"overall impression",
+    "strengths": r"strengths",
+    "areas_for_improvement": r"areas? (?:for|of) improvement",
+    "communication": r"communication",
+    "technical_competence": r"technical (?:competence|skills)",
+    "cultural_fit": r"cultural fit",
+    "recommendations": r"recommendations?",
+}
+LABEL_LINE = re.compile(r"^[\s#*>-]*(?:\d+[.)]\s*)?[*_\s]*(" + "|".join(
+    f"(?P<{category}>{label})" for category, label in CATEGORY_LABELS.items()) + ")", re.IGNORECASE | re.MULTILINE)
+RATING = re.compile(r"(\d{1,3}(?:\.\d+)?)\s*(?:/|out of)\s*(100|10)\b", re.IGNORECASE)
+FENCE_LINE = re.compile(r"^```(?:json)?$")
+JSON_LINE = re.compile(r"^[ \t`]*(?:json)?[ \t]*(\{[^{}\n]*\"overall[^{}\n]*\})[ \t`]*$", re.MULTILINE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS score_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL UNIQUE,
+    vacancy TEXT NOT NULL,
+    candidate TEXT NOT NULL,
+    scores TEXT NOT NULL,
+    source TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS category_scores (
+    record_id INTEGER NOT NULL REFERENCES score_records (id) ON DELETE CASCADE,
+    vacancy TEXT NOT NULL,
+    category TEXT NOT NULL,
+    score REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS category_scores_rank ON category_scores (vacancy, category, score);
+CREATE INDEX IF NOT EXISTS category_scores_record ON category_scores (record_id);
+"""
+
+ScoreRecord = namedtuple('ScoreRecord', ['session_id', 'vacancy', 'candidate', 'scores', 'source', 'created'])
+
+
+def validate_scores(data):
+    # The known categories whose value is a number in range; None if there are none
+    scores = {}
+    for category in CATEGORIES:
+        value = data.get(category)
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and 0 <= value <= MAX_SCORES[category]:
+            scores[category] = float(value)
+    return scores or None
+
+
+def parse_score_line(text):
+    """`(text without the line, scores)` from the JSON line ending an analysis, or `(text, None)`."""
+    for match in reversed(list(JSON_LINE.finditer(text))):
+        try:
+            data = json.loads(match.group(1))
+        except ValueError:
+            continue
+        scores = validate_scores(data) if isinstance(data, dict) else None
+        if scores:
+            # The line goes, with the code fence the model may have put around it
+            before = re.sub(r"(\s*```(?:json)?)+\s*$", "", text[:match.start()])
+            return (before + text[match.end():]).strip().removesuffix("```").strip(), scores
+    return text, None
+
+
+def parse_score_text(text):
+    """Ratings written in the analysis itself ("Rating: 8/10" under each heading, "72/100" overall)."""
+    labels = [(match.start(), next(name for name, value in match.groupdict().items() if value))
+              for match in LABEL_LINE.finditer(text)]
+    data = {}
+    for match in RATING.finditer(text):
+        value, scale = float(match.group(1)), match.group(2)
+        if scale == "100":
+            data.setdefault("overall", value)
+            continue
+        category = None
+        for position, name in labels:
+            if position > match.start():
+                break
+            category = name
+        if category is not None:
+            data.setdefault(category, value)
+    return validate_scores(data)
+
+
+def split_scores(text):
+    """`(analysis to show, scores, source)` of a final analysis; scores is None when it has none."""
+    cleaned, scores = parse_score_line(text)
+    if scores:
+        return cleaned, scores, "json"
+    scores = parse_score_text(text)
+    return text, scores, "text" if scores else None
+
+
+class ScoreLineFilter:
+    """Keeps the JSON score line (and a code fence around it) out of a streamed analysis.
+
+    `feed(token)` returns the part of the stream that can be shown now: a line
+    that may still turn out to be the score line is held back until it ends.
+    `end()` returns whatever is still held once the stream is over.
+    """
+
+    def __init__(self):
+        self._line = ""  # the current line, held back
+        self._fences = ""  # fence lines held until the next line shows whether they wrap the score line
+        self._passing = False  # the current line is not the score line and is shown as it comes
+        self._dropped = False
+
+    @staticmethod
+    def _may_be_score_line(partial):
+        start = partial.strip(" \t`")
+        return not start or start.startswith("{") or "json".startswith(start) or start.startswith("json")
+
+    def _finish(self, line):
+        stripped = line.strip()
+        if FENCE_LINE.match(stripped):
+            if not self._dropped:
+                self._fences += line
+            return ""
+        if stripped and parse_score_line(stripped)[1] is not None:
+            self._fences = ""
+            self._dropped = True
+            return ""
+        text = self._fences + line
+        self._fences = ""
+        return text
+
+    def feed(self, token):
+        shown = []
+        for piece in token.splitlines(keepends=True):
+            if self._passing:
+                shown.append(piece)
+            else:
+                self._line += piece
+                if not piece.endswith("\n") and not self._may_be_score_line(self._line):
+                    shown.append(self._fences + self._line)
+                    self._fences = self._line = ""
+                    self._passing = True
+            if piece.endswith("\n"):
+                if not self._passing:
+                    shown.append(self._finish(self._line))
+                    self._line = ""
+                self._passing = False
+        return "".join(shown)
+
+    def end(self):
+        text = self._finish(self._line) if self._line else ""
+        rest = "" if self._dropped else self._fences
+        self._line = self._fences = ""
+        return text + rest
+
+
+class Leaderboard:
+    """Score records of finished interviews, ranked per vacancy and category.
+
+    Every record is written to SQLite (`path`, shared by the workers on the
+    host) and kept in one sorted list of `(score, session_id)` per (vacancy,
+    category), plus one across all vacancies. A top-K query reads the end of a
+    list and a percentile query is a binary search. Records written by other
+    workers are picked up by id before each query. A session analysed again
+    replaces its earlier record.
+    """
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(SCHEMA)
+        self._records = {}  # session_id -> ScoreRecord
+        self._index = {}  # (vacancy, category) -> sorted [(score, session_id)]
+        self._last_id = 0
+        self._lock = threading.Lock()
+        with self._lock:
+            self._sync()
+
+    def add(self, session_id, scores, vacancy=DEFAULT_VACANCY, candidate="", source="json"):
+        record = ScoreRecord(session_id, vacancy or DEFAULT_VACANCY, candidate, dict(scores), source, time.time())
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                # A new analysis of the session replaces its record (and, by cascade,
+                # its category rows) under a new, higher id
+                self._db.execute("DELETE FROM score_records WHERE session_id = ?", (session_id,))
+                cursor = self._db.execute(
+                    "INSERT INTO score_records (session_id, vacancy, candidate, scores, source, created) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (session_id, record.vacancy, candidate, json.dumps(record.scores), source, record.created))
+                self._db.executemany(
+                    "INSERT INTO category_scores (record_id, vacancy, category, score) VALUES (?, ?, ?, ?)",
+                    [(cursor.lastrowid, record.vacancy, category, score) for category, score in record.scores.items()])
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._sync()
+        return record
+
+    def _sync(self):
+        # Called with the lock held: index the records added since the last call, by any worker
+        rows = self._db.execute(
+            "SELECT id, session_id, vacancy, candidate, scores, source, created FROM score_records "
+            "WHERE id > ? ORDER BY id", (self._last_id,)).fetchall()
+        if not rows:
+            return
+        self._last_id = rows[-1][0]
+        latest = {}
+        for _, session_id, vacancy, candidate, scores, source, created in rows:
+            latest[session_id] = ScoreRecord(session_id, vacancy, candidate, json.loads(scores), source, created)
+        if len(latest) < BULK_SYNC:
+            for record in latest.values():
+                self._index_record(record)
+            return
+        # Many new records (the load at start-up): appended, then each list sorted once
+        for session_id in latest:
+            self._unindex(session_id)
+        touched = set()
+        for record in latest.values():
+            self._records[record.session_id] = record
+            for key, entry in self._entries(record):
+                self._index.setdefault(key, []).append(entry)
+                touched.add(key)
+        for key in touched:
+            self._index[key].sort()
+
+    def _index_record(self, record):
+        self._unindex(record.session_id)
+        self._records[record.session_id] = record
+        for key, entry in self._entries(record):
+            insort(self._index.setdefault(key, []), entry)
+
+    def _unindex(self, session_id):
+        previous = self._records.get(session_id)
+        if previous is None:
+            return
+        for key, entry in self._entries(previous):
+            entries = self._index[key]
+            position = bisect_left(entries, entry)
+            if position < len(entries) and entries[position] == entry:
+                del entries[position]
+
+    @staticmethod
+    def _entries(record):
+        for category, score in record.scores.items():
+            for vacancy in (record.vacancy, ALL_VACANCIES):
+                yield (vacancy, category), (score, record.session_id)
+
+    def top(self, vacancy=ALL_VACANCIES, category="overall", k=DEFAULT_TOP_K):
+        """The `k` best records on `category`, best first, and how many were ranked."""
+        with self._lock:
+            self._sync()
+            entries = self._index.get((vacancy, category), [])
+            best = entries[-k:] if k > 0 else []
+            return [self._records[session_id] for _, session_id in reversed(best)], len(entries)
+
+    def percentile(self, score, vacancy=ALL_VACANCIES, category="overall"):
+        """`(percent of ranked candidates scoring below score, rank of score, count)`; rank 1 is the best."""
+        with self._lock:
+            self._sync()
+            entries = self._index.get((vacancy, category), [])
+            below = bisect_left(entries, (score,))
+            above = len(entries) - bisect_right(entries, (score, "\uffff"))
+        count = len(entries)
+        return (100.0 * below / count if count else None), above + 1, count
+
+    def record(self, session_id):
+        with self._lock:
+            self._sync()
+            return self._records.get(session_id)
+
+    def stats(self):
+        with self._lock:
+            vacancies = {vacancy for vacancy, _ in self._index if vacancy != ALL_VACANCIES}
+            return {"records": len(self._records), "vacancies": len(vacancies)}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def load_leaderboard():
+    """The leaderboard at LEADERBOARD_DB, or in process memory when it is not set.
+
+    Set it to a file outside the source tree (e.g. /var/lib/interview/leaderboard.db)
+    to share the rankings between workers and keep them across restarts.
+    """
+    return Leaderboard(os.getenv('LEADERBOARD_DB') or ":memory:")
+
+
+def record_json(record, category):
+    return {"session_id": record.session_id, "candidate": record.candidate, "vacancy": record.vacancy,
+            "score": record.scores.get(category), "scores": record.scores, "source": record.source}
+
+
+def query_args(args):
+    # (vacancy, category, error) of a leaderboard query string
+    vacancy = args.get('vacancy') or ALL_VACANCIES
+    category = args.get('category') or "overall"
+    if category not in CATEGORIES:
+        return vacancy, category, f"Unknown category. Expected one of: {', '.join(CATEGORIES)}."
+    return vacancy, category, None
+
+
+def top_response(board, args):
+    """`(body, status)` of GET /leaderboard?vacancy=&category=&k=."""
+    vacancy, category, error = query_args(args)
+    if error:
+        return {"error": error}, 400
+    try:
+        k = min(int(args.get('k', DEFAULT_TOP_K)), MAX_TOP_K)
+    except ValueError:
+        return {"error": "'k' must be an integer."}, 400
+    records, count = board.top(vacancy, category, k)
+    return {"vacancy": vacancy, "category": category, "count": count,
+            "top": [record_json(record, category) for record in records]}, 200
+
+
+def percentile_response(board, args):
+    """`(body, status)` of GET /leaderboard/percentile?vacancy=&category=&session_id= (or &score=)."""
+    vacancy, category, error = query_args(args)
+    if error:
+        return {"error": error}, 400
+    session_id = args.get('session_id')
+    if session_id:
+        record = board.record(session_id)
+        if record is None or category not in record.scores:
+            return {"error": "No scores recorded for this session."}, 404
+        score = record.scores[category]
+        if not args.get('vacancy'):
+            # Ranked among the candidates for the same vacancy unless asked otherwise
+            vacancy = record.vacancy
+    else:
+        try:
+            score = float(args.get('score', ''))
+        except ValueError:
+            return {"error": "Pass 'session_id' or a numeric 'score'."}, 400
+    percentile, rank, count = board.percentile(score, vacancy, category)
+    return {"vacancy": vacancy, "category": category, "score": score, "percentile": percentile,
+            "rank": rank, "count": count}, 200
+
+
+def leaderboard_blueprint(get_board, framework=None):
+    """Blueprint of GET /leaderboard and GET /leaderboard/percentile.
+
+    `get_board()` returns the Leaderboard; it is called per request so it can be
+    built on first use. `framework` is the module providing Blueprint, request
+    and jsonify: flask by default, quart in the ASGI app, which runs these
+    views in its executor, off the event loop. The routes list every
+    candidate's name and scores, so they answer only requests carrying
+    `Authorization: Bearer <LEADERBOARD_TOKEN>`; without the variable they are
+    not served at all.
+    """
+    if framework is None:
+        import flask as framework
+
+    bp = framework.Blueprint('leaderboard', __name__)
+    token = os.getenv('LEADERBOARD_TOKEN', '')
+
+    @bp.before_request
+    def require_token():
+        if not token:
+            return framework.jsonify({"error": "The leaderboard is disabled. Set LEADERBOARD_TOKEN to serve it."}), 403
+        scheme, _, given = framework.request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(given.encode(), token.encode()):
+            return framework.jsonify({"error": "A valid leaderboard token is required."}), 401
+
+    @bp.route('/leaderboard', methods=['GET'])
+    def top():
+        body, status = top_response(get_board(), framework.request.args)
+        return framework.jsonify(body), status
+
+    @bp.route('/leaderboard/percentile', methods=['GET'])
+    def percentile():
+        body, status = percentile_response(get_board(), framework.request.args)
+        return framework.jsonify(body), status
+
+    return bp
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.caches import BaseCache
+
+DEFAULT_TTL = 24 * 60 * 60  # seconds
+DEFAULT_MAX_ENTRIES = 2048
+DEFAULT_THRESHOLD = 0.95
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+
+def normalize(text):
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def split_prompt(prompt):
+    """Split a serialized chat prompt into `(context, query)`.
+
+    `prompt` is LangChain's JSON dump of the message list. The query is the
+    candidate's latest input: the text after the last "Human:" of a
+    ConversationChain prompt, or else the content of the last message.
+    Everything before it (template, resume, history) is the context.
+    """
+    try:
+        messages = json.loads(prompt)
+        parts = [f"{m['id'][-1]}: {m['kwargs']['content']}" for m in messages]
+    except (ValueError, KeyError, TypeError):
+        parts = [prompt]
+    text = normalize("\n".join(parts))
+    index = text.rfind("Human: ")
+    if index == -1:
+        index = len(text) - len(normalize(parts[-1]))
+    return text[:index], text[index:]
+
+
+class TierStats:
+    def __init__(self):
+        self.lookups = 0
+        self.hits = 0
+
+    def as_dict(self):
+        return {"lookups": self.lookups, "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0}
+
+
+class ExactTier:
+    """Hash of model + normalized prompt -> generations, with TTL and LRU eviction."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = TierStats()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        self.stats.lookups += 1
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SemanticTier:
+    """Nearest-neighbour lookup of the query among entries with the same exact context.
+
+    Embeddings live in one preallocated matrix, so a lookup is a single
+    matrix-vector product over all slots with stale and foreign-context slots
+    masked out. A full tier overwrites the least recently used slot.
+    """
+
+    def __init__(self, dim, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL,
+                 threshold=DEFAULT_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.stats = TierStats()
+        self._embeddings = np.zeros((max_entries, dim), dtype=np.float32)
+        self._contexts = np.zeros(max_entries, dtype=np.int64)
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._values = [None] * max_entries
+
+    def get(self, context_key, vector):
+        self.stats.lookups += 1
+        now = time.monotonic()
+        valid = (self._contexts == context_key) & (self._expires > now)
+        if not valid.any():
+            return None
+        scores = self._embeddings @ vector
+        scores[~valid] = -1.0
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        self._last_used[best] = now
+        self.stats.hits += 1
+        return self._values[best]
+
+    def put(self, context_key, vector, value):
+        now = time.monotonic()
+        # Reuse an expired slot if there is one, otherwise evict the least recently used
+        expired = np.flatnonzero(self._expires <= now)
+        slot = int(expired[0]) if len(expired) else int(np.argmin(self._last_used))
+        self._embeddings[slot] = vector
+        self._contexts[slot] = context_key
+        self._expires[slot] = now + self.ttl
+        self._last_used[slot] = now
+        self._values[slot] = value
+
+    def clear(self):
+        self._expires[:] = 0
+        self._values = [None] * self.max_entries
+
+    def __len__(self):
+        return int((self._expires > time.monotonic()).sum())
+
+
+def sentence_transformer_embedder(model_name=EMBEDDING_MODEL):
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name)
+
+    def embed(text):
+        return model.encode(text, normalize_embeddings=True).astype(np.float32)
+
+    return embed, model.get_sentence_embedding_dimension()
+
+
+class InterviewLLMCache(BaseCache):
+    """LangChain LLM cache with an exact tier and an optional semantic tier.
+
+    Both tiers are keyed on the model configuration and the exact context
+    (template, resume and history). The semantic tier also matches a
+    differently worded candidate input whose embedding is within `threshold`
+    cosine similarity; prompts with no separate context only hit the exact tier.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, semantic=False,
+                 threshold=DEFAULT_THRESHOLD, embedder=None):
+        self.exact = ExactTier(max_entries, ttl)
+        self.semantic = None
+        self.embed = None
+        if semantic:
+            self.embed, dim = embedder or sentence_transformer_embedder()
+            self.semantic = SemanticTier(dim, max_entries, ttl, threshold)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _keys(prompt, llm_string):
+        context, query = split_prompt(prompt)
+        context_hash = hashlib.sha256(f"{llm_string}\x00{context}".encode()).digest()
+        exact_key = hashlib.sha256(context_hash + query.encode()).hexdigest()
+        # Only a query split off its context is matched by meaning. A prompt with
+        # no context (a single templated message, like the scoring and analysis
+        # calls) is mostly template: its near neighbours are other candidates
+        if not context:
+            return exact_key, None, query
+        return exact_key, int.from_bytes(context_hash[:8], 'little', signed=True), query
+
+    def lookup(self, prompt, llm_string):
+        exact_key, context_key, query = self._keys(prompt, llm_string)
+        with self._lock:
+            value = self.exact.get(exact_key)
+        if value is not None or self.semantic is None or context_key is None:
+            return value
+        # Embed outside the lock; the matrix search itself is cheap
+        vector = self.embed(query)
+        with self._lock:
+            return self.semantic.get(context_key, vector)
+
+    def update(self, prompt, llm_string, return_val):
+        exact_key, context_key, query = self._keys(prompt, llm_string)
+        vector = self.embed(query) if self.semantic is not None and context_key is not None else None
+        with self._lock:
+            self.exact.put(exact_key, return_val)
+            if vector is not None:
+                self.semantic.put(context_key, vector, return_val)
+
+    def clear(self, **kwargs):
+        with self._lock:
+            self.exact.clear()
+            if self.semantic is not None:
+                self.semantic.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = {"exact": dict(self.exact.stats.as_dict(), entries=len(self.exact))}
+            if self.semantic is not None:
+                stats["semantic"] = dict(self.semantic.stats.as_dict(), entries=len(self.semantic))
+            return stats
+
+
+def configure_llm_cache():
+    """The LLM cache from environment settings, or None unless LLM_CACHE=1.
+
+    It is not installed as LangChain's global cache: the router only gives it
+    to the scoring and analysis models, so interview turns are never replayed.
+    Their prompts are single templated messages, which the semantic tier
+    (LLM_SEMANTIC_CACHE=1) leaves to the exact tier.
+    """
+    if os.getenv('LLM_CACHE', '0') != '1':
+        return None
+    cache = InterviewLLMCache(
+        max_entries=int(os.getenv('LLM_CACHE_ENTRIES', DEFAULT_MAX_ENTRIES)),
+        ttl=int(os.getenv('LLM_CACHE_TTL', DEFAULT_TTL)),
+        semantic=os.getenv('LLM_SEMANTIC_CACHE', '0') == '1',
+        threshold=float(os.getenv('LLM_SEMANTIC_THRESHOLD', DEFAULT_THRESHOLD)),
+    )
+    return cache
@@ -0,0 +1,485 @@
+import asyncio
+import contextvars
+import math
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Iterator
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_groq import ChatGroq
+
+from groq_scheduler import CALL_PRIORITIES, QueueTimeout, scheduler
+from metrics import LLM_CALLS, LLM_MODEL_SECONDS, LLM_ROUTES, LLM_TOKENS
+from usage import estimate_tokens
+
+DEFAULT_MODEL = "llama-3.1-70b-versatile"
+DEFAULT_FALLBACK_MODEL = "llama-3.1-8b-instant"
+
+# Seconds each kind of call may take on the primary model before the fallback is
+# tried: the whole reply for plain calls, the first token for streamed ones
+DEFAULT_BUDGETS = {
+    "interview": 4.0,
+    "pregen": 10.0,
+    "scoring": 10.0,
+    "summary": 10.0,
+    "screening": 20.0,
+    "analysis": 30.0,
+}
+# Calls whose reply only depends on their prompt; the others (interview turns,
+# openings, summaries) always go to the model
+CACHED_CALLS = ("scoring", "analysis")
+LATENCY_WINDOW = 60.0  # seconds of samples behind routing decisions
+PROBE_EVERY = 10  # while the primary is skipped, still try it (hedged) every Nth call
+# Completion tokens counted against the tokens-per-minute limit when a call sets no max_tokens
+EXPECTED_COMPLETION_TOKENS = int(os.getenv('LLM_EXPECTED_COMPLETION_TOKENS', 300))
+
+route_executor = ThreadPoolExecutor(max_workers=int(os.getenv('ROUTER_WORKERS', 16)),
+                                    thread_name_prefix='llm-route')
+
+_DONE = object()
+
+
+class TokenCounter(BaseCallbackHandler):
+    """Counts prompt and completion tokens of every LLM call.
+
+    Uses the usage Groq reports when there is one, and the same estimate as the
+    history budget otherwise (streamed and cached replies).
+    """
+
+    def __init__(self):
+        self._prompt_tokens = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._prompt_tokens[run_id] = sum(estimate_tokens(str(m.content)) for batch in messages for m in batch)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._prompt_tokens[run_id] = sum(estimate_tokens(prompt) for prompt in prompts)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        estimated_prompt = self._prompt_tokens.pop(run_id, 0)
+        usage = (response.llm_output or {}).get('token_usage') or {}
+        completion = usage.get('completion_tokens')
+        if completion is None:
+            completion = sum(estimate_tokens(g.text) for batch in response.generations for g in batch)
+        LLM_CALLS.inc()
+        LLM_TOKENS.labels('prompt').inc(usage.get('prompt_tokens') or estimated_prompt)
+        LLM_TOKENS.labels('completion').inc(completion)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.discard(run_id)
+
+    def discard(self, run_id):
+        # A call that will never end, such as a stream closed early
+        self._prompt_tokens.pop(run_id, None)
+
+
+token_counter = TokenCounter()
+
+
+def parse_budgets(spec):
+    # "interview=3,analysis=20" -> {"interview": 3.0, "analysis": 20.0}
+    budgets = dict(DEFAULT_BUDGETS)
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, seconds = item.partition('=')
+        budgets[name.strip()] = float(seconds)
+    return budgets
+
+
+class LatencyWindow:
+    """Latencies of one model over the last `window` seconds; failures count as infinitely slow."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self._samples = deque()
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        now = time.monotonic()
+        with self._lock:
+            self._samples.append((now, seconds))
+            self._trim(now)
+
+    def percentile(self, q):
+        with self._lock:
+            self._trim(time.monotonic())
+            values = sorted(seconds for _, seconds in self._samples)
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def _trim(self, now):
+        while self._samples and now - self._samples[0][0] > self.window:
+            self._samples.popleft()
+
+
+class ModelRouter:
+    """Routes each call to the primary model or, when it is too slow, a smaller fallback.
+
+    Every call type has a latency budget. A call starts on the primary; if it has
+    not answered (or, streaming, produced its first token) within the budget the
+    same request is hedged to the fallback and whichever answers first wins. A
+    primary whose recent p90 is already over budget, or that is failing, is
+    skipped in favour of the fallback, except for a periodic hedged probe.
+    """
+
+    def __init__(self, primary, fallback=None, budgets=None, callbacks=None, cache=None):
+        self.primary = primary
+        self.fallback = fallback
+        self.budgets = dict(DEFAULT_BUDGETS, **(budgets or {}))
+        self.callbacks = callbacks
+        self.cache = cache
+        self.latency = {"primary": LatencyWindow(), "fallback": LatencyWindow()}
+        self.first_token = {"primary": LatencyWindow(), "fallback": LatencyWindow()}
+        self._skipped = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, groq_api_key, callbacks=None, cache=None):
+        """Primary LLM_MODEL and fallback LLM_FALLBACK_MODEL (empty disables it) on Groq."""
+        timeout = float(os.getenv('LLM_TIMEOUT', 60))
+        primary = ChatGroq(groq_api_key=groq_api_key, model_name=os.getenv('LLM_MODEL', DEFAULT_MODEL),
+                           request_timeout=timeout, max_retries=1)
+        fallback_model = os.getenv('LLM_FALLBACK_MODEL', DEFAULT_FALLBACK_MODEL)
+        fallback = None
+        if fallback_model:
+            fallback = ChatGroq(groq_api_key=groq_api_key, model_name=fallback_model,
+                                request_timeout=timeout, max_retries=1)
+        budgets = parse_budgets(os.getenv('LLM_LATENCY_BUDGETS', ''))
+        return cls(primary, fallback, budgets, callbacks, cache)
+
+    def model(self, call_type):
+        """A chat model for one kind of call, usable wherever ChatGroq was."""
+        cache = self.cache if call_type in CACHED_CALLS and self.cache is not None else False
+        return RoutedChatModel(router=self, call_type=call_type, callbacks=self.callbacks, cache=cache)
+
+    def model_name(self, role):
+        model = self.primary if role == "primary" else self.fallback
+        return getattr(model, 'model_name', role)
+
+    def budget(self, call_type):
+        return self.budgets.get(call_type, DEFAULT_BUDGETS["interview"])
+
+    def skip_primary(self, call_type, streaming):
+        # Recent p90 of the primary already over budget: don't wait for it to prove it again
+        if self.fallback is None:
+            return False
+        windows = self.first_token if streaming else self.latency
+        p90 = windows["primary"].percentile(0.9)
+        if p90 is None or p90 <= self.budget(call_type):
+            return False
+        with self._lock:
+            self._skipped += 1
+            return self._skipped % PROBE_EVERY != 0
+
+    def record(self, role, seconds, first_token=None):
+        self.latency[role].add(seconds)
+        if first_token is not None:
+            self.first_token[role].add(first_token)
+        if math.isfinite(seconds):
+            LLM_MODEL_SECONDS.labels(self.model_name(role)).observe(seconds)
+
+    def route(self, call_type, role, reason):
+        LLM_ROUTES.labels(call_type, self.model_name(role), reason).inc()
+
+    def stats(self):
+        return {
+            role: {
+                "model": self.model_name(role),
+                "p50_seconds": self.latency[role].percentile(0.5),
+                "p90_seconds": self.latency[role].percentile(0.9),
+                "p90_first_token_seconds": self.first_token[role].percentile(0.9),
+            }
+            for role in ("primary", "fallback") if role == "primary" or self.fallback is not None
+        }
+
+
+class RoutedChatModel(BaseChatModel):
+    """Chat model view of a ModelRouter for one call type."""
+
+    router: Any
+    call_type: str = "interview"
+
+    @property
+    def _llm_type(self) -> str:
+        return "routed-chat"
+
+    @property
+    def _identifying_params(self):
+        # Part of the LLM cache key: replies are cached per model pair, not per call type
+        return {"primary": self.router.model_name("primary"), "fallback": self.router.model_name("fallback")}
+
+    def _cost(self, role, messages, kwargs):
+        # (model name, estimated tokens, priority class) of a call, for the outbound scheduler
+        model = self.router.primary if role == "primary" else self.router.fallback
+        completion = kwargs.get('max_tokens') or getattr(model, 'max_tokens', None) or EXPECTED_COMPLETION_TOKENS
+        tokens = sum(estimate_tokens(str(m.content)) for m in messages) + completion
+        return self.router.model_name(role), tokens, CALL_PRIORITIES.get(self.call_type, "live")
+
+    def _call(self, role, messages, stop, kwargs):
+        model = self.router.primary if role == "primary" else self.router.fallback
+        # Queued behind the rate limits; a queue timeout is not the model's latency
+        scheduler.acquire(*self._cost(role, messages, kwargs))
+        started = time.perf_counter()
+        try:
+            result = model._generate(messages, stop=stop, **kwargs)
+        except Exception:
+            self.router.record(role, float('inf'))
+            raise
+        self.router.record(role, time.perf_counter() - started)
+        return result
+
+    def _submit(self, role, messages, stop, kwargs):
+        # The caller's context (request timings and the like) carries over to the worker
+        return route_executor.submit(contextvars.copy_context().run, self._call, role, messages, stop, kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        router = self.router
+        if router.fallback is None:
+            router.route(self.call_type, "primary", "primary")
+            return self._call("primary", messages, stop, kwargs)
+        if router.skip_primary(self.call_type, streaming=False):
+            router.route(self.call_type, "fallback", "primary_slow")
+            return self._call("fallback", messages, stop, kwargs)
+        futures = {self._submit("primary", messages, stop, kwargs): "primary"}
+        done, _ = wait(futures, timeout=router.budget(self.call_type))
+        if not done:
+            futures[self._submit("fallback", messages, stop, kwargs)] = "fallback"
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    if futures[future] == "primary" and len(futures) == 1:
+                        # Failed within budget (rate limit, 5xx): go straight to the fallback
+                        futures[self._submit("fallback", messages, stop, kwargs)] = "fallback"
+                        pending = {f for f in futures if not f.done()}
+                    continue
+                role = futures[future]
+                reason = "primary" if role == "primary" else ("hedged" if error is None else "primary_error")
+                router.route(self.call_type, role, reason)
+                return future.result()
+        raise error
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        router = self.router
+        chunks = queue.Queue()
+        stops = {}
+
+        def produce(role):
+            model = router.primary if role == "primary" else router.fallback
+            try:
+                scheduler.acquire(*self._cost(role, messages, kwargs))
+            except QueueTimeout as e:
+                chunks.put((role, e))
+                return
+            if stops[role].is_set():
+                # The other model answered while this one was queued
+                return
+            started = time.perf_counter()
+            first = None
+            upstream = model._stream(messages, stop=stop, **kwargs)
+            try:
+                for chunk in upstream:
+                    if stops[role].is_set():
+                        # Lost the race: its time so far is a lower bound on its latency
+                        elapsed = time.perf_counter() - started
+                        router.record(role, elapsed, elapsed if first is None else first)
+                        return
+                    if first is None:
+                        first = time.perf_counter() - started
+                    chunks.put((role, chunk))
+                chunks.put((role, _DONE))
+                router.record(role, time.perf_counter() - started, first)
+            except Exception as e:
+                router.record(role, float('inf'), float('inf'))
+                chunks.put((role, e))
+            finally:
+                upstream.close()
+
+        def start(role):
+            stops[role] = threading.Event()
+            threading.Thread(target=contextvars.copy_context().run, args=(produce, role), daemon=True,
+                             name=f'llm-stream-{role}').start()
+
+        if router.fallback is not None and router.skip_primary(self.call_type, streaming=True):
+            start("fallback")
+            reason = "primary_slow"
+        else:
+            start("primary")
+            reason = "primary"
+        deadline = time.monotonic() + router.budget(self.call_type)
+        winner = None
+        error = None
+        finished = False
+        try:
+            while True:
+                hedge = winner is None and router.fallback is not None and "fallback" not in stops
+                try:
+                    role, item = chunks.get(timeout=max(0.0, deadline - time.monotonic()) if hedge else None)
+                except queue.Empty:
+                    start("fallback")
+                    reason = "hedged"
+                    continue
+                if winner is None:
+                    if isinstance(item, Exception):
+                        # Failed before its first token: the other model may still answer
+                        error = item
+                        stops[role].set()
+                        if "fallback" not in stops and router.fallback is not None:
+                            start("fallback")
+                            reason = "primary_error"
+                        elif all(event.is_set() for event in stops.values()):
+                            raise error
+                        continue
+                    winner = role
+                    router.route(self.call_type, role, reason if role == "fallback" else "primary")
+                    for other, event in stops.items():
+                        if other != role:
+                            event.set()
+                if role != winner:
+                    continue
+                if item is _DONE:
+                    finished = True
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            for event in stops.values():
+                event.set()
+            if not finished and run_manager is not None:
+                token_counter.discard(run_manager.run_id)
+
+    async def _acall(self, role, messages, stop, kwargs):
+        model = self.router.primary if role == "primary" else self.router.fallback
+        await scheduler.aacquire(*self._cost(role, messages, kwargs))
+        started = time.perf_counter()
+        try:
+            result = await model._agenerate(messages, stop=stop, **kwargs)
+        except Exception:
+            self.router.record(role, float('inf'))
+            raise
+        self.router.record(role, time.perf_counter() - started)
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        router = self.router
+        if router.fallback is None:
+            router.route(self.call_type, "primary", "primary")
+            return await self._acall("primary", messages, stop, kwargs)
+        if router.skip_primary(self.call_type, streaming=False):
+            router.route(self.call_type, "fallback", "primary_slow")
+            return await self._acall("fallback", messages, stop, kwargs)
+        tasks = {asyncio.ensure_future(self._acall("primary", messages, stop, kwargs)): "primary"}
+        done, _ = await asyncio.wait(tasks, timeout=router.budget(self.call_type))
+        if not done:
+            tasks[asyncio.ensure_future(self._acall("fallback", messages, stop, kwargs))] = "fallback"
+        pending = set(tasks)
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        if tasks[task] == "primary" and len(tasks) == 1:
+                            tasks[asyncio.ensure_future(self._acall("fallback", messages, stop, kwargs))] = "fallback"
+                            pending = {t for t in tasks if not t.done()}
+                        continue
+                    role = tasks[task]
+                    reason = "primary" if role == "primary" else ("hedged" if error is None else "primary_error")
+                    router.route(self.call_type, role, reason)
+                    return task.result()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        router = self.router
+        chunks = asyncio.Queue()
+        tasks = {}
+
+        async def produce(role):
+            model = router.primary if role == "primary" else router.fallback
+            try:
+                await scheduler.aacquire(*self._cost(role, messages, kwargs))
+            except QueueTimeout as e:
+                await chunks.put((role, e))
+                return
+            started = time.perf_counter()
+            first = None
+            try:
+                async for chunk in model._astream(messages, stop=stop, **kwargs):
+                    if first is None:
+                        first = time.perf_counter() - started
+                    await chunks.put((role, chunk))
+                await chunks.put((role, _DONE))
+                router.record(role, time.perf_counter() - started, first)
+            except asyncio.CancelledError:
+                router.record(role, time.perf_counter() - started, time.perf_counter() - started)
+                raise
+            except Exception as e:
+                router.record(role, float('inf'), float('inf'))
+                await chunks.put((role, e))
+
+        def start(role):
+            tasks[role] = asyncio.ensure_future(produce(role))
+
+        if router.fallback is not None and router.skip_primary(self.call_type, streaming=True):
+            start("fallback")
+            reason = "primary_slow"
+        else:
+            start("primary")
+            reason = "primary"
+        deadline = time.monotonic() + router.budget(self.call_type)
+        winner = None
+        failed = set()
+        finished = False
+        try:
+            while True:
+                hedge = winner is None and router.fallback is not None and "fallback" not in tasks
+                try:
+                    if hedge:
+                        role, item = await asyncio.wait_for(chunks.get(), max(0.0, deadline - time.monotonic()))
+                    else:
+                        role, item = await chunks.get()
+                except asyncio.TimeoutError:
+                    start("fallback")
+                    reason = "hedged"
+                    continue
+                if winner is None:
+                    if isinstance(item, Exception):
+                        failed.add(role)
+                        if "fallback" not in tasks and router.fallback is not None:
+                            start("fallback")
+                            reason = "primary_error"
+                        elif failed == set(tasks):
+                            raise item
+                        continue
+                    winner = role
+                    router.route(self.call_type, role, reason if role == "fallback" else "primary")
+                    for other, task in tasks.items():
+                        if other != role:
+                            task.cancel()
+                if role != winner:
+                    continue
+                if item is _DONE:
+                    finished = True
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            if not finished and run_manager is not None:
+                token_counter.discard(run_manager.run_id)
@@ -0,0 +1,125 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest
+
+# Hot-path stages: pdf (upload parsing), resume (resume_profile.py), llm (a
+# full predict, memory included), llm_first_token (streamed turns), tts, stt
+# and startup_<name> (the first-use builds in services.py)
+STAGE_SECONDS = Histogram(
+    'interview_stage_seconds', "Time spent in each stage of serving a request", ['stage'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+LLM_TOKENS = Counter('interview_llm_tokens', "Tokens sent to and generated by the LLM", ['kind'])
+LLM_CALLS = Counter('interview_llm_calls', "LLM calls, including cache hits and summarization")
+LLM_ROUTES = Counter('interview_llm_routes', "Model chosen for each LLM call and why",
+                     ['call_type', 'model', 'reason'])
+LLM_MODEL_SECONDS = Histogram(
+    'interview_llm_model_seconds', "Latency of each model behind the router", ['model'],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, float('inf')),
+)
+PREGENERATIONS = Counter('interview_pregenerations', "Opening replies generated ahead of the first turn, by outcome",
+                         ['outcome'])
+DEDUPLICATED_REQUESTS = Counter('interview_deduplicated_requests',
+                                "Requests run, joined to an identical one in flight, or replayed to a retry",
+                                ['endpoint', 'outcome'])
+OUTBOUND_QUEUE_SECONDS = Histogram(
+    'interview_outbound_queue_seconds', "Time Groq calls waited for the rate limits, by priority class", ['priority'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float('inf')),
+)
+OUTBOUND_QUEUE_TIMEOUTS = Counter('interview_outbound_queue_timeouts',
+                                  "Groq calls dropped at their queue deadline, by priority class", ['priority'])
+REQUEST_SECONDS = Histogram(
+    'interview_request_seconds', "Request latency until the response (or the first byte of a stream)",
+    ['endpoint', 'status'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+# Server-Timing header on every response (SERVER_TIMING=1); off by default as it
+# tells clients how long each backend stage took
+SERVER_TIMING = os.getenv('SERVER_TIMING', '0') == '1'
+
+# Start time and stage timings of the request being served
+_request_started = ContextVar('request_started', default=None)
+_request_timings = ContextVar('request_timings', default=None)
+
+
+def observe_stage(stage, elapsed):
+    STAGE_SECONDS.labels(stage).observe(elapsed)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, elapsed))
+
+
+@contextmanager
+def stage_timings():
+    # Collects the (stage, seconds) observed inside the block, outside of a request too
+    timings = []
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+@contextmanager
+def timed(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def metrics_registry():
+    # With several worker processes (PROMETHEUS_MULTIPROC_DIR set) every worker
+    # writes its samples to that directory and /metrics aggregates them
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    from prometheus_client import multiprocess
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def server_timing(timings):
+    return ", ".join(f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in timings)
+
+
+def instrument(app, request):
+    """Add request timing, the Server-Timing header and GET /metrics to a Flask or Quart app.
+
+    `request` is the framework's request proxy (flask.request or quart.request).
+    """
+
+    def start_timer():
+        _request_started.set(time.perf_counter())
+        _request_timings.set([])
+
+    if hasattr(app, 'asgi_app'):
+        # Quart runs sync hooks in a thread, where setting the context variables would be lost
+        async def start_timer_async():
+            start_timer()
+        app.before_request(start_timer_async)
+    else:
+        app.before_request(start_timer)
+
+    @app.after_request
+    def record_request(response):
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        started = _request_started.get()
+        if started is not None:
+            REQUEST_SECONDS.labels(endpoint, str(response.status_code)).observe(time.perf_counter() - started)
+        timings = _request_timings.get()
+        if SERVER_TIMING and timings:
+            response.headers['Server-Timing'] = server_timing(timings)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return generate_latest(metrics_registry()), 200, {'Content-Type': CONTENT_TYPE_LATEST}
+
+    return app
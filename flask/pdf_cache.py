@@ -0,0 +1,123 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Between the texts of two pages, so the resume preprocessing can tell page headers and footers apart
+PAGE_BREAK = "\f"
+
+
+def read_pdf_bytes(pdf_file):
+    # Accepts a path, a Streamlit UploadedFile, a werkzeug FileStorage or any binary file object
+    if isinstance(pdf_file, (str, os.PathLike)):
+        with open(pdf_file, 'rb') as f:
+            return f.read()
+    if hasattr(pdf_file, 'getvalue'):
+        return pdf_file.getvalue()
+    return pdf_file.read()
+
+
+def parse_pdf(data):
+    import PyPDF2
+
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(data))
+    return PAGE_BREAK.join(page.extract_text() or "" for page in pdf_reader.pages)
+
+
+class ExtractionCache:
+    """PDF text keyed by the SHA-256 of the file bytes.
+
+    Hot entries live in an in-memory LRU; when `cache_dir` is set every
+    extraction is also written there so it survives restarts.
+    """
+
+    def __init__(self, max_entries=256, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get_or_extract(self, data, extract=parse_pdf):
+        key = hashlib.sha256(data).hexdigest()
+        text = self.lookup(key)
+        if text is None:
+            text = extract(data)
+            self.store(key, text)
+        return text
+
+    def lookup(self, key):
+        """Cached text for a SHA-256 hex digest, or None (counted as a miss)."""
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return text
+        text = self._load(key)
+        with self._lock:
+            if text is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, text)
+        return text
+
+    def store(self, key, text):
+        self._save(key, text)
+        with self._lock:
+            self._remember(key, text)
+
+    def _remember(self, key, text):
+        self._entries[key] = text
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.txt")
+
+    def _load(self, key):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _save(self, key, text):
+        if not self.cache_dir:
+            return
+        # Write to a temp file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, self._path(key))
+
+
+extraction_cache = ExtractionCache(
+    max_entries=int(os.getenv('PDF_CACHE_ENTRIES', 256)),
+    cache_dir=os.getenv('PDF_CACHE_DIR') or None,
+)
+
+
+def extract_pdf_text(pdf_file):
+    return extraction_cache.get_or_extract(read_pdf_bytes(pdf_file))
@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import PREGENERATIONS, observe_stage
+from prompts import START_INTERVIEW_PROMPT
+
+# PREGENERATE=0 turns it off; the first turn then calls the model as before
+PREGEN_ENABLED = os.getenv('PREGENERATE', '1') != '0'
+# Longest the first turn waits for an in-flight pre-generation before giving up on it
+PREGEN_WAIT = float(os.getenv('PREGEN_WAIT', 60))  # seconds
+
+pregen_executor = ThreadPoolExecutor(max_workers=int(os.getenv('PREGEN_WORKERS', 4)),
+                                     thread_name_prefix='pregen')
+
+
+class Pregeneration:
+    """The reply to `prompt`, generated in the background from the memory as it is now.
+
+    The reply is streamed so a cancelled pre-generation stops at the next chunk
+    instead of running to the end. `llm` is the router's "pregen" model, so the
+    speculative call has its own latency budget, priority and metrics.
+    """
+
+    def __init__(self, conversation, prompt, llm):
+        memory = conversation.memory
+        history = memory.load_memory_variables({})[memory.memory_key]
+        self.prompt = prompt
+        self._cancelled = threading.Event()
+        self.future = pregen_executor.submit(
+            self._generate, llm, conversation.prompt.format_prompt(input=prompt, history=history))
+
+    def _generate(self, llm, prompt_value):
+        chunks = []
+        upstream = llm.stream(prompt_value)
+        try:
+            for chunk in upstream:
+                if self._cancelled.is_set():
+                    return None
+                chunks.append(chunk.content)
+        finally:
+            upstream.close()
+        return "".join(chunks)
+
+    def cancel(self):
+        if not self.future.done():
+            PREGENERATIONS.labels('cancelled').inc()
+        self._stop()
+
+    def _stop(self):
+        self._cancelled.set()
+        self.future.cancel()
+
+    def take(self, memory, prompt, timeout=PREGEN_WAIT):
+        """Join the generation and save it to `memory` as the reply to `prompt`.
+
+        Returns the reply, or None (and cancels) if it failed or did not finish within `timeout`.
+        """
+        started = time.perf_counter()
+        try:
+            reply = self.future.result(timeout=timeout)
+        except Exception:
+            reply = None
+        observe_stage("pregen_wait", time.perf_counter() - started)
+        if not reply:
+            self._stop()
+            PREGENERATIONS.labels('failed').inc()
+            return None
+        PREGENERATIONS.labels('used').inc()
+        memory.save_context({"input": prompt}, {"response": reply})
+        return reply
+
+
+def pregenerate(session, llm):
+    """Start generating the interviewer's introduction and first question for a fresh session."""
+    cancel_pregeneration(session)
+    if PREGEN_ENABLED:
+        session.pregeneration = Pregeneration(session.conversation, START_INTERVIEW_PROMPT, llm)
+
+
+def cancel_pregeneration(session):
+    if session.pregeneration is not None:
+        session.pregeneration.cancel()
+        session.pregeneration = None
+
+
+def take_pregenerated(session, prompt):
+    """Pre-generated opening reply for the first turn of `session`, recorded as the reply to `prompt`.
+
+    Called with the session lock held. Returns None when there is nothing to use,
+    in which case the caller runs the turn as usual.
+    """
+    pregeneration = session.pregeneration
+    if pregeneration is None:
+        return None
+    session.pregeneration = None
+    if session.memory.chat_memory.messages:
+        pregeneration.cancel()
+        return None
+    return pregeneration.take(session.memory, prompt)
@@ -0,0 +1,67 @@
+# Interview prompts shared by the Flask and ASGI apps. The resume itself is not
+# part of these: InterviewMemory renders it once at the top of the history.
+
+FIRST_MESSAGE_PROMPT = """You are an expert interviewer conducting a job interview. The candidate has uploaded their resume, which is included above.
+
+Based on this resume, conduct a professional interview. Start by briefly introducing yourself and asking the candidate for a brief introduction. Then, proceed with relevant questions based on their resume and responses.
+
+The candidate's first message is: '{user_input}'
+
+Provide your response and the first interview question."""
+
+START_INTERVIEW_PROMPT = """You are an expert interviewer conducting a job interview. The candidate has uploaded their resume, which is included above.
+
+Based on this resume, conduct a professional interview. Start by briefly introducing yourself and asking the candidate for a brief introduction. Then, proceed with relevant questions based on their resume."""
+
+FOLLOW_UP_PROMPT = """Continue the professional job interview. Ask relevant follow-up questions based on the candidate's previous responses and their resume. Ensure the conversation flows naturally and mimics a real-life interview environment.
+
+The candidate's latest response is: '{user_input}'
+
+Provide your next question or response."""
+
+ANALYSIS_PROMPT = """Based on the entire interview conversation, provide a comprehensive analysis of the candidate. Include the following:
+
+1. Overall impression
+2. Strengths demonstrated
+3. Areas for improvement
+4. Communication skills
+5. Technical competence (if applicable)
+6. Cultural fit
+7. Recommendations for the candidate
+
+Provide a detailed yet concise analysis, offering constructive feedback and actionable insights."""
+
+FINAL_ANALYSIS_PROMPT = """The interview is now complete after 10 responses from the candidate. Please provide a comprehensive analysis based on the entire interview conversation, including the following:
+
+1. Overall impression
+2. Strengths demonstrated
+3. Areas for improvement
+4. Communication skills
+5. Technical competence (if applicable)
+6. Cultural fit
+7. Recommendations for the candidate
+
+Additionally, provide a rating out of 10 for each of the above categories and calculate an overall score out of 100."""
+
+# Appended to the prompts that ask for ratings, so leaderboard.py can read them back
+SCORE_LINE = """Finish with one line of JSON holding the same ratings, in this form:
+{"overall_impression": 7, "strengths": 8, "areas_for_improvement": 6, "communication": 8, "technical_competence": 7, "cultural_fit": 8, "recommendations": 7, "overall": 72}"""
+
+FINAL_ANALYSIS_PROMPT += "\n\n" + SCORE_LINE
+
+# ANALYSIS_PROMPT for the apps that rank candidates; flask_audio reads its analysis aloud and keeps the plain one
+RATED_ANALYSIS_PROMPT = ANALYSIS_PROMPT + """
+
+Rate each of the above categories out of 10 and give an overall score out of 100.
+
+""" + SCORE_LINE
+
+GREETING = "Hello, I hope you're having a great day. I'm ready to begin our interview whenever you are. Please let me know when you're ready to start."
+
+
+def build_interview_prompt(session, user_input):
+    if not session.memory.chat_memory.messages:
+        # First message in the interview
+        return FIRST_MESSAGE_PROMPT.format(user_input=user_input)
+    # Continue the interview
+    return FOLLOW_UP_PROMPT.format(user_input=user_input)
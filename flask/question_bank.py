@@ -0,0 +1,147 @@
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+DEFAULT_TOP_K = 8
+BUILD_BATCH_SIZE = 1024
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model(model_name=EMBEDDING_MODEL):
+    global _model
+    with _model_lock:
+        if _model is None:
+            from sentence_transformers import SentenceTransformer
+            _model = SentenceTransformer(model_name)
+        return _model
+
+
+def embed(texts):
+    return get_model().encode(texts, batch_size=64, normalize_embeddings=True,
+                              convert_to_numpy=True).astype(np.float32)
+
+
+def read_questions(path):
+    # Either one question per line, or JSON lines with a "question" field
+    questions = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                line = json.loads(line)['question']
+            questions.append(" ".join(line.split()))
+    return questions
+
+
+def resume_chunks(resume, max_words=80):
+    # The embedding model truncates long inputs, so the resume is embedded in short pieces
+    words = resume.split()
+    return [" ".join(words[i:i + max_words]) for i in range(0, len(words), max_words)] or [""]
+
+
+def build_index(questions, index_dir, encode=embed, batch_size=BUILD_BATCH_SIZE):
+    """Embed `questions` in batches straight into `index_dir/embeddings.npy`.
+
+    The matrix is written through a memory map, so building never needs the
+    whole corpus of embeddings in RAM.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    with open(os.path.join(index_dir, 'questions.txt'), 'w', encoding='utf-8') as f:
+        f.write("\n".join(questions))
+    first = encode(questions[:batch_size])
+    matrix = np.lib.format.open_memmap(os.path.join(index_dir, 'embeddings.npy'), mode='w+',
+                                       dtype=np.float32, shape=(len(questions), first.shape[1]))
+    matrix[:len(first)] = first
+    for start in range(batch_size, len(questions), batch_size):
+        matrix[start:start + batch_size] = encode(questions[start:start + batch_size])
+    matrix.flush()
+    del matrix
+
+
+class QuestionBank:
+    """Vetted interview questions with precomputed, L2-normalized embeddings.
+
+    The embedding matrix is memory-mapped, so workers share the page cache
+    instead of each holding a copy.
+    """
+
+    def __init__(self, index_dir, encode=embed):
+        with open(os.path.join(index_dir, 'questions.txt'), encoding='utf-8') as f:
+            self.questions = f.read().split("\n")
+        self.embeddings = np.load(os.path.join(index_dir, 'embeddings.npy'), mmap_mode='r')
+        self.encode = encode
+
+    def __len__(self):
+        return len(self.questions)
+
+    def search(self, query_vectors, k=DEFAULT_TOP_K):
+        """Indices of the `k` questions closest to any of the query vectors, best first."""
+        # One (questions x queries) product; a question scores by its best-matching query
+        scores = (self.embeddings @ query_vectors.T).max(axis=1)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def query(self, resume, k=DEFAULT_TOP_K):
+        return [self.questions[i] for i in self.search(self.encode(resume_chunks(resume)), k)]
+
+
+def load_question_bank():
+    """The bank at QUESTION_BANK_DIR, or None when no bank is configured."""
+    index_dir = os.getenv('QUESTION_BANK_DIR')
+    if not index_dir or not os.path.exists(os.path.join(index_dir, 'embeddings.npy')):
+        return None
+    return QuestionBank(index_dir)
+
+
+def benchmark(sizes=(10_000, 1_000_000), dim=384, queries=20):
+    # Synthetic unit vectors stand in for the model, so this measures the index alone
+    rng = np.random.default_rng(0)
+
+    def encode(texts):
+        vectors = rng.standard_normal((len(texts), dim), dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as index_dir:
+            questions = [f"question {i}" for i in range(size)]
+            started = time.perf_counter()
+            build_index(questions, index_dir, encode=encode, batch_size=8192)
+            build_seconds = time.perf_counter() - started
+            bank = QuestionBank(index_dir, encode=encode)
+            chunk_vectors = encode(["chunk"] * 10)
+            bank.search(chunk_vectors)  # warm the page cache
+            started = time.perf_counter()
+            for _ in range(queries):
+                bank.search(chunk_vectors)
+            query_ms = (time.perf_counter() - started) / queries * 1000
+            print(f"{size:>9} questions: build {build_seconds:.2f}s, query {query_ms:.2f} ms (10 resume chunks, top-{DEFAULT_TOP_K})")
+            del bank
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build or benchmark the question-bank index.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help="embed a question corpus into an index directory")
+    build.add_argument('questions', help="text file with one question per line, or JSON lines")
+    build.add_argument('index_dir')
+    subparsers.add_parser('bench', help="time index build and query at 10k and 1M questions")
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        questions = read_questions(args.questions)
+        started = time.perf_counter()
+        build_index(questions, args.index_dir)
+        print(f"Indexed {len(questions)} questions in {time.perf_counter() - started:.1f}s")
+    else:
+        benchmark()
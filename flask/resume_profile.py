@@ -0,0 +1,169 @@
+# Resume preprocessing, run once per upload. PyPDF2's text dump has broken
+# whitespace, lines wrapped at the page width, icon glyphs, page numbers and
+# headers repeated on every page; the interviewer gets a compact canonical form
+# instead, split into sections so later turns can carry only the relevant ones.
+import os
+import re
+import unicodedata
+
+from metrics import timed
+from pdf_cache import PAGE_BREAK
+from usage import estimate_tokens
+
+# Canonical sections, in the order they are rendered; `header` is whatever comes
+# before the first heading (the candidate's name)
+SECTION_ORDER = ("header", "summary", "skills", "experience", "projects", "education",
+                 "certifications", "achievements", "other")
+SECTION_HEADINGS = {
+    "summary": ("summary", "profile", "objective", "about", "about me", "professional summary", "career objective"),
+    "skills": ("skills", "technical skills", "technologies", "tools", "tech stack", "core competencies",
+               "skills and tools", "programming languages"),
+    "experience": ("experience", "work experience", "professional experience", "employment", "work history",
+                   "internships", "internship", "employment history"),
+    "projects": ("projects", "personal projects", "academic projects", "key projects", "side projects"),
+    "education": ("education", "academic background", "qualifications", "academics"),
+    "certifications": ("certifications", "certificates", "courses", "licenses and certifications"),
+    "achievements": ("achievements", "awards", "honors", "honours", "accomplishments", "awards and achievements",
+                     "extracurricular activities", "activities", "leadership", "publications"),
+    "other": ("other", "interests", "hobbies", "languages", "volunteering", "references"),
+}
+HEADING_SECTIONS = {heading: section for section, headings in SECTION_HEADINGS.items() for heading in headings}
+
+# After the opening turn, sections that share no distinctive word with the
+# conversation are left out, except these; RESUME_FOCUS=0 always sends everything
+RESUME_FOCUS = os.getenv('RESUME_FOCUS', '1') != '0'
+ALWAYS_SENT = ("header", "summary", "skills")
+
+BULLETS = "•●▪■◦‣∙·*–-"
+WRAP_WIDTH = 60  # a line at least this long that stops mid-sentence was wrapped by the PDF
+# Page headers and footers: up to this many lines at the top or bottom of a page, this long at most
+RUNNING_LINES = 2
+RUNNING_LINE_CHARS = 80
+CONTACT = re.compile(r"@|https?://|www\.|linkedin|github|\+?\d[\d ()-]{7,}\d", re.IGNORECASE)
+PAGE_NUMBER = re.compile(r"^(page\s*)?\d{1,3}(\s*(of|/)\s*\d{1,3})?$", re.IGNORECASE)
+KEY_VALUE = re.compile(r"^[\w/&+#. -]{1,30}: ")  # "Languages: Python, SQL" starts a line of its own
+WORD = re.compile(r"[a-z][a-z0-9+#.]{2,}")
+# Words of the prompts and of plain conversation that say nothing about a section
+STOPWORDS = frozenset("""
+the and for with you your about that this these those was were are have has had from what how why when
+where which who can could would should will did does not but all any its our their they them then than
+tell more some into also just very such like been being most other over only each both here there
+interview interviewer candidate candidates resume question questions response responses answer previous
+provide continue professional relevant based follow latest next ensure conversation flows naturally
+mimics real life environment
+""".split())
+
+
+def clean_line(line):
+    # Icon-font glyphs (phone, envelope...) and private-use characters go; whitespace is collapsed
+    line = "".join(ch for ch in line if unicodedata.category(ch) not in ("So", "Co", "Cc", "Cf"))
+    line = re.sub(r"\s+", " ", line).strip()
+    line = re.sub(r"\s+([,;:.])", r"\1", line)
+    line = re.sub(r"(,\s*)+,", ",", line)
+    if line and line[0] in BULLETS and (len(line) == 1 or line[1] != line[0]):
+        line = "- " + line[1:].lstrip()
+    return line
+
+
+def heading_section(line):
+    """Canonical section of a heading line, or None if `line` is not one."""
+    name = line.strip("#:- ").lower()
+    name = re.sub(r"\s*&\s*", " and ", name)
+    if len(name.split()) > 4:
+        return None
+    return HEADING_SECTIONS.get(name)
+
+
+def normalize_lines(text):
+    """Clean lines of a raw text dump: wraps joined, page numbers and page headers and footers dropped."""
+    lines = []
+    first_page = {}  # line near the top or bottom of a page -> page it first appeared on
+    for page, page_text in enumerate(text.split(PAGE_BREAK)):
+        page_lines = [line for line in map(clean_line, page_text.splitlines()) if line and not PAGE_NUMBER.match(line)]
+        page_start = len(lines)
+        for index, line in enumerate(page_lines):
+            if (index < RUNNING_LINES or index >= len(page_lines) - RUNNING_LINES) and len(line) <= RUNNING_LINE_CHARS:
+                # Seen at the edge of an earlier page: a header or footer repeated on
+                # every page. Repeats within a page, and anywhere else, are content.
+                if first_page.setdefault(line.lower(), page) != page:
+                    continue
+            if len(lines) > page_start and not line.startswith("- ") and not KEY_VALUE.match(line) and \
+                    heading_section(line) is None and heading_section(lines[-1]) is None:
+                previous = lines[-1]
+                if previous.endswith("-") and previous[-2:-1].isalpha():
+                    # A word hyphenated across the line break
+                    lines[-1] = previous[:-1] + line
+                    continue
+                if len(previous) >= WRAP_WIDTH and previous[-1] not in ".!?:":
+                    lines[-1] = f"{previous} {line}"
+                    continue
+            lines.append(line)
+    return lines
+
+
+def segment(lines):
+    """Lines grouped by canonical section, in document order within each."""
+    sections = {}
+    current = "header"
+    for line in lines:
+        section = heading_section(line)
+        if section is not None:
+            current = section
+            continue
+        if current == "header" and CONTACT.search(line):
+            # Phone, e-mail and profile links are no use to the interviewer
+            continue
+        sections.setdefault(current, []).append(line)
+    return sections
+
+
+class ResumeProfile:
+    """The sections of one resume and their compact canonical rendering.
+
+    `text` is every section under a `## Section` heading and is what the session
+    stores; building a profile from it again gives the same profile.
+    """
+
+    def __init__(self, sections, raw_tokens=None):
+        self.sections = {name: sections[name] for name in SECTION_ORDER if sections.get(name)}
+        self.text = self.render()
+        self.tokens = estimate_tokens(self.text)
+        self.raw_tokens = self.tokens if raw_tokens is None else raw_tokens
+        # Words of each section, for picking the sections a turn is about
+        self._words = {name: set(WORD.findall(" ".join(lines).lower())) for name, lines in self.sections.items()}
+
+    def render(self, names=None):
+        parts = []
+        for name, lines in self.sections.items():
+            if names is not None and name not in names:
+                continue
+            body = "\n".join(lines)
+            parts.append(body if name == "header" else f"## {name.capitalize()}\n{body}")
+        return "\n".join(parts)
+
+    def relevant(self, query):
+        """Rendering with the sections `query` shares a distinctive word with, plus ALWAYS_SENT.
+
+        A word counts when it is in fewer than half of the sections, so generic
+        words of the prompt ("experience", "project") do not select everything.
+        With nothing matched the whole profile is returned.
+        """
+        words = set(WORD.findall(query.lower())) - STOPWORDS
+        limit = max(1, len(self._words) // 2)
+        matched = set()
+        for word in words:
+            holders = [name for name, section_words in self._words.items() if word in section_words]
+            if len(holders) <= limit:
+                matched.update(holders)
+        if not matched - set(ALWAYS_SENT):
+            return self.text
+        return self.render(matched | set(ALWAYS_SENT))
+
+    def stats(self):
+        return {"sections": list(self.sections), "tokens": self.tokens, "raw_tokens": self.raw_tokens}
+
+
+@timed("resume")
+def build_profile(text):
+    """Profile of a resume's raw text (or of an earlier profile's `text`)."""
+    return ResumeProfile(segment(normalize_lines(text)), raw_tokens=estimate_tokens(text))
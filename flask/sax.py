@@ -1,17 +1,15 @@
 import streamlit as st
-import PyPDF2
-import io
 from langchain_groq import ChatGroq
-from langchain.memory import ConversationBufferMemory
-from langchain.chains import ConversationChain
 from dotenv import load_dotenv
+from metrics import timed
+from streamlit_session import rerun_timer, resume_text, session_conversation
 import os
 import time
-import threading
-import speech_recognition as sr
-from gtts import gTTS
-import pygame
 from groq import Groq
+from audio_worker import AudioWorker
+from streaming import stream_predict
+from audio_store import audio_store
+from tts_pipeline import synthesize_stream
 
 # Load environment variables
 load_dotenv()
@@ -29,45 +27,48 @@ def init_llm():
     return ChatGroq(groq_api_key=groq_api_key, model_name="llama-3.1-70b-versatile")
 
 llm = init_llm()
-groq_client = Groq()
 
-# Create a conversation memory
-memory = ConversationBufferMemory(return_messages=True)
-
-# Create a conversation chain
-conversation = ConversationChain(llm=llm, memory=memory, verbose=True)
-
-# Initialize pygame mixer for audio playback
-pygame.mixer.init()
+# Whisper client, also kept across reruns
+@st.cache_resource
+def init_groq_client():
+    return Groq()
 
-def extract_text_from_pdf(pdf_file):
-    pdf_reader = PyPDF2.PdfReader(pdf_file)
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text()
-    return text
+groq_client = init_groq_client()
 
-def text_to_speech(text):
-    tts = gTTS(text=text, lang='en')
-    tts.save("response.mp3")
-    pygame.mixer.music.load("response.mp3")
-    pygame.mixer.music.play()
-    while pygame.mixer.music.get_busy():
-        pygame.time.Clock().tick(10)
+# Playback and microphone run on background threads that outlive the script's reruns
+@st.cache_resource
+def init_audio_worker():
+    # Sentences already spoken (the silence prompt, repeated phrases) come from the audio store
+    return AudioWorker(synthesize=audio_store.synthesize)
+
+audio_worker = init_audio_worker()
+
+def speak_reply(prompt, placeholder=None):
+    # Start speaking the first sentence while the LLM is still generating the rest;
+    # returns once the reply is generated, while its last sentences still play
+    reply = audio_worker.new_reply()
+    parts = []
+    for sentence, audio in synthesize_stream(stream_predict(session_conversation(llm), prompt), synth=audio_store.synthesize):
+        parts.append(sentence)
+        if placeholder is not None:
+            placeholder.write("".join(parts))
+        audio_worker.play(audio, reply)
+    return "".join(parts)
 
 def speech_to_text():
-    r = sr.Recognizer()
-    with sr.Microphone() as source:
-        st.write("Listening...")
-        audio = r.listen(source, timeout=None, phrase_time_limit=15)
-    
+    # The microphone is already open: an answer started while the reply was
+    # playing (which stopped it) is waiting here
+    st.write("Listening...")
+    with timed("listen"):
+        audio = audio_worker.next_utterance()
+    if audio is None:
+        st.error(f"Error in speech recognition: {audio_worker.error}")
+        return None
+
     try:
-        with open("audio.wav", "wb") as f:
-            f.write(audio.get_wav_data())
-        
-        with open("audio.wav", "rb") as file:
+        with timed("stt"):
             transcription = groq_client.audio.transcriptions.create(
-                file=("audio.wav", file.read()),
+                file=("audio.wav", audio.get_wav_data()),
                 model="whisper-large-v3",
                 response_format="text"
             )
@@ -76,15 +77,6 @@ def speech_to_text():
         st.error(f"Error in speech recognition: {str(e)}")
         return None
 
-def monitor_silence(stop_event):
-    start_time = time.time()
-    while not stop_event.is_set():
-        if time.time() - start_time > 15:
-            st.write("Do you need some extra time to think?")
-            text_to_speech("Do you need some extra time to think?")
-            start_time = time.time()
-        time.sleep(1)
-
 def main():
     st.title("AI Voice Interview Bot")
 
@@ -92,7 +84,7 @@ def main():
     uploaded_file = st.file_uploader("Upload your resume (PDF)", type="pdf")
 
     if uploaded_file:
-        resume_content = extract_text_from_pdf(uploaded_file)
+        resume_content = resume_text(uploaded_file)
         st.success("Resume uploaded successfully!")
         st.session_state.resume_content = resume_content
 
@@ -103,6 +95,9 @@ def main():
         else:
             st.session_state.interview_started = True
             st.session_state.messages = []
+            # A new interview starts from an empty memory
+            session_conversation(llm, new=True)
+            audio_worker.reset()
             st.session_state.interview_start_time = time.time()
             initial_prompt = f"""You are an expert interviewer conducting a job interview. The candidate has uploaded their resume, and you have the following information:
 
@@ -110,9 +105,8 @@ Resume content: {st.session_state.resume_content}
 
 Based on this resume, conduct a professional interview. Start by briefly introducing yourself and asking the candidate for a brief introduction. Then, proceed with relevant questions based on their resume."""
 
-            initial_response = conversation.predict(input=initial_prompt)
+            initial_response = speak_reply(initial_prompt)
             st.session_state.messages.append({"role": "assistant", "content": initial_response})
-            text_to_speech(initial_response)
 
     # Display chat messages
     if "messages" in st.session_state:
@@ -122,13 +116,8 @@ Based on this resume, conduct a professional interview. Start by briefly introdu
 
     # Voice-based interaction
     if "interview_started" in st.session_state and st.session_state.interview_started:
-        stop_event = threading.Event()
-        silence_thread = threading.Thread(target=monitor_silence, args=(stop_event,))
-        silence_thread.start()
-
+        # While waiting, the worker asks the candidate if they need time after a silence
         user_input = speech_to_text()
-        stop_event.set()
-        silence_thread.join()
 
         if user_input:
             # Display user message
@@ -143,11 +132,9 @@ The candidate's latest response is: '{user_input}'
 
 Provide your next question or response."""
 
-            ai_response = conversation.predict(input=prompt)
             with st.chat_message("assistant"):
-                st.write(ai_response)
+                ai_response = speak_reply(prompt, st.empty())
             st.session_state.messages.append({"role": "assistant", "content": ai_response})
-            text_to_speech(ai_response)
 
         # Check if interview time exceeds 45 minutes
         if time.time() - st.session_state.interview_start_time > 2700:  # 45 minutes in seconds
@@ -168,11 +155,10 @@ Provide your next question or response."""
 
 Provide a detailed yet concise analysis, offering constructive feedback and actionable insights."""
 
-            analysis = conversation.predict(input=analysis_prompt)
             st.subheader("Interview Analysis")
-            st.write(analysis)
-            text_to_speech(analysis)
+            speak_reply(analysis_prompt, st.empty())
             st.session_state.interview_started = False
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with rerun_timer():
+        main()
\ No newline at end of file
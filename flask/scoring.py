@@ -0,0 +1,204 @@
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from metrics import observe_stage
+from prompts import SCORE_LINE
+
+# Categories every answer is scored on, 1-10 each
+RUBRIC = ["communication", "technical_competence", "problem_solving", "cultural_fit"]
+
+# SCORING=0 turns per-turn scoring off; the final analysis then reads the transcript
+SCORING_ENABLED = os.getenv('SCORING', '1') != '0'
+# Longest the final analysis waits for the scores of the last answers
+SCORING_WAIT = float(os.getenv('SCORING_WAIT', 15))  # seconds
+MAX_QUESTION_CHARS = 1500
+
+scoring_executor = ThreadPoolExecutor(max_workers=int(os.getenv('SCORING_WORKERS', 2)),
+                                      thread_name_prefix='scoring')
+
+TURN_SCORE_PROMPT = """You are scoring one answer from a job interview. Rate the candidate's answer to the interviewer's question from 1 to 10 on each of: communication, technical_competence, problem_solving, cultural_fit. Use null for a category the answer gives no evidence on.
+
+Interviewer: {question}
+
+Candidate: {answer}
+
+Reply with JSON only, in this form:
+{{"communication": 7, "technical_competence": 6, "problem_solving": null, "cultural_fit": 8, "note": "one short sentence on the strongest and the weakest point"}}"""
+
+SCORED_ANALYSIS_PROMPT = """You are an expert interviewer writing the final evaluation of a job interview. Instead of the transcript you have the rubric scores (1-10) given to each of the candidate's answers as the interview went, their averages and a summary of the conversation.
+
+Average scores over {turns} scored answers:
+{averages}
+
+Scores and notes per answer:
+{turn_lines}
+
+Summary of the interview:
+{summary}
+
+Provide a comprehensive analysis of the candidate, including the following:
+
+1. Overall impression
+2. Strengths demonstrated
+3. Areas for improvement
+4. Communication skills
+5. Technical competence (if applicable)
+6. Cultural fit
+7. Recommendations for the candidate
+
+Give a rating out of 10 for each of the above categories, consistent with the scores, and an overall score out of 100."""
+
+
+def parse_scores(text):
+    """`(scores, note)` from the scorer's reply; scores outside 1-10 or missing are None."""
+    match = re.search(r'\{.*\}', text, re.DOTALL)
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group(0))
+    except ValueError:
+        return None
+    scores = {}
+    for category in RUBRIC:
+        value = data.get(category)
+        scores[category] = float(value) if isinstance(value, (int, float)) and 1 <= value <= 10 else None
+    if all(value is None for value in scores.values()):
+        return None
+    return scores, str(data.get('note') or "").strip()
+
+
+def last_question(messages):
+    # The interviewer's most recent message, which the candidate's next input answers
+    for message in reversed(messages):
+        if message.type == "ai":
+            return message.content
+    return None
+
+
+class Scorecard:
+    """Per-answer rubric scores of one interview with running totals per category."""
+
+    def __init__(self):
+        self.turns = []
+        self.totals = dict.fromkeys(RUBRIC, 0.0)
+        self.counts = dict.fromkeys(RUBRIC, 0)
+        self.failed = 0
+        self.pending = set()
+        # Called once a tracked score is in, outside the lock; the session store saves the session
+        self.on_change = None
+        self._submitted = 0
+        # Scores pending in the worker that took the snapshot this card was restored from
+        self._elsewhere = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_dict(cls, card):
+        # The inverse of as_dict(); scores still pending when it was taken arrive
+        # with a newer snapshot, saved by the worker that scores them
+        scorecard = cls()
+        for entry in card["turns"]:
+            scorecard.add(entry["turn"], (entry["scores"], entry["note"]))
+        scorecard.failed = card["failed"]
+        scorecard._elsewhere = card["pending"]
+        scorecard._submitted = max((entry["turn"] for entry in card["turns"]), default=0) + card["pending"]
+        return scorecard
+
+    def track(self, submit):
+        # Numbers the answer in submission order and tracks the future `submit(turn)` returns
+        with self._lock:
+            self._submitted += 1
+            future = submit(self._submitted)
+            self.pending.add(future)
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        with self._lock:
+            self.pending.discard(future)
+        if self.on_change is not None:
+            self.on_change()
+
+    def add(self, turn, result):
+        with self._lock:
+            if result is None:
+                self.failed += 1
+                return
+            scores, note = result
+            self.turns.append({"turn": turn, "scores": scores, "note": note})
+            self.turns.sort(key=lambda entry: entry["turn"])
+            for category, value in scores.items():
+                if value is not None:
+                    self.totals[category] += value
+                    self.counts[category] += 1
+
+    def has_turns(self):
+        with self._lock:
+            return bool(self.turns or self.pending or self._elsewhere)
+
+    def wait(self, timeout=SCORING_WAIT):
+        with self._lock:
+            pending = list(self.pending)
+        if pending:
+            wait(pending, timeout=timeout)
+
+    def averages(self):
+        return {category: round(self.totals[category] / self.counts[category], 1) if self.counts[category] else None
+                for category in RUBRIC}
+
+    def as_dict(self):
+        with self._lock:
+            return {"turns": list(self.turns), "averages": self.averages(),
+                    "pending": len(self.pending) + self._elsewhere, "failed": self.failed}
+
+
+def score_answer(llm, question, answer):
+    prompt = TURN_SCORE_PROMPT.format(question=question[-MAX_QUESTION_CHARS:], answer=answer)
+    started = time.perf_counter()
+    reply = llm.invoke(prompt).content
+    observe_stage("scoring", time.perf_counter() - started)
+    return parse_scores(reply)
+
+
+def score_turn(llm, scorecard, question, answer):
+    """Score `answer` to `question` in the background and add it to `scorecard`.
+
+    Returns immediately; the first input of an interview (no question yet) is not scored.
+    """
+    if not SCORING_ENABLED or not question or not answer:
+        return
+
+    def run(turn):
+        try:
+            result = score_answer(llm, question, answer)
+        except Exception:
+            result = None
+        scorecard.add(turn, result)
+
+    scorecard.track(lambda turn: scoring_executor.submit(run, turn))
+
+
+def format_score(value):
+    return "n/a" if value is None else f"{value:g}"
+
+
+def analysis_prompt(scorecard, summary="", timeout=SCORING_WAIT, score_line=False):
+    """Final-analysis prompt built from the scorecard, after waiting for outstanding scores.
+
+    With `score_line` the reply ends with the JSON ratings line for the leaderboard;
+    the voice app reads its analysis aloud and leaves it out.
+    """
+    scorecard.wait(timeout)
+    card = scorecard.as_dict()
+    averages = "\n".join(f"- {category}: {format_score(value)}" for category, value in card["averages"].items())
+    turn_lines = "\n".join(
+        f"Answer {entry['turn']}: "
+        + ", ".join(f"{category} {format_score(value)}" for category, value in entry["scores"].items())
+        + (f" - {entry['note']}" if entry["note"] else "")
+        for entry in card["turns"]
+    )
+    prompt = SCORED_ANALYSIS_PROMPT.format(turns=len(card["turns"]), averages=averages,
+                                           turn_lines=turn_lines or "(none)", summary=summary or "(none)")
+    return f"{prompt}\n\n{SCORE_LINE}" if score_line else prompt
@@ -0,0 +1,216 @@
+# The heavy parts of the interview apps (LangChain, the Groq clients, the LLM
+# cache, the question bank), built on first use instead of at import. A worker
+# boots and answers /start and /metrics without loading any of them, and a
+# missing GROQ_API_KEY fails the requests that need the model, not the import.
+import os
+import threading
+import time
+
+from coalesce import Singleflight
+from metrics import observe_stage
+from pdf_cache import extraction_cache
+from session_backend import load_session_backend
+from sessions import SessionStore
+
+# WARM_START=0 leaves everything to the first request that needs it; by default
+# a background thread builds it right after the app is created
+WARM_START = os.getenv('WARM_START', '1') != '0'
+
+_MISSING = object()
+
+
+class ServiceUnavailable(Exception):
+    def __init__(self, message, status=503):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def groq_api_key():
+    key = os.getenv('GROQ_API_KEY')
+    if not key:
+        raise ServiceUnavailable("GROQ_API_KEY not found. Please set it in your .env file.")
+    return key
+
+
+class LazyServices:
+    """Attributes built once, on first access, by the `build_<name>` methods."""
+
+    def __init__(self):
+        self._built = {}
+        # One lock per attribute: a request that needs the session store does
+        # not wait behind the warm-up thread building the router
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name.startswith('_') or not hasattr(type(self), f'build_{name}'):
+            raise AttributeError(name)
+        return self._get(name)
+
+    def _get(self, name):
+        value = self._built.get(name, _MISSING)
+        if value is _MISSING:
+            with self._lock:
+                lock = self._locks.setdefault(name, threading.Lock())
+            with lock:
+                value = self._built.get(name, _MISSING)
+                if value is _MISSING:
+                    started = time.perf_counter()
+                    value = getattr(self, f'build_{name}')()
+                    observe_stage(f"startup_{name}", time.perf_counter() - started)
+                    self._built[name] = value
+        return value
+
+    def built(self, name):
+        # The attribute if it has been built, without building it
+        return self._built.get(name)
+
+    def warm(self, names):
+        for name in names:
+            try:
+                getattr(self, name)
+            except Exception:
+                # Left for the first request that needs it to report
+                pass
+
+    def warm_in_background(self, names):
+        if WARM_START:
+            threading.Thread(target=self.warm, args=(names,), name='warm-start', daemon=True).start()
+
+
+class ModelServices(LazyServices):
+    """The LLM cache, the model router, the models and the session store every app uses.
+
+    Sessions get their conversation and memory from `new_conversation()`, with
+    the chain class of the app's `build_conversation_class`.
+    """
+
+    def build_llm_cache(self):
+        # Exact (and optionally semantic) cache of the scoring and analysis calls (LLM_CACHE=1)
+        from llm_cache import configure_llm_cache
+
+        return configure_llm_cache()
+
+    def build_router(self):
+        # The 70B model, with a smaller fallback for calls that run over their latency budget
+        from llm_router import ModelRouter, token_counter
+
+        key = groq_api_key()
+        return ModelRouter.from_env(key, callbacks=[token_counter], cache=self.llm_cache)
+
+    def build_llm(self):
+        return self.router.model("interview")
+
+    def build_analysis_llm(self):
+        return self.router.model("analysis")
+
+    def build_scoring_llm(self):
+        return self.router.model("scoring")
+
+    def build_pregen_llm(self):
+        # Openings generated ahead of the first turn (pregen.py)
+        return self.router.model("pregen")
+
+    # Each interview session gets its own conversation memory and chain
+    def new_conversation(self):
+        from history import InterviewMemory
+
+        # The resume is kept once in the memory and older turns are summarized,
+        # so the prompt size stays flat instead of growing every turn
+        memory = InterviewMemory(
+            max_history_tokens=int(os.getenv('HISTORY_TOKEN_BUDGET', 1500)),
+            summarizer=self.router.model("summary"),
+        )
+        # CHAIN_VERBOSE=1 prints every formatted prompt, resume included; /metrics has the timings
+        conversation = self.conversation_class(llm=self.llm, memory=memory,
+                                               verbose=os.getenv('CHAIN_VERBOSE') == '1')
+        return conversation, memory
+
+    def build_sessions(self):
+        idle_ttl = int(os.getenv('SESSION_IDLE_TTL', 1800))
+        return SessionStore(
+            self.new_conversation,
+            max_sessions=int(os.getenv('MAX_SESSIONS', 500)),
+            idle_ttl=idle_ttl,
+            max_bytes=int(os.getenv('SESSION_MAX_BYTES', 256 * 1024 * 1024)),
+            # SESSION_DB=path shares sessions between workers and keeps them across restarts
+            backend=load_session_backend(idle_ttl),
+        )
+
+
+class InterviewServices(ModelServices):
+    """Models, caches and session store of the resume interview apps."""
+
+    WARM = ('llm_cache', 'question_bank', 'router', 'conversation_class')
+
+    def build_question_bank(self):
+        # Vetted questions retrieved per resume to seed the interviewer (QUESTION_BANK_DIR)
+        from question_bank import load_question_bank
+
+        return load_question_bank()
+
+    def build_screening_llm(self):
+        return self.router.model("screening")
+
+    def build_conversation_class(self):
+        # LangChain's chain and memory modules are the bulk of the import time
+        from langchain.chains import ConversationChain
+
+        return ConversationChain
+
+    def build_leaderboard(self):
+        # Final-analysis scores ranked per vacancy (LEADERBOARD_DB)
+        from leaderboard import load_leaderboard
+
+        return load_leaderboard()
+
+    def record_scores(self, session, analysis):
+        """`(text, scores)` of an analysis: the text as shown to the candidate, the scores put on the leaderboard."""
+        from leaderboard import split_scores
+
+        text, scores, source = split_scores(analysis)
+        if scores:
+            profile = getattr(session.memory, "profile", None)
+            candidate = profile.sections.get("header", [""])[0] if profile is not None else ""
+            self.leaderboard.add(session.session_id, scores, session.vacancy, candidate, source)
+        return text, scores
+
+    def record_analysis(self, session, analysis):
+        """`analysis` as shown to the candidate; its scores go to the leaderboard."""
+        return self.record_scores(session, analysis)[0]
+
+    def scored_stream(self, session):
+        """`stream_turn` arguments of a streamed analysis.
+
+        The score line is held back from the streamed tokens, recorded, and sent
+        as a `scores` event of its own before `done`.
+        """
+        from leaderboard import ScoreLineFilter
+
+        def on_reply(reply):
+            text, scores = self.record_scores(session, reply)
+            return text, {"scores": scores} if scores else {}
+
+        return {"on_reply": on_reply, "token_filter": ScoreLineFilter()}
+
+    def build_inflight(self):
+        # Shares one LLM call between duplicate /upload, /interview and /analysis requests
+        return Singleflight()
+
+    def cache_stats(self):
+        # Stats of the caches built so far; asking for them does not build them
+        from groq_scheduler import scheduler
+
+        llm_cache = self.built('llm_cache')
+        sessions = self.built('sessions')
+        inflight = self.built('inflight')
+        leaderboard = self.built('leaderboard')
+        return {
+            "pdf_extraction": extraction_cache.stats(),
+            "llm": llm_cache.stats() if llm_cache else None,
+            "sessions": sessions.stats() if sessions else None,
+            "deduplication": inflight.stats() if inflight else None,
+            "outbound": scheduler.stats(),
+            "leaderboard": leaderboard.stats() if leaderboard else None,
+        }
@@ -0,0 +1,250 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Longest a write waits for more turns to join its batch
+DEFAULT_FLUSH_INTERVAL = 0.05  # seconds
+PURGE_INTERVAL = 60  # seconds between deletions of expired sessions
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    updated REAL NOT NULL,
+    resume TEXT,
+    questions TEXT,
+    state TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated);
+"""
+
+# Snapshot keys stored in their own columns rather than in `state`
+PROFILE_KEYS = ("session_id", "version", "base_version", "updated", "resume", "questions", "profile_changed")
+
+# Writes are compare-and-swap on the version the snapshot was made from: a
+# write that finds another one there (or none) changes no row and is a conflict
+INSERT = """
+INSERT INTO sessions (id, version, updated, resume, questions, state) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO NOTHING
+"""
+# The resume and its questions are only written when they changed (`profile_changed`)
+UPDATE = """
+UPDATE sessions SET
+    version = ?,
+    updated = ?,
+    resume = COALESCE(?, resume),
+    questions = COALESCE(?, questions),
+    state = ?
+WHERE id = ? AND version = ?
+"""
+
+
+class SQLiteSessionBackend:
+    """Interview sessions in a SQLite database in WAL mode, shared by every worker on the host.
+
+    Saves are write-behind: `save` only queues the snapshot and a writer thread
+    stores everything queued within `flush_interval` in one transaction, so a
+    turn never waits on the disk. Reads see this process's queued snapshots
+    first. Sessions idle for longer than `max_age` are treated as gone and purged.
+
+    A snapshot is only stored over the version it was made from. One that finds
+    a different version, written by another worker, is dropped and counted in
+    `conflicts`; `conflicted(session_id)` then tells the session store to reload.
+    """
+
+    def __init__(self, path, max_age, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.path = path
+        self.max_age = max_age
+        self.flush_interval = flush_interval
+        self.batches = 0
+        self.writes = 0
+        self.errors = 0
+        self.conflicts = 0
+        self._conflicted = set()
+        self._local = threading.local()
+        # session_id -> latest snapshot (None deletes); `_writing` is the batch being stored
+        self._pending = {}
+        self._writing = {}
+        self._closed = False
+        self._cond = threading.Condition()
+        db = self._connect()
+        db.executescript(SCHEMA)
+        db.close()
+        self._writer = threading.Thread(target=self._run, name='session-writer', daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        # WAL: readers in every worker run alongside the one writer; NORMAL skips
+        # the fsync per commit (a power cut may lose the last batch, not corrupt the file)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def _reader(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = self._connect()
+        return db
+
+    def _queued(self, session_id):
+        # (found, snapshot) from the writes of this process not yet in the database
+        with self._cond:
+            for batch in (self._pending, self._writing):
+                if session_id in batch:
+                    return True, batch[session_id]
+        return False, None
+
+    def version(self, session_id):
+        """Stored version of a live session, or None if there is none."""
+        found, snapshot = self._queued(session_id)
+        if found:
+            return snapshot["version"] if snapshot else None
+        row = self._reader().execute("SELECT version FROM sessions WHERE id = ? AND updated > ?",
+                                     (session_id, time.time() - self.max_age)).fetchone()
+        return row[0] if row else None
+
+    def conflicted(self, session_id):
+        """Whether this process's last write of the session lost to another worker's; asking clears it."""
+        with self._cond:
+            if session_id in self._conflicted:
+                self._conflicted.discard(session_id)
+                return True
+        return False
+
+    def load(self, session_id):
+        found, snapshot = self._queued(session_id)
+        if found:
+            return snapshot
+        row = self._reader().execute(
+            "SELECT version, resume, questions, state FROM sessions WHERE id = ? AND updated > ?",
+            (session_id, time.time() - self.max_age)).fetchone()
+        if row is None:
+            return None
+        version, resume, questions, state = row
+        return dict(json.loads(state), session_id=session_id, version=version, profile_changed=False,
+                    resume=resume or "", questions=json.loads(questions) if questions else [])
+
+    def save(self, snapshot):
+        self._queue(snapshot["session_id"], snapshot)
+
+    def delete(self, session_id):
+        self._queue(session_id, None)
+
+    def _queue(self, session_id, snapshot):
+        with self._cond:
+            previous = self._pending.get(session_id)
+            if snapshot:
+                # A snapshot replacing one not yet written is stored over the version that one was made from
+                snapshot = dict(snapshot, base_version=previous["base_version"] if previous
+                                else snapshot["version"] - 1)
+                if previous and previous["profile_changed"]:
+                    # The replaced snapshot had not written the resume yet
+                    snapshot["profile_changed"] = True
+            self._pending[session_id] = snapshot
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far is stored."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._writing, timeout)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._writer.join()
+
+    def stats(self):
+        with self._cond:
+            queued = len(self._pending) + len(self._writing)
+        return {"backend": "sqlite", "queued": queued, "batches": self.batches, "writes": self.writes,
+                "errors": self.errors, "conflicts": self.conflicts}
+
+    def _run(self):
+        db = self._connect()
+        last_purge = 0.0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if self._closed and not self._pending:
+                    db.close()
+                    return
+            if not self._closed:
+                # Let the other turns finishing now join this batch
+                time.sleep(self.flush_interval)
+            with self._cond:
+                self._writing, self._pending = self._pending, {}
+            try:
+                self._write(db, self._writing)
+                if time.time() - last_purge > PURGE_INTERVAL:
+                    last_purge = time.time()
+                    db.execute("DELETE FROM sessions WHERE updated <= ?", (last_purge - self.max_age,))
+            except sqlite3.Error:
+                # Locked or full database: retried with the next batch, where newer
+                # snapshots of the same sessions replace these
+                self.errors += 1
+                if not self._closed:
+                    self._requeue(self._writing)
+            with self._cond:
+                self._writing = {}
+                self._cond.notify_all()
+
+    def _requeue(self, batch):
+        with self._cond:
+            for session_id, snapshot in batch.items():
+                newer = self._pending.get(session_id, snapshot)
+                if newer is not snapshot and newer and snapshot:
+                    newer = dict(newer, base_version=snapshot["base_version"],
+                                 profile_changed=newer["profile_changed"] or snapshot["profile_changed"])
+                self._pending[session_id] = newer
+
+    def _write(self, db, batch):
+        conflicted = []
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for session_id, snapshot in batch.items():
+                if snapshot is None:
+                    db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+                    continue
+                state = json.dumps({key: value for key, value in snapshot.items() if key not in PROFILE_KEYS})
+                resume = questions = None
+                if snapshot["profile_changed"]:
+                    resume, questions = snapshot["resume"], json.dumps(snapshot["questions"])
+                if snapshot["base_version"] == 0:
+                    cursor = db.execute(INSERT, (session_id, snapshot["version"], snapshot["updated"], resume,
+                                                 questions, state))
+                else:
+                    cursor = db.execute(UPDATE, (snapshot["version"], snapshot["updated"], resume, questions, state,
+                                                 session_id, snapshot["base_version"]))
+                if cursor.rowcount == 0:
+                    conflicted.append(session_id)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        self.batches += 1
+        self.writes += len(batch) - len(conflicted)
+        if conflicted:
+            with self._cond:
+                self.conflicts += len(conflicted)
+                self._conflicted.update(conflicted)
+
+
+def load_session_backend(max_age):
+    """The SQLite backend at SESSION_DB, or None to keep sessions in process memory only.
+
+    Workers sharing SESSION_DB need sticky sessions: there is no lock across
+    processes, so a turn another worker serves concurrently loses its write.
+    """
+    path = os.getenv('SESSION_DB')
+    if not path:
+        return None
+    backend = SQLiteSessionBackend(path, max_age,
+                                   flush_interval=float(os.getenv('SESSION_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)))
+    # Store the last turns before the worker exits
+    atexit.register(backend.close)
+    return backend
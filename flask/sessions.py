@@ -0,0 +1,253 @@
+import asyncio
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from resume_profile import build_profile
+from scoring import Scorecard
+
+# Defaults for the session store, overridable per app through environment variables
+DEFAULT_MAX_SESSIONS = 500
+DEFAULT_IDLE_TTL = 30 * 60  # seconds
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Sessions that were given no vacancy at upload are ranked together on the leaderboard
+DEFAULT_VACANCY = "general"
+
+
+class Session:
+    """State for one candidate's interview: resume, memory, chain, scores and counters."""
+
+    def __init__(self, session_id, conversation, memory):
+        self.session_id = session_id
+        self.conversation = conversation
+        self.memory = memory
+        self.resume_content = ""
+        # Vacancy the candidate is ranked under on the leaderboard
+        self.vacancy = DEFAULT_VACANCY
+        self.user_message_count = 0
+        self.token_usage = []
+        # Rubric scores of the answers so far, filled in by the scoring workers
+        self.scorecard = Scorecard()
+        # Opening reply being generated in the background since the upload (pregen.py)
+        self.pregeneration = None
+        self.last_access = time.monotonic()
+        self.size = 0
+        # Bumped on every store update; a worker reloads its copy when the backend has a newer one
+        self.version = 0
+        self.deleted = False
+        self._saved_resume = None
+        # Serialises saves: a score landing on a scoring thread saves alongside the turn
+        self.save_lock = threading.Lock()
+        # Serialises turns of the same interview; different sessions run in parallel.
+        # The asyncio lock plays the same role in the ASGI app.
+        self.lock = threading.Lock()
+        self.async_lock = asyncio.Lock()
+
+    def set_resume(self, profile):
+        # The compact form is what the session keeps and stores; the memory also
+        # gets the sections, to send only the relevant ones on later turns
+        self.resume_content = profile.text
+        if hasattr(self.memory, "resume"):
+            self.memory.resume = profile.text
+            self.memory.profile = profile
+
+    def snapshot(self):
+        """Resume, history and counters as plain data for a session backend."""
+        memory = self.memory
+        profile_changed = self._saved_resume is not self.resume_content
+        self._saved_resume = self.resume_content
+        return {
+            "session_id": self.session_id,
+            "version": self.version,
+            "updated": time.time(),
+            "profile_changed": profile_changed,
+            "resume": self.resume_content,
+            "questions": list(getattr(memory, "questions", [])),
+            "summary": getattr(memory, "summary", ""),
+            "messages": [[message.type, message.content] for message in memory.chat_memory.messages],
+            "vacancy": self.vacancy,
+            "user_message_count": self.user_message_count,
+            "token_usage": list(self.token_usage),
+            "scorecard": self.scorecard.as_dict(),
+        }
+
+    def restore(self, snapshot):
+        memory = self.memory
+        self.version = snapshot["version"]
+        self.resume_content = self._saved_resume = snapshot["resume"]
+        if hasattr(memory, "resume"):
+            memory.resume = snapshot["resume"]
+            memory.profile = build_profile(snapshot["resume"]) if snapshot["resume"] else None
+            memory.questions = snapshot["questions"]
+            memory.summary = snapshot["summary"]
+        for kind, content in snapshot["messages"]:
+            if kind == "human":
+                memory.chat_memory.add_user_message(content)
+            else:
+                memory.chat_memory.add_ai_message(content)
+        self.vacancy = snapshot.get("vacancy", DEFAULT_VACANCY)
+        self.user_message_count = snapshot["user_message_count"]
+        self.token_usage = list(snapshot["token_usage"])
+        self.scorecard = Scorecard.from_dict(snapshot["scorecard"])
+
+    def measure(self):
+        size = len(self.resume_content)
+        for message in self.memory.chat_memory.messages:
+            size += len(message.content)
+        return size
+
+
+class SessionStore:
+    """Thread-safe LRU of interview sessions with idle-TTL and size-based eviction.
+
+    `factory` returns a fresh `(conversation, memory)` pair for every new session.
+    With a `backend` (session_backend.py) the LRU is a read-through cache in
+    front of it: every update, and every score landing after it, is saved, and
+    a session missing here, or newer in the backend because another worker
+    served a turn, is loaded from it. The caps then only bound this process's
+    copies.
+
+    Workers share no turn lock, so the requests of one session must be routed
+    to one worker (sticky sessions, e.g. on the session id). Without that, two
+    workers saving a turn on the same version is detected by the backend: the
+    second write is dropped, counted in its `conflicts`, and that worker
+    reloads the stored session on its next request.
+    """
+
+    def __init__(self, factory, max_sessions=DEFAULT_MAX_SESSIONS,
+                 idle_ttl=DEFAULT_IDLE_TTL, max_bytes=DEFAULT_MAX_BYTES, backend=None):
+        self.factory = factory
+        self.backend = backend
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self._sessions = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def create(self):
+        conversation, memory = self.factory()
+        session = Session(uuid.uuid4().hex, conversation, memory)
+        with self._lock:
+            self._sessions[session.session_id] = session
+            self._evict(keep=session.session_id)
+        self._watch(session)
+        self._save(session)
+        return session
+
+    def get(self, session_id):
+        if not session_id:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                if now - session.last_access > self.idle_ttl:
+                    self._remove(session_id)
+                    session = None
+                else:
+                    session.last_access = now
+                    self._sessions.move_to_end(session_id)
+        if self.backend is None:
+            return session
+        version = self.backend.version(session_id)
+        if version is None:
+            # Deleted or expired, possibly by another worker
+            if session is not None:
+                self.delete(session_id)
+            return None
+        stale = self.backend.conflicted(session_id)
+        if session is not None and session.version >= version and not stale:
+            return session
+        return self._load(session_id, stale)
+
+    def _load(self, session_id, stale=False):
+        snapshot = self.backend.load(session_id)
+        if snapshot is None:
+            return None
+        conversation, memory = self.factory()
+        session = Session(session_id, conversation, memory)
+        session.restore(snapshot)
+        session.size = session.measure()
+        self._watch(session)
+        with self._lock:
+            cached = self._sessions.get(session_id)
+            if cached is not None and cached.version >= session.version and not stale:
+                # Loaded by a concurrent request in the meantime
+                return cached
+            self._remove(session_id)
+            self._sessions[session_id] = session
+            self._total_bytes += session.size
+            self._evict(keep=session_id)
+        return session
+
+    def update(self, session):
+        """Re-measure a session after its resume or history changed, enforce the caps and save it."""
+        size = session.measure()
+        with self._lock:
+            if session.session_id in self._sessions:
+                self._total_bytes += size - session.size
+                session.size = size
+                self._evict(keep=session.session_id)
+            elif self.backend is None:
+                return
+        # Saved even when evicted from this process meanwhile, unless it was deleted
+        self._save(session)
+
+    def _watch(self, session):
+        # Scores are computed after the turn was saved; each one saves the session again
+        if self.backend is not None:
+            session.scorecard.on_change = lambda: self._save(session)
+
+    def _save(self, session):
+        if self.backend is None:
+            return
+        with session.save_lock:
+            if not session.deleted:
+                session.version += 1
+                self.backend.save(session.snapshot())
+
+    def delete(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.deleted = True
+            self._remove(session_id)
+        if self.backend is not None:
+            self.backend.delete(session_id)
+
+    def stats(self):
+        with self._lock:
+            stats = {"sessions": len(self._sessions), "bytes": self._total_bytes}
+        if self.backend is not None:
+            stats["backend"] = self.backend.stats()
+        return stats
+
+    def _remove(self, session_id):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._total_bytes -= session.size
+            if session.pregeneration is not None:
+                session.pregeneration.cancel()
+
+    def _evict(self, keep=None):
+        # Sessions are kept in access order, so idle ones sit at the front
+        now = time.monotonic()
+        for sid in list(self._sessions):
+            if now - self._sessions[sid].last_access <= self.idle_ttl:
+                break
+            if sid != keep:
+                self._remove(sid)
+        # Then drop least recently used sessions until both caps are met
+        while len(self._sessions) > self.max_sessions or self._total_bytes > self.max_bytes:
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                if len(self._sessions) == 1:
+                    break
+                self._sessions.move_to_end(oldest)
+                oldest = next(iter(self._sessions))
+            self._remove(oldest)
@@ -0,0 +1,184 @@
+import asyncio
+import json
+import time
+from flask import Response
+from usage import record_turn
+from metrics import observe_stage
+from pregen import take_pregenerated
+
+
+def sse_event(data, event=None):
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+
+def event_stream_response(body, response_class=Response):
+    # Disable proxy buffering so tokens reach the browser as they are produced
+    return response_class(body, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def stream_text(llm, prompt):
+    """Yield the reply of `llm` to `prompt` token by token, recording its latency."""
+    started = time.perf_counter()
+    first = True
+    upstream = llm.stream(prompt)
+    try:
+        for chunk in upstream:
+            if chunk.content:
+                if first:
+                    observe_stage("llm_first_token", time.perf_counter() - started)
+                    first = False
+                yield chunk.content
+    finally:
+        upstream.close()
+    observe_stage("llm", time.perf_counter() - started)
+
+
+def stream_predict(conversation, prompt):
+    """Streaming equivalent of `conversation.predict(input=prompt)`.
+
+    Yields the reply token by token and saves the turn to the chain's memory only
+    once the model has finished. Closing the generator early (client disconnect)
+    closes the upstream stream and leaves the memory untouched.
+    """
+    memory = conversation.memory
+    history = memory.load_memory_variables({})[memory.memory_key]
+    prompt_value = conversation.prompt.format_prompt(input=prompt, history=history)
+    chunks = []
+    tokens = stream_text(conversation.llm, prompt_value)
+    try:
+        for token in tokens:
+            chunks.append(token)
+            yield token
+    finally:
+        tokens.close()
+    memory.save_context({"input": prompt}, {"response": "".join(chunks)})
+
+
+def stream_turn(store, session, build_prompt, key="response", llm=None, after_turn=None, on_reply=None,
+                token_filter=None):
+    """Server-Sent Events body for one interview turn.
+
+    Emits a `data: {"token": ...}` event per chunk and a final `done` event carrying
+    the full reply under `key`. The session lock is held for the whole stream so
+    turns of the same interview cannot interleave. With `llm` the prompt is sent
+    to that model on its own, without the history and without saving it to memory.
+    A first turn joins the session's pre-generated opening reply, if any.
+    `after_turn()` runs under the lock once the reply is complete. With
+    `on_reply(reply)`, which returns `(reply, events)`, the `done` event carries
+    the reply it returns and each `{event: data}` of `events` is sent before it;
+    with `token_filter` only what its `feed(token)` and `end()` return is streamed.
+    """
+    with session.lock:
+        prompt = build_prompt()
+        tokens = []
+        try:
+            pregenerated = take_pregenerated(session, prompt) if llm is None else None
+            if pregenerated is not None:
+                source = [pregenerated]
+            elif llm is not None:
+                source = stream_text(llm, prompt)
+            else:
+                source = stream_predict(session.conversation, prompt)
+            for token in source:
+                tokens.append(token)
+                shown = token if token_filter is None else token_filter.feed(token)
+                if shown:
+                    yield sse_event({"token": shown})
+            shown = token_filter.end() if token_filter is not None else ""
+            if shown:
+                yield sse_event({"token": shown})
+        except Exception as e:
+            yield sse_event({"error": str(e)}, event="error")
+            return
+        reply = "".join(tokens)
+        record_turn(session, prompt, reply, history_tokens=0 if llm is not None else None)
+        if after_turn is not None:
+            after_turn()
+        events = {}
+        if on_reply is not None:
+            reply, events = on_reply(reply)
+    store.update(session)
+    for event, data in events.items():
+        yield sse_event(data, event=event)
+    yield sse_event({key: reply}, event="done")
+
+
+async def aiter_tokens(tokens):
+    for token in tokens:
+        yield token
+
+
+async def astream_text(llm, prompt):
+    """Async version of `stream_text`."""
+    started = time.perf_counter()
+    first = True
+    upstream = llm.astream(prompt)
+    try:
+        async for chunk in upstream:
+            if chunk.content:
+                if first:
+                    observe_stage("llm_first_token", time.perf_counter() - started)
+                    first = False
+                yield chunk.content
+    finally:
+        await upstream.aclose()
+    observe_stage("llm", time.perf_counter() - started)
+
+
+async def astream_predict(conversation, prompt):
+    """Async version of `stream_predict` for the ASGI app."""
+    memory = conversation.memory
+    history = (await memory.aload_memory_variables({}))[memory.memory_key]
+    prompt_value = conversation.prompt.format_prompt(input=prompt, history=history)
+    chunks = []
+    tokens = astream_text(conversation.llm, prompt_value)
+    try:
+        async for token in tokens:
+            chunks.append(token)
+            yield token
+    finally:
+        await tokens.aclose()
+    await memory.asave_context({"input": prompt}, {"response": "".join(chunks)})
+
+
+async def astream_turn(store, session, build_prompt, key="response", llm=None, after_turn=None, on_reply=None,
+                       token_filter=None):
+    """Async version of `stream_turn`, serialised on the session's asyncio lock."""
+    async with session.async_lock:
+        prompt = build_prompt()
+        tokens = []
+        try:
+            pregenerated = None
+            if llm is None and session.pregeneration is not None:
+                pregenerated = await asyncio.to_thread(take_pregenerated, session, prompt)
+            if pregenerated is not None:
+                source = aiter_tokens([pregenerated])
+            elif llm is not None:
+                source = astream_text(llm, prompt)
+            else:
+                source = astream_predict(session.conversation, prompt)
+            async for token in source:
+                tokens.append(token)
+                shown = token if token_filter is None else token_filter.feed(token)
+                if shown:
+                    yield sse_event({"token": shown})
+            shown = token_filter.end() if token_filter is not None else ""
+            if shown:
+                yield sse_event({"token": shown})
+        except Exception as e:
+            yield sse_event({"error": str(e)}, event="error")
+            return
+        reply = "".join(tokens)
+        record_turn(session, prompt, reply, history_tokens=0 if llm is not None else None)
+        if after_turn is not None:
+            after_turn()
+        events = {}
+        if on_reply is not None:
+            # Records to the leaderboard's SQLite database, so off the event loop
+            reply, events = await asyncio.to_thread(on_reply, reply)
+    store.update(session)
+    for event, data in events.items():
+        yield sse_event(data, event=event)
+    yield sse_event({key: reply}, event="done")
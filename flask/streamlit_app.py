@@ -1,10 +1,8 @@
 import streamlit as st
-import PyPDF2
-import io
 from langchain_groq import ChatGroq
-from langchain.memory import ConversationBufferMemory
-from langchain.chains import ConversationChain
 from dotenv import load_dotenv
+from metrics import timed
+from streamlit_session import rerun_timer, resume_text, session_conversation
 import os
 
 # Load environment variables
@@ -24,18 +22,10 @@ def init_llm():
 
 llm = init_llm()
 
-# Create a conversation memory
-memory = ConversationBufferMemory(return_messages=True)
-
-# Create a conversation chain
-conversation = ConversationChain(llm=llm, memory=memory, verbose=True)
-
-def extract_text_from_pdf(pdf_file):
-    pdf_reader = PyPDF2.PdfReader(pdf_file)
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text()
-    return text
+def predict(prompt):
+    # The memory and chain live in st.session_state, so the history survives reruns
+    with timed("llm"):
+        return session_conversation(llm).predict(input=prompt)
 
 def main():
     st.title("AI Interview Bot")
@@ -44,7 +34,7 @@ def main():
     uploaded_file = st.file_uploader("Upload your resume (PDF)", type="pdf")
 
     if uploaded_file:
-        resume_content = extract_text_from_pdf(uploaded_file)
+        resume_content = resume_text(uploaded_file)
         st.success("Resume uploaded successfully!")
         st.session_state.resume_content = resume_content
 
@@ -55,13 +45,15 @@ def main():
         else:
             st.session_state.interview_started = True
             st.session_state.messages = []
+            # A new interview starts from an empty memory
+            session_conversation(llm, new=True)
             initial_prompt = f"""You are an expert interviewer conducting a job interview. The candidate has uploaded their resume, and you have the following information:
 
 Resume content: {st.session_state.resume_content}
 
 Based on this resume, conduct a professional interview. Start by briefly introducing yourself and asking the candidate for a brief introduction. Then, proceed with relevant questions based on their resume."""
 
-            initial_response = conversation.predict(input=initial_prompt)
+            initial_response = predict(initial_prompt)
             st.session_state.messages.append({"role": "assistant", "content": initial_response})
 
     # Display chat messages
@@ -86,7 +78,7 @@ The candidate's latest response is: '{user_input}'
 
 Provide your next question or response."""
 
-            ai_response = conversation.predict(input=prompt)
+            ai_response = predict(prompt)
             with st.chat_message("assistant"):
                 st.write(ai_response)
             st.session_state.messages.append({"role": "assistant", "content": ai_response})
@@ -106,10 +98,11 @@ Provide your next question or response."""
 
 Provide a detailed yet concise analysis, offering constructive feedback and actionable insights."""
 
-            analysis = conversation.predict(input=analysis_prompt)
+            analysis = predict(analysis_prompt)
             st.subheader("Interview Analysis")
             st.write(analysis)
             st.session_state.interview_started = False
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with rerun_timer():
+        main()
\ No newline at end of file
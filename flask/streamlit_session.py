@@ -0,0 +1,73 @@
+# Per-browser-session state of the Streamlit apps (streamlit_app.py, sax.py).
+# Streamlit runs the whole script again on every widget interaction, so
+# anything built at module level is rebuilt, and the interview history lost,
+# on each keystroke; these helpers keep it in st.session_state instead.
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import streamlit as st
+
+from metrics import observe_stage, stage_timings, timed
+from pdf_cache import extract_pdf_text
+from resume_profile import build_profile
+
+# RERUN_TIMING=1 shows the duration of the last reruns in the sidebar
+SHOW_RERUN_TIMING = os.getenv('RERUN_TIMING', '0') == '1'
+RERUN_SAMPLES = 50
+# Stages the script waits on; TTS is left out as it overlaps the LLM stream in sax.py
+WAIT_STAGES = ("llm", "pdf", "listen", "stt")
+
+
+def session_conversation(llm, new=False):
+    """The memory and chain of this browser session's interview, built once.
+
+    `new=True` starts a fresh interview (empty memory).
+    """
+    if new or "conversation" not in st.session_state:
+        from langchain.chains import ConversationChain
+        from langchain.memory import ConversationBufferMemory
+
+        memory = ConversationBufferMemory(return_messages=True)
+        # CHAIN_VERBOSE=1 prints every formatted prompt
+        st.session_state.conversation = ConversationChain(llm=llm, memory=memory,
+                                                          verbose=os.getenv('CHAIN_VERBOSE') == '1')
+    return st.session_state.conversation
+
+
+def resume_text(uploaded_file):
+    # The uploader hands the same file to every rerun: it is parsed and
+    # compacted (resume_profile.py) once per upload, and a re-upload of the same
+    # content is served by the extraction cache
+    file_id = getattr(uploaded_file, "file_id", None) or (uploaded_file.name, uploaded_file.size)
+    if st.session_state.get("resume_file_id") != file_id:
+        with timed("pdf"):
+            text = extract_pdf_text(uploaded_file)
+        st.session_state.resume_text = build_profile(text).text
+        st.session_state.resume_file_id = file_id
+    return st.session_state.resume_text
+
+
+@contextmanager
+def rerun_timer():
+    """Time one run of the script, kept per session and recorded as the `rerun` stage.
+
+    The time spent waiting on the model, the PDF parser or the candidate
+    (WAIT_STAGES) is subtracted: what is left is what every rerun costs,
+    whether or not it calls the model.
+    """
+    started = time.perf_counter()
+    with stage_timings() as timings:
+        yield
+    elapsed = time.perf_counter() - started
+    stages = sum(seconds for stage, seconds in timings if stage in WAIT_STAGES)
+    own = max(elapsed - stages, 0.0)
+    observe_stage("rerun", own)
+    samples = st.session_state.setdefault("rerun_seconds", deque(maxlen=RERUN_SAMPLES))
+    samples.append(own)
+    if SHOW_RERUN_TIMING:
+        ordered = sorted(samples)
+        st.sidebar.caption(f"Rerun {own * 1000:.0f} ms + {stages * 1000:.0f} ms waiting on the model, PDF or candidate "
+                           f"(median {ordered[len(ordered) // 2] * 1000:.0f} ms, "
+                           f"max {ordered[-1] * 1000:.0f} ms over the last {len(ordered)} reruns)")
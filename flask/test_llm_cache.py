@@ -0,0 +1,41 @@
+import numpy as np
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration
+
+from llm_cache import InterviewLLMCache, split_prompt
+from scoring import TURN_SCORE_PROMPT
+
+LLM_STRING = "routed-chat"
+
+
+def same_vector(text):
+    # Every text is a perfect semantic match of every other
+    return np.ones(4, dtype=np.float32) / 2
+
+
+def scoring_prompt(answer):
+    prompt = TURN_SCORE_PROMPT.format(question="Tell me about a project you led.", answer=answer)
+    return dumps([HumanMessage(content=prompt)])
+
+
+def reply(text):
+    return [ChatGeneration(message=AIMessage(content=text))]
+
+
+def test_scoring_prompts_with_different_answers_do_not_collide():
+    cache = InterviewLLMCache(semantic=True, embedder=(same_vector, 4))
+    cache.update(scoring_prompt("I led the migration of our billing service."), LLM_STRING, reply("first"))
+
+    assert cache.lookup(scoring_prompt("I have not led a project yet."), LLM_STRING) is None
+    assert cache.lookup(scoring_prompt("I led the migration of our billing service."),
+                        LLM_STRING)[0].message.content == "first"
+
+
+def test_conversation_turns_still_match_semantically():
+    cache = InterviewLLMCache(semantic=True, embedder=(same_vector, 4))
+    context = "System: You are interviewing a candidate.\nAI: Tell me about a project you led.\n"
+    cache.update(f"{context}Human: I led the billing migration.", LLM_STRING, reply("next question"))
+
+    assert split_prompt(f"{context}Human: I led the billing migration.")[0]
+    assert cache.lookup(f"{context}Human: The billing migration was mine.", LLM_STRING)[0].message.content == "next question"
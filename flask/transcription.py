@@ -0,0 +1,100 @@
+import io
+import os
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from groq_scheduler import scheduler
+
+# Recordings longer than this are split at the quietest point into chunks of at most this length
+MAX_CHUNK_SECONDS = float(os.getenv('TRANSCRIBE_CHUNK_SECONDS', 30))
+WINDOW_SECONDS = 0.05
+
+transcribe_executor = ThreadPoolExecutor(max_workers=int(os.getenv('TRANSCRIBE_WORKERS', 4)),
+                                         thread_name_prefix='stt')
+
+SAMPLE_TYPES = {1: np.uint8, 2: np.int16, 4: np.int32}
+
+
+def read_wav(data):
+    """Return `(params, raw_frames)` for PCM WAV bytes, or None for any other format."""
+    if data[:4] != b'RIFF' or data[8:12] != b'WAVE':
+        return None
+    try:
+        with wave.open(io.BytesIO(data)) as wav:
+            return wav.getparams(), wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError):
+        return None
+
+
+def find_cuts(raw, params, max_chunk_seconds=MAX_CHUNK_SECONDS):
+    """Frame offsets splitting the audio into chunks, each cut at the quietest window.
+
+    A cut is placed in the second half of every `max_chunk_seconds` span so no
+    chunk is longer than that and none is shorter than half of it (except the last).
+    """
+    nframes = params.nframes
+    if nframes <= params.framerate * max_chunk_seconds or params.sampwidth not in SAMPLE_TYPES:
+        return [0, nframes]
+    samples = np.frombuffer(raw, dtype=SAMPLE_TYPES[params.sampwidth]).astype(np.float32)
+    if params.sampwidth == 1:
+        samples -= 128  # 8-bit WAV is unsigned
+    samples = samples.reshape(-1, params.nchannels).mean(axis=1)
+    window = max(1, int(params.framerate * WINDOW_SECONDS))
+    nwindows = len(samples) // window
+    energy = np.sqrt((samples[:nwindows * window].reshape(nwindows, window) ** 2).mean(axis=1))
+    max_windows = int(max_chunk_seconds / WINDOW_SECONDS)
+    cuts = [0]
+    while nwindows - cuts[-1] > max_windows:
+        start = cuts[-1] + max_windows // 2
+        cuts.append(start + int(np.argmin(energy[start:cuts[-1] + max_windows])))
+    return [cut * window for cut in cuts] + [nframes]
+
+
+def wav_chunk(raw, params, start, end):
+    frame_size = params.nchannels * params.sampwidth
+    out = io.BytesIO()
+    with wave.open(out, 'wb') as wav:
+        wav.setnchannels(params.nchannels)
+        wav.setsampwidth(params.sampwidth)
+        wav.setframerate(params.framerate)
+        wav.writeframes(raw[start * frame_size:end * frame_size])
+    return out.getvalue()
+
+
+def transcribe(client, data, filename="audio.wav", model="whisper-large-v3"):
+    """Transcribe uploaded audio bytes with Groq Whisper.
+
+    WAV recordings longer than MAX_CHUNK_SECONDS are split at silences and the
+    chunks transcribed concurrently, then joined in order. Other formats are sent
+    as a single request. Returns `(text, stats)`.
+    """
+    started = time.monotonic()
+
+    def request(name, chunk):
+        scheduler.acquire(model, 0, "transcription")
+        result = client.audio.transcriptions.create(file=(name, chunk), model=model, response_format="text")
+        return getattr(result, 'text', result).strip()
+
+    wav = read_wav(data)
+    if wav is None:
+        texts = [request(filename, data)]
+        audio_seconds = None
+    else:
+        params, raw = wav
+        cuts = find_cuts(raw, params)
+        chunks = [wav_chunk(raw, params, start, end) for start, end in zip(cuts, cuts[1:])]
+        if len(chunks) == 1:
+            chunks = [data]  # Nothing to split: send the upload untouched
+        texts = list(transcribe_executor.map(request, [f"chunk{i}.wav" for i in range(len(chunks))], chunks))
+        audio_seconds = params.nframes / params.framerate
+    wall_seconds = time.monotonic() - started
+    stats = {
+        "chunks": len(texts),
+        "audio_seconds": audio_seconds,
+        "wall_seconds": round(wall_seconds, 3),
+        "audio_seconds_per_second": round(audio_seconds / wall_seconds, 2) if audio_seconds and wall_seconds else None,
+    }
+    return " ".join(text for text in texts if text), stats
@@ -0,0 +1,95 @@
+import io
+import os
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# A sentence ends at terminal punctuation (plus closing quotes/brackets) followed by whitespace, or at a line break
+SENTENCE_END = re.compile(r'[.!?:]["\')\]]*\s+|\n+')
+# Shorter pieces ("1.", "e.g.") are merged into the next sentence
+MIN_SENTENCE_CHARS = 20
+
+tts_executor = ThreadPoolExecutor(max_workers=int(os.getenv('TTS_WORKERS', 4)), thread_name_prefix='tts')
+
+
+def split_sentences(tokens):
+    """Group a stream of text chunks into sentences as soon as each one is complete.
+
+    The pieces are yielded unstripped, so joining them gives back the original text.
+    """
+    buffer = ""
+    for token in tokens:
+        buffer += token
+        start = 0
+        for match in SENTENCE_END.finditer(buffer):
+            if len(buffer[start:match.end()].strip()) >= MIN_SENTENCE_CHARS:
+                yield buffer[start:match.end()]
+                start = match.end()
+        buffer = buffer[start:]
+    if buffer:
+        yield buffer
+
+
+def synthesize(text, lang='en'):
+    # gTTS is imported on the first synthesis rather than when the app boots
+    from gtts import gTTS
+
+    text = text.strip()
+    if not text:
+        return b""
+    fp = io.BytesIO()
+    gTTS(text=text, lang=lang).write_to_fp(fp)
+    return fp.getvalue()
+
+
+def synthesize_stream(tokens, lang='en', synth=synthesize):
+    """Yield `(sentence, mp3_bytes)` in order while the text is still arriving.
+
+    A background thread consumes `tokens` (e.g. a streamed LLM reply) and hands
+    every finished sentence to the TTS pool straight away, so generation, the
+    synthesis of later sentences and playback of earlier ones all overlap.
+    Closing the generator (the client went away) stops that thread at the next
+    token, closes `tokens` and cancels the syntheses not started yet.
+    """
+    pending = queue.Queue()
+    stopped = threading.Event()
+
+    def until_stopped():
+        for token in tokens:
+            if stopped.is_set():
+                return
+            yield token
+
+    def produce():
+        try:
+            for sentence in split_sentences(until_stopped()):
+                if stopped.is_set():
+                    break
+                pending.put((sentence, tts_executor.submit(synth, sentence, lang)))
+        except Exception as e:
+            pending.put(e)
+        finally:
+            if hasattr(tokens, 'close'):
+                tokens.close()
+            pending.put(None)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            sentence, future = item
+            yield sentence, future.result()
+    finally:
+        stopped.set()
+        while True:
+            try:
+                item = pending.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, tuple):
+                item[1].cancel()
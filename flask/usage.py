@@ -0,0 +1,25 @@
+# Token accounting shared by the memory, the metrics and the streaming routes;
+# kept free of LangChain imports so the apps can import it at boot
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English text with the Llama tokenizer
+    return (len(text) + 3) // 4
+
+
+def record_turn(session, prompt, response, history_tokens=None):
+    """Append the token counts of one turn to `session.token_usage`.
+
+    `history_tokens` defaults to the size of the history the memory last rendered;
+    pass 0 for a prompt that was sent without the history.
+    """
+    if history_tokens is None:
+        history_tokens = getattr(session.memory, "last_history_tokens", 0)
+    usage = {
+        "turn": len(session.token_usage) + 1,
+        "history_tokens": history_tokens,
+        "input_tokens": history_tokens + estimate_tokens(prompt),
+        "output_tokens": estimate_tokens(response),
+    }
+    session.token_usage.append(usage)
+    return usage
@@ -1,4 +1,4 @@
-import React, { useState, useCallback, useEffect } from 'react';
+import React, { useState, useCallback, useEffect, useRef } from 'react';
 import { useSpring, animated } from 'react-spring';
 
 // Function to simulate typewriter effect
@@ -21,60 +21,81 @@ const ChatInterviewPage = () => {
   const [loading, setLoading] = useState(false);
   const [resume, setResume] = useState(null);
   const [uploadError, setUploadError] = useState('');
+  const [uploadKey, setUploadKey] = useState(null);  // Idempotency-Key of the selected resume
+  const [uploadFailed, setUploadFailed] = useState(false);
   const [startInterview, setStartInterview] = useState(false);
   const [messageCount, setMessageCount] = useState(0);  // Track the number of user messages
+  const sessionIdRef = useRef(null);  // Interview session issued by /upload
 
   const fadeInProps = useSpring({ opacity: 1, from: { opacity: 0 }, config: { duration: 1000 } });
 
-  // Function to handle resume upload
-  const handleResumeUpload = async (event) => {
-    const file = event.target.files[0];
+  // Sends the selected resume; a resend of the same file reuses its key and gets the same session back
+  const uploadResume = async (file, key) => {
+    setUploadError('');
+    setUploadFailed(false);
 
-    if (file && file.type === 'application/pdf') {
-      setUploadError('');
-      setResume(file);
+    const formData = new FormData();
+    formData.append('resume', file);
+    if (sessionIdRef.current) {
+      // Replaces the previous interview and cancels its pre-generated opening
+      formData.append('session_id', sessionIdRef.current);
+    }
 
-      const formData = new FormData();
-      formData.append('resume', file);
+    try {
+      const response = await fetch('http://127.0.0.1:5000/upload', {
+        method: 'POST',
+        headers: { 'Idempotency-Key': key },
+        body: formData,
+      });
+      const data = await response.json();
+      if (response.ok) {
+        sessionIdRef.current = data.session_id;
+        setMessages(prevMessages => [...prevMessages, { text: data.message, type: 'system' }]);
 
-      try {
-        const response = await fetch('http://127.0.0.1:5000/upload', {
-          method: 'POST',
-          body: formData,
+        const startResponse = await fetch('http://127.0.0.1:5000/start', {
+          method: 'GET',
         });
-        const data = await response.json();
-        if (response.ok) {
-          setMessages(prevMessages => [...prevMessages, { text: data.message, type: 'system' }]);
-
-          const startResponse = await fetch('http://127.0.0.1:5000/start', {
-            method: 'GET',
-          });
-          const startData = await startResponse.json();
-          if (startResponse.ok) {
-            setMessages(prevMessages => [...prevMessages, { text: startData.response, type: 'ai' }]);
-            setStartInterview(true);
-          } else {
-            console.error('Failed to fetch start message.');
-            setUploadError('Failed to fetch start message.');
-          }
+        const startData = await startResponse.json();
+        if (startResponse.ok) {
+          setMessages(prevMessages => [...prevMessages, { text: startData.response, type: 'ai' }]);
+          setStartInterview(true);
         } else {
-          setUploadError(data.error || 'Failed to upload resume.');
+          console.error('Failed to fetch start message.');
+          setUploadError('Failed to fetch start message.');
         }
-      } catch (error) {
-        console.error('Error uploading resume:', error);
-        setUploadError('An error occurred while uploading the resume.');
+      } else {
+        setUploadError(data.error || 'Failed to upload resume.');
+        setUploadFailed(response.status >= 500);
       }
+    } catch (error) {
+      console.error('Error uploading resume:', error);
+      setUploadError('An error occurred while uploading the resume.');
+      setUploadFailed(true);
+    }
+  };
+
+  // Function to handle resume upload
+  const handleResumeUpload = (event) => {
+    const file = event.target.files[0];
+
+    if (file && file.type === 'application/pdf') {
+      // One key per selected file, kept for its resends
+      const key = crypto.randomUUID();
+      setResume(file);
+      setUploadKey(key);
+      uploadResume(file, key);
     } else {
       setUploadError('Please upload a valid PDF file.');
     }
   };
 
-  const fetchLLMResponse = async (message) => {
+  // `key` identifies the message: the server answers every request carrying it with one reply
+  const fetchLLMResponse = async (message, key) => {
     try {
       const response = await fetch('http://127.0.0.1:5000/interview', {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ message }),
+        headers: { 'Content-Type': 'application/json', 'Idempotency-Key': key },
+        body: JSON.stringify({ message, session_id: sessionIdRef.current }),
       });
       const data = await response.json();
       if (response.ok) {
@@ -89,9 +110,9 @@ const ChatInterviewPage = () => {
     }
   };
 
-  const simulateAIResponse = useCallback(async (message) => {
+  const simulateAIResponse = useCallback(async (message, key) => {
     setLoading(true);
-    const aiText = await fetchLLMResponse(message);
+    const aiText = await fetchLLMResponse(message, key);
 
     typewriterEffect(aiText, 50, (updatedMessage) => {
       setMessages(prevMessages => {
@@ -110,8 +131,9 @@ const ChatInterviewPage = () => {
   const handleSend = () => {
     if (input.trim() === '' || messageCount >= 10) return; // Prevent sending more than 10 messages
 
-    setMessages(prevMessages => [...prevMessages, { text: input, type: 'user' }]);
-    simulateAIResponse(input);
+    const id = crypto.randomUUID();
+    setMessages(prevMessages => [...prevMessages, { text: input, type: 'user', id }]);
+    simulateAIResponse(input, id);
     setInput('');
     setMessageCount(prevCount => prevCount + 1); // Increment message count
   };
@@ -121,8 +143,9 @@ const ChatInterviewPage = () => {
       const initialMessage = "Let's start the interview.";
       const response = await fetch('http://127.0.0.1:5000/interview', {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ message: initialMessage }),
+        // Starting twice (a double click) is one turn
+        headers: { 'Content-Type': 'application/json', 'Idempotency-Key': `start-${sessionIdRef.current}` },
+        body: JSON.stringify({ message: initialMessage, session_id: sessionIdRef.current }),
       });
       const data = await response.json();
       if (response.ok) {
@@ -142,7 +165,8 @@ const ChatInterviewPage = () => {
 
   useEffect(() => {
     if (messages.length > 0 && messages[messages.length - 1].type === 'user') {
-      simulateAIResponse(messages[messages.length - 1].text);
+      const last = messages[messages.length - 1];
+      simulateAIResponse(last.text, last.id);
     }
   }, [messages, simulateAIResponse]);
 
@@ -185,6 +209,14 @@ const ChatInterviewPage = () => {
             className="mb-4 p-2 bg-[#0b5428] text-white rounded-lg border border-[#0b5428] outline-none"
           />
           {uploadError && <p className="text-red-500">{uploadError}</p>}
+          {uploadFailed && (
+            <button
+              onClick={() => uploadResume(resume, uploadKey)}
+              className="mb-4 px-6 py-2 bg-[#0b5428] text-white rounded-lg border border-[#0b5428] transition-transform transform hover:scale-105"
+            >
+              Retry upload
+            </button>
+          )}
           
           <div className="flex">
             <input